@@ -0,0 +1,218 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.categoricallottery import CategoricalLottery
+import argparse
+import tracemalloc
+import random
+import time
+import json
+import sys
+
+# Timings for the paths that matter at scale, on synthetic lotteries.
+#
+#      python -m benchmarks.lotterybench --owners 200 --observations 500 --output baseline.json
+#      python -m benchmarks.lotterybench --owners 200 --observations 500 --compare baseline.json
+#
+# Each benchmark reports calls, seconds, calls per second and the peak traced memory in MB.
+# Comparison flags any benchmark that got slower, or used more memory, than the baseline by more than
+# the tolerance, and exits with status 1 if there are any. Runs of different workloads are not compared.
+#
+# payout, payout_all and suggest forget remembered cutoffs and settlements before every call, so they time
+# the work a new truth costs rather than the cache.
+
+BENCHMARKS = ['add', 'add_many', 'observe', 'payout', 'payout_all', 'suggest', 'json.dumps', 'from_json', 'settle']
+WORKLOAD = ['n_owners', 'n_values', 'n_horizons', 'n_observations', 'storage', 'seed']     # Config that must match to compare
+
+
+def synthetic_submissions(n_owners:int=100, n_values:int=10, n_horizons:int=2, n_observations:int=100,
+                          values_per_bet:int=3, seed:int=0) -> list:
+    """ (t, owner, values, weights, amount, k, tau) for every owner and horizon, once per observation interval """
+    rng = random.Random(seed)
+    values = [str(i) for i in range(n_values)]
+    horizons = [(1, 5*j) for j in range(n_horizons)]
+    submissions = list()
+    for i in range(n_observations):
+        for owner in range(n_owners):
+            for k, tau in horizons:
+                submissions.append((10*i+rng.randint(1, 9), 'owner'+str(owner), rng.sample(values, min(values_per_bet, n_values)),
+                                    [rng.random()+0.01 for _ in range(min(values_per_bet, n_values))], rng.choice([1.0, 2.0]), k, tau))
+    submissions.sort(key=lambda s: s[0])
+    return submissions
+
+
+def synthetic_lottery(n_owners:int=100, n_values:int=10, n_horizons:int=2, n_observations:int=100,
+                      storage:str='json', seed:int=0) -> OngoingCategoricalLottery:
+    """ A lottery with submissions interleaved with observations every 10 seconds """
+    rng = random.Random(seed)
+    L = OngoingCategoricalLottery(storage=storage)
+    L.observe(t=0, value='0')
+    submissions = synthetic_submissions(n_owners=n_owners, n_values=n_values, n_horizons=n_horizons,
+                                        n_observations=n_observations, seed=seed)
+    i = 0
+    for s in submissions:
+        while s[0] >= 10*(i+1):
+            i += 1
+            L.observe(t=10*i, value=str(rng.randrange(n_values)))
+        L.add(*s)
+    return L
+
+
+def _forget(L:OngoingCategoricalLottery) -> OngoingCategoricalLottery:
+    """ Drop remembered cutoffs and settlement frames """
+    L.cutoffs.clear()
+    for pool in L.index.pools.values():
+        pool.frames.clear()
+    return L
+
+
+def _cases(n_owners:int, n_values:int, n_horizons:int, n_observations:int, storage:str, seed:int) -> dict:
+    """ { name: setup } where setup() builds fresh inputs and returns the timed function, which returns its call count """
+    sizes = dict(n_owners=n_owners, n_values=n_values, n_horizons=n_horizons, n_observations=n_observations)
+    values = [str(i) for i in range(n_values)]
+    horizons = [(1, 5*j) for j in range(n_horizons)]
+    cached = dict()
+
+    def lottery():
+        if 'L' not in cached:
+            cached['L'] = synthetic_lottery(storage=storage, seed=seed, **sizes)
+        return cached['L']
+
+    def submissions():
+        if 'subs' not in cached:
+            cached['subs'] = synthetic_submissions(seed=seed, **sizes)
+        return cached['subs']
+
+    def empty():
+        L = OngoingCategoricalLottery(storage=storage)
+        L.observe(t=0, value='0')
+        return L
+
+    def add():
+        L, subs = empty(), submissions()
+        return lambda: len([L.add(*s) for s in subs])
+
+    def add_many():
+        L, subs = empty(), submissions()
+        return lambda: len(L.add_many(subs))
+
+    def observe():
+        L = OngoingCategoricalLottery.from_json(json.dumps(lottery()))
+        t0 = L['state']['time_history'][-1]
+        return lambda: len([L.observe(t=t0+10*(i+1), value=values[i % n_values]) for i in range(n_observations)])
+
+    def payout():
+        L = lottery()
+        ts = [L['state']['time_history'][-1]+10+j for j in range(n_observations)]   # Truths yet to be observed
+        return lambda: len([_forget(L).payout(t=t, value=v, k=k, tau=tau) for t in ts for k, tau in horizons for v in values[:3]])
+
+    def payout_all():
+        L = lottery()
+        ts = [L['state']['time_history'][-1]+10+j for j in range(n_observations)]   # Truths yet to be observed
+        return lambda: len([_forget(L).payout_all(t=t, k=k, tau=tau) for t in ts for k, tau in horizons])
+
+    def suggest():
+        L = lottery()
+        ts = [L['state']['time_history'][-1]+10+j for j in range(n_observations)]   # Truths yet to be observed
+        return lambda: len([_forget(L).suggest(t=t, k=k, tau=tau) for t in ts for k, tau in horizons])
+
+    def dumps():
+        L = lottery()
+        return lambda: len([json.dumps(L)])
+
+    def from_json():
+        s = json.dumps(lottery())
+        return lambda: len([OngoingCategoricalLottery.from_json(s)])
+
+    def settle():
+        rng = random.Random(seed)
+        races = list()
+        for _ in range(max(1, n_observations//10)):
+            L = CategoricalLottery(allowed_values=values, t=0)
+            for owner in range(n_owners):
+                L.add(t=1, owner='owner'+str(owner), values=rng.sample(values, min(3, n_values)),
+                      weights=[rng.random()+0.01 for _ in range(min(3, n_values))])
+            L.close(t=2)
+            races.append(L)
+        return lambda: len([L.settle(t=3, value=rng.choice(values)) for L in races])
+
+    return {'add': add, 'add_many': add_many, 'observe': observe, 'payout': payout, 'payout_all': payout_all,
+            'suggest': suggest, 'json.dumps': dumps, 'from_json': from_json, 'settle': settle}
+
+
+def _measure(setup) -> dict:
+    timed = setup()
+    start = time.perf_counter()
+    n = timed()
+    seconds = time.perf_counter() - start
+    traced = setup()           # Again with tracing, which would distort the timing
+    tracemalloc.start()
+    traced()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return dict(calls=n, seconds=seconds, per_second=n/seconds if seconds > 0 else float('inf'), peak_mb=peak/1e6)
+
+
+def run(n_owners:int=100, n_values:int=10, n_horizons:int=2, n_observations:int=100, storage:str='json',
+        seed:int=0, benchmarks:[str]=None) -> dict:
+    """ :return: {'config': {...}, 'results': { benchmark: {calls, seconds, per_second, peak_mb} }} """
+    config = dict(n_owners=n_owners, n_values=n_values, n_horizons=n_horizons, n_observations=n_observations,
+                  storage=storage, seed=seed, python=sys.version.split()[0])
+    cases = _cases(n_owners=n_owners, n_values=n_values, n_horizons=n_horizons, n_observations=n_observations,
+                   storage=storage, seed=seed)
+    results = dict([(name, _measure(cases[name])) for name in (benchmarks or BENCHMARKS)])
+    return dict(config=config, results=results)
+
+
+def compare(current:dict, baseline:dict, tolerance:float=0.2) -> list:
+    """ Benchmarks that are slower, or use more memory, than the baseline by more than the tolerance
+    :return: [ {benchmark, metric, baseline, current, change} ]
+    :raises ValueError: if the two runs were of different workloads
+    """
+    differ = [key for key in WORKLOAD if current['config'].get(key) != baseline['config'].get(key)]
+    if differ:
+        raise ValueError('Cannot compare runs of different workloads, which differ in '+', '.join(differ))
+    regressions = list()
+    for name, now in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            continue
+        if now['per_second'] < before['per_second']*(1-tolerance):
+            regressions.append(dict(benchmark=name, metric='per_second', baseline=before['per_second'],
+                                    current=now['per_second'], change=now['per_second']/before['per_second']-1))
+        if now['peak_mb'] > before['peak_mb']*(1+tolerance) and now['peak_mb'] - before['peak_mb'] > 0.1:
+            regressions.append(dict(benchmark=name, metric='peak_mb', baseline=before['peak_mb'],
+                                    current=now['peak_mb'], change=now['peak_mb']/before['peak_mb']-1))
+    return regressions
+
+
+def main(argv:[str]=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark lottery add/observe/payout/suggest/serialization/settle')
+    parser.add_argument('--owners', type=int, default=100)
+    parser.add_argument('--values', type=int, default=10)
+    parser.add_argument('--horizons', type=int, default=2)
+    parser.add_argument('--observations', type=int, default=100)
+    parser.add_argument('--storage', default='json')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='*', choices=BENCHMARKS, help='Run just these benchmarks')
+    parser.add_argument('--output', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Baseline results file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    report = run(n_owners=args.owners, n_values=args.values, n_horizons=args.horizons, n_observations=args.observations,
+                 storage=args.storage, seed=args.seed, benchmarks=args.only)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        try:
+            report['regressions'] = compare(report, baseline, tolerance=args.tolerance)
+        except ValueError as e:
+            parser.error(str(e))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,16 @@
+from lottery.combinatorial import CombinatorialLottery
+from pprint import pprint
+
+# The same one-off lottery as one_off_lottery.py, but picking 6 numbers from 49. Listing the 13,983,816
+# possible tickets in allowed_values would be slow, so tickets are checked and stored as ranks instead.
+
+if __name__=='__main__':
+    lottery = CombinatorialLottery(n=49, r=6)
+
+    lottery.add(t=0, owner='bill', values=['1-13-22-30-41-49', '2-3-5-7-11-13'], weights=None, amount=1.0)
+    lottery.add(t=0, owner='mary', values=['49-41-30-22-13-1'], weights=None, amount=2.0)   # Order doesn't matter
+    lottery.close(t=1)
+
+    # Only tickets somebody bet on are worth looking at
+    pprint( lottery.payout_all( t=3 ) )
+    pprint( lottery.settle( t=3, value='1-13-22-30-41-49' ) )
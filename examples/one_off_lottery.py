@@ -28,3 +28,7 @@ if __name__=='__main__':
     pprint( lottery.payout( t=3, value='1-3-4' ) )
     pprint( lottery.payout( t=3, value='1-2-5' ) )
     pprint( lottery.payout( t=3, value='1-3-6' ) )
+
+    # Or every scenario at once
+    all_scenarios = lottery.payout_all( t=3 )
+    pprint( dict( [ (ticket, rewards) for ticket, rewards in all_scenarios.items() if rewards ] ) )
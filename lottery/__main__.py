@@ -0,0 +1,121 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.categoricallottery import CategoricalLottery
+from lottery.snapshot import from_bytes, is_snapshot, LOTTERY_CLASSES, _lottery_class
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import sys
+import os
+
+# Command line settlement of lotteries saved with json.dumps() or save()
+#
+#      lottery race1.json race2.snap < truths.jsonl > rewards.jsonl
+#      lottery --mode observe --write --jobs 4 lotteries/*.json --input ticks.jsonl
+#
+# Each input line is a JSON object such as {"value": "3", "t": 1600000050}, optionally with "file" to apply it
+# to one lottery only (otherwise it applies to every file). Lines are applied to each file in order.
+#
+#      --mode settle   (default) pays out every horizon and then records the truth, printing consolidated rewards
+#      --mode observe  only records the truth
+#
+# One JSON line is written per event and file, in input order, whatever --jobs is. With --write the updated
+# lotteries are saved back over the originals, in the format they were read in.
+#
+# A snapshot comes back as the class it was saved from. JSON does not record the class, so JSON files are read as
+# OngoingCategoricalLottery unless --cls names another (e.g. --cls CategoricalLottery for one-off races).
+
+
+def _apply(L, event:dict, mode:str) -> dict:
+    value, t = event['value'], event['t']
+    if mode == 'observe':
+        return dict(n=L.observe(value=value, t=t))
+    if isinstance(L, CategoricalLottery):
+        return dict(rewards=L.settle(value=value, t=t))
+    settled = L.observe_and_settle(value=value, t=t)
+    return dict(rewards=settled['total'], horizons=settled['horizons'])
+
+
+def _process_file(path:str, events:[(int, dict)], mode:str, write:bool, cls:str=None) -> [(int, dict)]:
+    """ Apply events to one file
+    :param cls:   Name of the lottery class to read the file as, overriding the default
+    :return: (line number, output record) pairs
+    """
+    with open(path, 'rb') as f:
+        b = f.read()
+    snapshot = is_snapshot(b)
+    cls = _lottery_class(cls) if cls else None
+    L = from_bytes(b, cls=cls) if snapshot else (cls or OngoingCategoricalLottery)(**json.loads(b.decode('utf-8')))
+    results = list()
+    for line_no, event in events:
+        record = dict(file=path, value=event.get('value'), t=event.get('t'))
+        try:
+            record.update(_apply(L, event, mode))
+        except Exception as e:
+            record['error'] = type(e).__name__+': '+str(e)
+        results.append((line_no, record))
+    if write:
+        tmp_path = path + '.tmp'
+        if snapshot:
+            L.save(tmp_path)
+        else:
+            with open(tmp_path, 'w') as f:
+                json.dump(L, f)
+        os.replace(tmp_path, path)
+    return results
+
+
+def _read_events(lines, files:[str]) -> dict:
+    """ { file: [(line number, event)] } """
+    by_file = dict([(path, list()) for path in files])
+    for line_no, line in enumerate(lines):
+        if not line.strip():
+            continue
+        event = json.loads(line)
+        targets = [event['file']] if 'file' in event else files
+        for path in targets:
+            if path not in by_file:
+                raise ValueError('Line '+str(line_no+1)+' refers to '+path+', which was not given')
+            by_file[path].append((line_no, event))
+    return by_file
+
+
+def main(argv:[str]=None) -> int:
+    parser = argparse.ArgumentParser(prog='lottery', description='Apply observations or settlements to saved lotteries')
+    parser.add_argument('files', nargs='+', help='Lotteries saved as JSON or with save()')
+    parser.add_argument('--input', help='JSON lines of events (default stdin)')
+    parser.add_argument('--output', help='Where to write JSON lines of results (default stdout)')
+    parser.add_argument('--mode', choices=['settle', 'observe'], default='settle')
+    parser.add_argument('--jobs', type=int, default=1, help='Files processed in parallel')
+    parser.add_argument('--write', action='store_true', help='Save updated lotteries over the originals')
+    parser.add_argument('--cls', choices=list(LOTTERY_CLASSES) + ['CombinatorialLottery'],
+                        help='Lottery class to read files as (default: as saved for snapshots, else OngoingCategoricalLottery)')
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input) as f:
+            by_file = _read_events(f, files=args.files)
+    else:
+        by_file = _read_events(sys.stdin, files=args.files)
+
+    if args.jobs > 1 and len(by_file) > 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            futures = [executor.submit(_process_file, path, events, args.mode, args.write, args.cls) for path, events in by_file.items()]
+            done = [item for future in futures for item in future.result()]
+    else:
+        done = [item for path, events in by_file.items() for item in _process_file(path, events, args.mode, args.write, args.cls)]
+
+    # Input order, then file order, however the work was split
+    order = dict([(path, i) for i, path in enumerate(by_file)])
+    done.sort(key=lambda item: (item[0], order[item[1]['file']]))
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for _, record in done:
+            out.write(json.dumps(record) + '\n')
+    finally:
+        if args.output:
+            out.close()
+    return 1 if any(['error' in record for _, record in done]) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from collections import deque
+import asyncio
+
+# An asyncio front end to a lottery, for servers that take submissions on an event loop.
+#
+#      - Calls are queued per lottery and applied strictly in the order they were made, so last_bet_time
+#        rejects out of order or repeated submissions exactly as the synchronous add() does
+#      - A single drain task applies runs of consecutive add() calls with add_many(), up to max_batch at a time,
+#        yielding to the loop between batches so a burst of submissions does not starve other tasks
+#      - observe(), payout() and suggest() wait their turn behind earlier submissions
+#
+# Usage:
+#      L = AsyncOngoingCategoricalLottery(allowed_horizons=['k=1&tau=0'])
+#      await L.add(t=20, owner='mary', values=['1', '3'], weights=[0.75, 0.25])
+#      rewards = await L.payout(t=50, value='3')
+
+
+class AsyncOngoingCategoricalLottery:
+
+    def __init__(self, lottery:OngoingCategoricalLottery=None, max_batch:int=1024, **kwargs):
+        """
+        :param lottery:     Lottery to wrap, otherwise one is created from kwargs
+        :param max_batch:   Most submissions applied before yielding to the event loop
+        """
+        self.lottery = OngoingCategoricalLottery(**kwargs) if lottery is None else lottery
+        self.max_batch = max_batch
+        self.pending = deque()
+        self.drainer = None
+
+    async def add(self, t:int, owner:str, values:[str], weights:[float]=None, amount=1.0, k:int=None, tau:int=None) -> int:
+        """ :return: 1 if accepted, 0 otherwise, as for OngoingCategoricalLottery.add """
+        return await self._enqueue('add', dict(t=t, owner=owner, values=values, weights=weights, amount=amount, k=k, tau=tau))
+
+    async def observe(self, value:str, t:int, approx_max_len:int=10000):
+        return await self._enqueue('observe', dict(value=value, t=t, approx_max_len=approx_max_len))
+
+    async def payout(self, t:int, value:str, consolidate=False, k:int=None, tau:int=None):
+        return await self._enqueue('payout', dict(t=t, value=value, consolidate=consolidate, k=k, tau=tau))
+
+    async def suggest(self, t:int=None, k:int=None, tau:int=None) -> dict:
+        return await self._enqueue('suggest', dict(t=t, k=k, tau=tau))
+
+    async def join(self):
+        """ Wait until everything queued so far has been applied """
+        while self.drainer is not None and not self.drainer.done():
+            await asyncio.shield(self.drainer)
+
+    def _enqueue(self, method:str, kwargs:dict) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((method, kwargs, future))
+        if self.drainer is None or self.drainer.done():
+            self.drainer = loop.create_task(self._drain())
+        return future
+
+    async def _drain(self):
+        while self.pending:
+            if self.pending[0][0] == 'add':
+                batch = list()
+                while self.pending and self.pending[0][0] == 'add' and len(batch) < self.max_batch:
+                    batch.append(self.pending.popleft())
+                self._apply_adds(batch)
+            else:
+                method, kwargs, future = self.pending.popleft()
+                _resolve(future, getattr(self.lottery, method), kwargs)
+            await asyncio.sleep(0)
+
+    def _apply_adds(self, batch:list):
+        """ Apply with add_many(), resuming after any submission that raises
+            Should add_many() itself fail, the rest are applied one add() at a time, so every caller still hears back.
+        """
+        while batch:
+            try:
+                codes, error = self.lottery._add_many([kwargs for _, kwargs, _ in batch])
+            except Exception:
+                for _, kwargs, future in batch:
+                    _resolve(future, self.lottery.add, kwargs)
+                return
+            for (_, _, future), code in zip(batch, codes):
+                if not future.cancelled():
+                    future.set_result(code)
+            batch = batch[len(codes):]
+            if error is not None:
+                if not batch[0][2].cancelled():
+                    batch[0][2].set_exception(error)
+                batch = batch[1:]
+
+
+def _resolve(future:asyncio.Future, func, kwargs:dict):
+    """ Apply the call even if the caller has stopped waiting, since later calls were queued assuming it """
+    try:
+        result = func(**kwargs)
+    except Exception as e:
+        if not future.cancelled():
+            future.set_exception(e)
+    else:
+        if not future.cancelled():
+            future.set_result(result)
@@ -0,0 +1,58 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.conventions import horizon_str_to_k_and_tau
+
+# Replays recorded tapes of submissions and observations through a lottery, to backtest reward conventions.
+#
+#      - Both tapes are iterators in time order, consumed lazily
+#      - Submissions up to and including an observation's time are applied first, with add_many()
+#      - Each observation is then settled for every horizon and recorded, as observe_and_settle() does,
+#        and the rewards are yielded
+#      - The lottery is columnar, compacts itself as it goes and keeps only a short observation history,
+#        so memory depends on the number of owners and values but not on the length of the tapes
+#
+# Rewards are the same as feeding the tapes to add() and observe_and_settle() one event at a time.
+# The first observation opens the lottery. Submissions before it are skipped, as add() would reject them,
+# but those made exactly at the opening time are kept.
+#
+# Usage:
+#      for settled in backtest(submissions=subs, observations=obs, allowed_horizons=['k=1&tau=5']):
+#          pnl.update(settled['total'])
+
+
+def backtest(submissions, observations, allowed_horizons:[str], compact_every:int=10000, history_len:int=1000,
+             lottery:OngoingCategoricalLottery=None):
+    """
+    :param submissions:       (t, owner, values, weights, amount) tuples, optionally followed by k, tau, or dicts of add() arguments
+    :param observations:      (t, value) pairs
+    :param allowed_horizons:  Horizons to settle
+    :param compact_every:     Rows added between compactions
+    :param history_len:       Observations kept, which must exceed the largest k
+    :param lottery:           Lottery to replay into, if not a new one
+    :return: generator of {'t', 'value', 'horizons': { horizon: rewards }, 'total': rewards } per observation after the first
+    """
+    max_k = max([horizon_str_to_k_and_tau(h).k for h in allowed_horizons])
+    if history_len <= max_k:
+        raise ValueError('history_len must exceed the largest k, which is '+str(max_k))
+    if lottery is None:
+        lottery = OngoingCategoricalLottery(allowed_horizons=allowed_horizons, compact_every=compact_every, storage='columnar')
+
+    submissions = iter(submissions)
+    pending = next(submissions, None)
+    for t, value in observations:
+        batch = list()
+        while (pending is not None) and (_time(pending) <= t):
+            batch.append(pending)
+            pending = next(submissions, None)
+        if not lottery['state']['time_history']:
+            lottery.observe(value=value, t=t, approx_max_len=history_len)   # Opens the lottery
+            if batch:
+                lottery.add_many(batch)      # Those at the opening time count, as with add()
+            continue
+        if batch:
+            lottery.add_many(batch)
+        settled = lottery.observe_and_settle(value=value, t=t, approx_max_len=history_len)
+        yield dict(t=t, value=value, horizons=settled['horizons'], total=settled['total'])
+
+
+def _time(record):
+    return record['t'] if isinstance(record, dict) else record[0]
@@ -11,17 +11,26 @@ class CategoricalLottery(OngoingCategoricalLottery):
         is_new = state is None
         super().__init__(state=state, meta=meta, allowed_values=allowed_values, allowed_horizons_style='once')
         if is_new:
-            super().observe(t=t,value='open')
+            self._observe(t=t,value='open')
 
     def observe(self, value:str, t:int, approx_max_len:int=10000):
         raise NotImplementedError('Use __init__, close, settle instead')
 
     def close(self, t:int):
-        super().observe(t=t, value='close')
+        self._observe(t=t, value='close')
+        if self.event_log is not None:
+            self.event_log.record('x', t)
+
+    def observe_and_settle(self, value:str, t:int=MAX_TAU, approx_max_len:int=10000) -> dict:
+        """ settle(), in the form OngoingCategoricalLottery.observe_and_settle() returns, since observe() is not allowed """
+        rewards = self.settle(value=value, t=t)
+        return {'horizons': {self['meta']['allowed_horizons'][0]: rewards}, 'total': rewards}
 
     def settle(self, value:str, t:int=MAX_TAU):
         rewards = self.payout(t=t, value=value, consolidate=True)
-        super().observe(t=t, value=value)
+        self._observe(t=t, value=value)
+        if self.event_log is not None:
+            self.event_log.record('s', value, t)
         return rewards
 
 
@@ -0,0 +1,270 @@
+from lottery.poolindex import HorizonPool
+from lottery.inclusion import numpyinclusion
+from array import array
+from bisect import bisect_right
+
+# Columnar storage for an OngoingCategoricalLottery, selected with storage='columnar'
+#
+#      - Owners and values are interned to integer ids, per horizon
+#      - Times, owner ids, value ids and amounts live in array('q') and array('d') buffers
+#      - state['bets'] and state['bet_totals'] keep their keys, but their lists are read-only views
+#        rendered from the buffers on demand, so json.dumps() still produces the usual schema
+#
+# Times are usually integers (rounded epoch seconds) and amounts floats. A column that receives anything else,
+# such as a time of 1.5 or an amount of 1, falls back to a plain list before the submission is recorded, so
+# nothing is converted and the state renders exactly as it would with storage='json'.
+
+
+class ColumnarPool(HorizonPool):
+    """ A HorizonPool holding its columns in typed arrays """
+
+    def __init__(self):
+        super().__init__()
+        self.sub_time = array('q')
+        self.sub_owner = array('q')
+        self.sub_amount = array('d')
+        self.sub_start = array('q')
+        self.sub_end = array('q')
+        self.row_value = array('q')
+        self.row_amount = array('d')
+        self.owner_list = list()    # id -> owner
+        self.owner_ids = dict()     # owner -> id
+        self.value_list = list()    # id -> value, while self.values maps value -> id
+        self.value_rows = list()    # id -> array of rows betting on the value
+
+    def intern_owner(self, owner:str) -> int:
+        if owner not in self.owner_ids:
+            self.owner_ids[owner] = len(self.owner_list)
+            self.owner_list.append(owner)
+            self.owner_times[owner] = array('q') if isinstance(self.sub_time, array) else list()
+            self.owner_subs[owner] = array('q')
+        return self.owner_ids[owner]
+
+    def intern_value(self, value) -> int:
+        if value not in self.values:
+            self.values[value] = len(self.value_list)
+            self.value_list.append(value)
+            self.value_rows.append(array('q'))
+        return self.values[value]
+
+    def value_key(self, value):
+        return self.values.get(value)
+
+    def decode_values(self, d:dict) -> dict:
+        return dict([(self.value_list[key], x) for key, x in d.items()])
+
+    def owner(self, s:int) -> str:
+        return self.owner_list[self.sub_owner[s]]
+
+    def rows(self, s:int):
+        return [(self.value_list[self.row_value[r]], self.row_amount[r]) for r in range(self.sub_start[s], self.sub_end[s])]
+
+    def empty_copy(self):
+        pool = ColumnarPool()
+        for owner in self.owner_list:
+            pool.intern_owner(owner)
+        for value in self.value_list:
+            pool.intern_value(value)
+        return pool
+
+    def add(self, t:int, owner:str, amount:float, rows:[(str, float)]) -> int:
+        # Anything a typed array would refuse or alter sends its column back to a list, before anything changes
+        if isinstance(self.sub_time, array) and not _fits(t, 'q'):
+            self.sub_time = list(self.sub_time)
+            for owner_ in self.owner_times:
+                self.owner_times[owner_] = list(self.owner_times[owner_])
+        if isinstance(self.sub_amount, array) and not _fits(amount, 'd'):
+            self.sub_amount = list(self.sub_amount)
+        if isinstance(self.row_amount, array) and not all([_fits(a, 'd') for _, a in rows]):
+            self.row_amount = list(self.row_amount)
+        n_rows = len(self.row_value)
+        s = super().add(t=t, owner=owner, amount=amount, rows=rows)
+        for r in range(n_rows, len(self.row_value)):
+            self.value_rows[self.row_value[r]].append(r)
+        return s
+
+    def value_triples(self, value) -> list:
+        """ state['bets'][h][value] as it would be stored: [[time, owner, amount]] """
+        vid = self.values.get(value)
+        if vid is None:
+            return list()
+        triples = list()
+        for r in self.value_rows[vid]:
+            s = bisect_right(self.sub_start, r) - 1
+            triples.append([self.sub_time[s], self.owner(s), self.row_amount[r]])
+        return triples
+
+    def owner_pairs(self, owner:str) -> list:
+        """ state['bet_totals'][h][owner] as it would be stored: [[time, amount]] """
+        return [[t_, self.sub_amount[s]] for t_, s in zip(self.owner_times.get(owner, ()), self.owner_subs.get(owner, ()))]
+
+    def _money_after(self, t_cutoff:int):
+        if not (self.row_value and numpyinclusion.using_numpy):
+            return super()._money_after(t_cutoff=t_cutoff)
+        # bincount accumulates in order, matching the pure Python sums exactly
+        import numpy as np
+        subs = np.flatnonzero(_numpy(np, self.sub_time, np.int64) > t_cutoff)
+        rows = self._rows_of(subs)
+        row_value = np.frombuffer(self.row_value, dtype=np.int64)[rows]
+        money = np.bincount(row_value, weights=_numpy(np, self.row_amount, np.float64)[rows],
+                            minlength=len(self.value_list)).tolist()
+        counts = np.bincount(row_value, minlength=len(self.value_list)).tolist()
+        return dict([(v, money[i]) for i, v in enumerate(self.value_list) if counts[i]]), len(rows)
+
+    def _rows_of(self, subs):
+        """ Row numbers of the given submissions, in order """
+        import numpy as np
+        starts = np.frombuffer(self.sub_start, dtype=np.int64)[subs]
+        lengths = np.frombuffer(self.sub_end, dtype=np.int64)[subs] - starts
+        offsets = np.cumsum(lengths) - lengths
+        return np.repeat(starts - offsets, lengths) + np.arange(int(lengths.sum()), dtype=np.int64)
+
+    def winning_rows(self, winning:[int], values:list):
+        if not (winning and self.row_value and numpyinclusion.using_numpy):
+            return super().winning_rows(winning=winning, values=values)
+        # Gather straight from the buffers
+        import numpy as np
+        subs = np.asarray(winning, dtype=np.int64)
+        rows = self._rows_of(subs)
+        lengths = np.frombuffer(self.sub_end, dtype=np.int64)[subs] - np.frombuffer(self.sub_start, dtype=np.int64)[subs]
+        lookup = np.full(len(self.value_list), -1, dtype=np.int64)
+        for i, v in enumerate(values):
+            if v in self.values:
+                lookup[self.values[v]] = i
+        positions = lookup[np.frombuffer(self.row_value, dtype=np.int64)[rows]]
+        matched = positions >= 0
+        owner_ids = np.repeat(np.frombuffer(self.sub_owner, dtype=np.int64)[subs], lengths)[matched]
+        amounts = _numpy(np, self.row_amount, np.float64)[rows[matched]]
+        return [self.owner_list[i] for i in owner_ids.tolist()], positions[matched], amounts
+
+
+def _fits(x, typecode:str) -> bool:
+    """ Whether an array of this typecode would hold x exactly as it is """
+    if typecode == 'q':
+        return isinstance(x, int) and not isinstance(x, bool) and (-2**63 <= x < 2**63)
+    return isinstance(x, float)
+
+
+def _numpy(np, column, dtype):
+    """ A column as a numpy array, sharing the buffer unless it has fallen back to a list """
+    return np.frombuffer(column, dtype=dtype) if isinstance(column, array) else np.asarray(column)
+
+
+class _RenderedList(list):
+    """ A read-only list whose items are rendered on demand rather than stored
+        The list's own storage stays empty, so every reading method is overridden to use render().
+    """
+
+    def render(self) -> list:
+        raise NotImplementedError
+
+    def __iter__(self):
+        return iter(self.render())
+
+    def __reversed__(self):
+        return reversed(self.render())
+
+    def __len__(self):
+        return len(self.render())
+
+    def __getitem__(self, i):
+        return self.render()[i]
+
+    def __contains__(self, item):
+        return item in self.render()
+
+    def __eq__(self, other):
+        return self.render() == (other.render() if isinstance(other, _RenderedList) else other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __add__(self, other):
+        return self.render() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.render()
+
+    def __mul__(self, n):
+        return self.render() * n
+
+    __rmul__ = __mul__
+
+    def __lt__(self, other):
+        return self.render() < list(other)
+
+    def __le__(self, other):
+        return self.render() <= list(other)
+
+    def __gt__(self, other):
+        return self.render() > list(other)
+
+    def __ge__(self, other):
+        return self.render() >= list(other)
+
+    def count(self, item) -> int:
+        return self.render().count(item)
+
+    def index(self, item, *args) -> int:
+        return self.render().index(item, *args)
+
+    def __repr__(self):
+        return repr(self.render())
+
+    def __reduce__(self):
+        return list, (self.render(),)
+
+    def copy(self):
+        return self.render()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Columnar lottery state is read-only. Use add() instead.')
+
+    __hash__ = None
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+
+
+class BetsView(_RenderedList):
+    """ state['bets'][h][value] """
+
+    def __init__(self, index, h:str, value):
+        super().__init__()
+        self.pool_index, self.h, self.value = index, h, value
+
+    def render(self):
+        return self.pool_index.pools[self.h].value_triples(self.value)
+
+    def __len__(self):
+        pool = self.pool_index.pools[self.h]
+        vid = pool.values.get(self.value)
+        return 0 if vid is None else len(pool.value_rows[vid])
+
+
+class BetTotalsView(_RenderedList):
+    """ state['bet_totals'][h][owner] """
+
+    def __init__(self, index, h:str, owner:str):
+        super().__init__()
+        self.pool_index, self.h, self.owner = index, h, owner
+
+    def render(self):
+        return self.pool_index.pools[self.h].owner_pairs(self.owner)
+
+    def __len__(self):
+        return len(self.pool_index.pools[self.h].owner_times.get(self.owner, ()))
+
+
+def attach_views(state:dict, index, h:str, owners:list=None, values:list=None):
+    """ Point state['bets'][h] and state['bet_totals'][h] entries at views of the index
+    :param owners, values:  Only these (default everyone and everything in the pool)
+    """
+    pool = index.pools[h]
+    bets = state['bets'].setdefault(h, dict())
+    bet_totals = state['bet_totals'].setdefault(h, dict())
+    for v in (pool.values if values is None else values):
+        if not isinstance(bets.get(v), BetsView):
+            bets[v] = BetsView(index=index, h=h, value=v)
+    for owner in (pool.owner_times if owners is None else owners):
+        if not isinstance(bet_totals.get(owner), BetTotalsView):
+            bet_totals[owner] = BetTotalsView(index=index, h=h, owner=owner)
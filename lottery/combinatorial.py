@@ -0,0 +1,156 @@
+from lottery.categoricallottery import CategoricalLottery
+from lottery.ongoingcategoricallottery import _add_records, _add_record
+from lottery.conventions import MAX_TAU
+try:
+    from math import comb
+except ImportError:
+    from math import factorial
+
+    def comb(n:int, k:int) -> int:
+        """ math.comb(), which needs Python 3.8 """
+        return factorial(n)//(factorial(k)*factorial(n-k)) if 0 <= k <= n else 0
+
+# One-off lotteries whose outcomes are combinations, such as choosing 6 numbers from 49
+#
+#      - Combinations(n, r) is the outcome space, which is never listed. A ticket such as '3-17-22-30-41-49'
+#        (or any iterable of its numbers, in any order) is checked and converted to its rank, an integer
+#        below comb(n, r), in the combinatorial number system
+#      - CombinatorialLottery stores and settles bets by rank, so the pool holds one row per ticket bet on and
+#        settle() costs the same as for any CategoricalLottery, whatever the size of the outcome space
+#      - Its methods also accept ranks in place of tickets, which is how the event log records them
+#
+# Usage:
+#      L = CombinatorialLottery(n=49, r=6)
+#      L.add(t=0, owner='bill', values=['1-2-3-4-5-6', '3-17-22-30-41-49'])
+#      L.close(t=1)
+#      rewards = L.settle(value='3-17-22-30-41-49', t=2)
+
+
+class Combinations:
+    """ Combinations of r numbers from base, base+1, ..., base+n-1, written as tickets such as '1-5-6' """
+
+    def __init__(self, n:int, r:int, base:int=1, sep:str='-'):
+        if not (0 <= r <= n):
+            raise ValueError('Need 0 <= r <= n, not r='+str(r)+' and n='+str(n))
+        self.n, self.r, self.base, self.sep = n, r, base, sep
+
+    def __len__(self):
+        return comb(self.n, self.r)
+
+    def __contains__(self, ticket):
+        try:
+            self.rank(ticket)
+        except ValueError:
+            return False
+        return True
+
+    def to_meta(self) -> dict:
+        return dict(n=self.n, r=self.r, base=self.base, sep=self.sep)
+
+    def numbers(self, ticket) -> [int]:
+        """ Zero-based numbers of a ticket, increasing
+        :param ticket:  str such as '5-1-6', or an iterable of numbers
+        """
+        try:
+            parts = (ticket.split(self.sep) if ticket else []) if isinstance(ticket, str) else ticket
+            numbers = [int(x) for x in parts]
+        except (TypeError, ValueError):
+            raise ValueError('Not a ticket: '+repr(ticket))
+        numbers = sorted([x - self.base for x in numbers])
+        if len(numbers) != self.r:
+            raise ValueError('A ticket has '+str(self.r)+' numbers, not '+str(len(numbers))+': '+repr(ticket))
+        if numbers and ((numbers[0] < 0) or (numbers[-1] >= self.n)):
+            raise ValueError('Numbers run from '+str(self.base)+' to '+str(self.base+self.n-1)+': '+repr(ticket))
+        if any([a == b for a, b in zip(numbers, numbers[1:])]):
+            raise ValueError('Numbers in a ticket must differ: '+repr(ticket))
+        return numbers
+
+    def rank(self, ticket) -> int:
+        """ Position of the ticket in colexicographic order, from 0 to len(self)-1 """
+        return sum([comb(c, i+1) for i, c in enumerate(self.numbers(ticket))])
+
+    def unrank(self, rank:int) -> str:
+        """ The ticket with this rank """
+        if isinstance(rank, bool) or not isinstance(rank, int) or not (0 <= rank < len(self)):
+            raise ValueError('Rank must be an integer from 0 to '+str(len(self)-1)+', not '+repr(rank))
+        numbers = list()
+        c = self.n
+        for i in range(self.r, 0, -1):
+            c -= 1
+            while comb(c, i) > rank:
+                c -= 1
+            numbers.append(c)
+            rank -= comb(c, i)
+        return self.sep.join([str(c + self.base) for c in reversed(numbers)])
+
+    def bitmask(self, ticket) -> int:
+        """ The ticket as an integer with bit c set for each zero-based number c """
+        return sum([1 << c for c in self.numbers(ticket)])
+
+    def from_bitmask(self, mask:int) -> str:
+        if isinstance(mask, bool) or not isinstance(mask, int) or not (0 <= mask < (1 << self.n)) \
+                or bin(mask).count('1') != self.r:
+            raise ValueError('Not a bitmask of '+str(self.r)+' numbers from '+str(self.n)+': '+repr(mask))
+        return self.sep.join([str(c + self.base) for c in range(self.n) if (mask >> c) & 1])
+
+
+class CombinatorialLottery(CategoricalLottery):
+    """ A CategoricalLottery whose values are tickets from Combinations(n, r), kept as ranks
+        add(), payout(), payout_all(), suggest() and settle() take and return tickets. The state holds ranks.
+        As with any CategoricalLottery, observe() is not allowed.
+    """
+
+    def __init__(self, state=None, meta=None, n:int=None, r:int=None, base:int=1, sep:str='-', t:int=-MAX_TAU):
+        meta = dict() if meta is None else meta
+        if 'combinations' not in meta:
+            if (n is None) or (r is None):
+                raise ValueError('Specify n and r, or give meta from an existing CombinatorialLottery')
+            meta['combinations'] = Combinations(n=n, r=r, base=base, sep=sep).to_meta()
+        self.space = Combinations(**meta['combinations'])
+        if state is not None:
+            # JSON turns the ranks keying state['bets'] into strings
+            state['bets'] = dict([(h, dict([(int(v), triples) for v, triples in bets.items()]))
+                                  for h, bets in state.get('bets', dict()).items()])
+        super().__init__(state=state, meta=meta, t=t)
+
+    def rank(self, value) -> int:
+        """ Rank of a ticket. An int is taken to be a rank already, as the state and event log hold them. """
+        if isinstance(value, int) and not isinstance(value, bool):
+            if not (0 <= value < len(self.space)):
+                raise ValueError('Rank must be from 0 to '+str(len(self.space)-1)+', not '+repr(value))
+            return value
+        return self.space.rank(value)
+
+    def add(self, t:int, owner:str, values:[str], weights:[float]=None, amount=1.0, k:int=None, tau:int=None) -> int:
+        return super().add(t=t, owner=owner, values=[self.rank(v) for v in values], weights=weights,
+                           amount=amount, k=k, tau=tau)
+
+    def _add_many(self, records, k:int=None, tau:int=None, use_numpy:bool=None):
+        ranked = list()
+        error = None
+        for record in _add_records(records):
+            try:
+                record = _add_record(record)
+                ranked.append(record[:2] + ([self.rank(v) for v in record[2]],) + record[3:])
+            except Exception as e:
+                error = e      # Raised once the records before it are applied
+                break
+        codes, e = super()._add_many(ranked, k=k, tau=tau, use_numpy=use_numpy)
+        return codes, e or error
+
+    def payout(self, t:int, value:str, consolidate=False, k:int=None, tau:int=None):
+        return super().payout(t=t, value=self.rank(value), consolidate=consolidate, k=k, tau=tau)
+
+    def payout_all(self, t:int, values:[str]=None, consolidate=False, k:int=None, tau:int=None, use_numpy:bool=None) -> dict:
+        """ { ticket: rewards }, by default for the tickets bet on rather than every ticket """
+        ranks = [self.rank(v) for v in values] if values is not None else None
+        rewards = super().payout_all(t=t, values=ranks, consolidate=consolidate, k=k, tau=tau, use_numpy=use_numpy)
+        return dict([(self.space.unrank(rank), x) for rank, x in rewards.items()])
+
+    def settle(self, value:str, t:int=MAX_TAU):
+        """ Pays out on a ticket, recording it as unrank() writes it, so '3-2-1' is observed as '1-2-3' """
+        return super().settle(value=self.space.unrank(self.rank(value)), t=t)
+
+    def suggest_with_count(self, t:int=None, k:int=None, tau:int=None):
+        weights, n_bets = super().suggest_with_count(t=t, k=k, tau=tau)
+        return dict([(self.space.unrank(rank), w) for rank, w in weights.items()]), n_bets
@@ -1,4 +1,5 @@
 from itertools import groupby
+from collections import namedtuple
 from typing import Union
 
 NORMALIZATION_TOLERANCE = 1e-8
@@ -6,18 +7,56 @@ NEG_INF_CUTOFF_TIME = -10000000000     # Avoid numpy dependency
 MAX_TAU = 1000*1000*1000               # About 300 years
 
 
+class Horizon(namedtuple('Horizon', ['k', 'tau'])):
+    """ A horizon as a hashable (k, tau) pair. str() gives the form used as a key in the JSON state. """
+    __slots__ = ()
+
+    def __str__(self):
+        return k_and_tau_to_horizon_str(k=self.k, tau=self.tau)
+
+    @staticmethod
+    def parse(h):
+        """ From 'k=1&tau=0', a Horizon, or a (k, tau) pair """
+        if isinstance(h, str):
+            return horizon_str_to_k_and_tau(h)
+        return h if isinstance(h, Horizon) else Horizon(*h)
+
+
+# Both directions are remembered, as there are only ever a few horizons in use
+_HORIZON_STRS = dict()       # (k, tau) -> 'k=..&tau=..'
+_HORIZONS = dict()           # 'k=..&tau=..' -> Horizon
+MAX_INTERNED_HORIZONS = 10000
+
+
+def _intern(k:int, tau:int, h:str):
+    if len(_HORIZONS) < MAX_INTERNED_HORIZONS:
+        _HORIZONS[h] = Horizon(k, tau)
+        _HORIZON_STRS[(k, tau)] = h
+
+
 def k_and_tau_to_horizon_str(k:int, tau:int):
     """  (1,0)  -> k=1&tau=0 -> (1,0)
        A convention for packing 2-tuple into something hashable and json'able
     """
+    if type(k) is int and type(tau) is int:
+        h = _HORIZON_STRS.get((k, tau))
+        if h is None:
+            h = 'k='+str(k)+'&tau='+str(tau)
+            _intern(k, tau, h)
+        return h
     return 'k='+str(k)+'&tau='+str(tau)
 
 
 def horizon_str_to_k_and_tau(h:str):
-    """  k=1&tau=0 -> (1,0) """
-    k = int(h.split('&')[0].split('=')[1])
-    tau = int(h.split('&')[1].split('=')[1])
-    return k, tau
+    """  k=1&tau=0 -> (1,0), as a Horizon """
+    parsed = _HORIZONS.get(h)
+    if parsed is None:
+        k = int(h.split('&')[0].split('=')[1])
+        tau = int(h.split('&')[1].split('=')[1])
+        # Interns the canonical spelling, whose Horizon is then shared. A non-canonical spelling such as k=01&tau=0
+        # is understood, but not remembered itself.
+        parsed = _HORIZONS.get(k_and_tau_to_horizon_str(k, tau)) or Horizon(k, tau)
+    return parsed
 
 # Hardwire some common usage patterns
 ONCE_HORIZON = k_and_tau_to_horizon_str(k=1, tau=0)
@@ -26,6 +65,8 @@ ALLOWED_HORIZON_STYLES = {
           'once':[ONCE_HORIZON]    # One-off lottery, or horse race
                           }
 
+STORAGE_MODES = ['json', 'columnar']   # Lists in the state, or typed arrays with views in the state
+
 
 
 
@@ -98,6 +139,8 @@ def consolidate_rewards(rewards:[(str, float)]) -> [(str,float)]:
 
 def equal_rewards(r1:[(str, float)], r2:[(str, float)])->bool:
     """ True if two reward listings are equivalent """
+    if r1 == r2:
+        return True
     c1 = consolidate_rewards(r1)
     c2 = consolidate_rewards(r2)
     return c1==c2
@@ -0,0 +1,150 @@
+from lottery.snapshot import save, load
+import json
+import os
+
+# An append-only log of the calls that change a lottery, so that state can be rebuilt after a crash
+# without dumping everything on every write.
+#
+#      - Each accepted add(), and every observe(), close(), settle() and compact(), appends one JSON line
+#      - A checkpoint writes a binary snapshot (see snapshot.py) next to the log, then a line pointing at it
+#      - replay() loads the latest checkpoint and applies the events recorded after it
+#
+# Records are short lists:
+#      ["a", t, owner, values, weights, amount, k, tau]      add
+#      ["o", value, t, approx_max_len]                       observe
+#      ["x", t]                                              close
+#      ["s", value, t]                                       settle
+#      ["k", t]                                              compact
+#      ["c", n_events, snapshot_file_name]                   checkpoint
+#
+# Usage:
+#      log = EventLog('lottery.log', checkpoint_every=10000)
+#      L = log.attach(OngoingCategoricalLottery(...))
+#      ...
+#      L = OngoingCategoricalLottery.replay('lottery.log')
+
+CHECKPOINT = 'c'
+
+
+def _apply(L, event:list):
+    op = event[0]
+    if op == 'a':
+        return L.add(t=event[1], owner=event[2], values=event[3], weights=event[4], amount=event[5], k=event[6], tau=event[7])
+    elif op == 'o':
+        return L.observe(value=event[1], t=event[2], approx_max_len=event[3])
+    elif op == 'x':
+        return L.close(t=event[1])
+    elif op == 's':
+        return L.settle(value=event[1], t=event[2])
+    elif op == 'k':
+        return L.compact(t=event[1])
+    else:
+        raise ValueError('Unknown event '+str(op))
+
+
+def _read_lines(path:str) -> [str]:
+    """ Complete lines only. A torn final line, from a crash mid-write, is left out. """
+    with open(path, 'r') as f:
+        lines = f.read().split('\n')
+    return lines[:-1]
+
+
+class EventLog:
+
+    def __init__(self, path:str, checkpoint_every:int=None, fsync:bool=False):
+        """
+        :param path:              Log file, appended to if it exists
+        :param checkpoint_every:  Write a checkpoint after this many events
+        :param fsync:             Force every record to disk, not just flush it
+        """
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.fsync = fsync
+        self.lottery = None
+        self.n_events = 0
+        self.since_checkpoint = 0
+        self.last_snapshot = None
+        if os.path.exists(path):
+            lines = _read_lines(path)
+            with open(path, 'r+') as f:   # Drop any torn final line before appending
+                f.truncate(sum([len(line)+1 for line in lines]))
+            for line in lines:
+                if line.startswith('["'+CHECKPOINT+'"'):
+                    self.since_checkpoint = 0
+                else:
+                    self.n_events += 1
+                    self.since_checkpoint += 1
+        self.file = open(path, 'a')
+
+    def attach(self, lottery):
+        """ Start recording calls on lottery, beginning with a checkpoint of its current state """
+        self.lottery = lottery
+        lottery.event_log = self
+        self.checkpoint()
+        return lottery
+
+    def detach(self):
+        if self.lottery is not None:
+            self.lottery.event_log = None
+            self.lottery = None
+
+    def record(self, *event):
+        self._write(list(event))
+        self.n_events += 1
+        self.since_checkpoint += 1
+        if self.checkpoint_every and self.since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self) -> str:
+        """ Snapshot the lottery and note it in the log
+        :return: path of the snapshot
+        """
+        name = os.path.basename(self.path)+'.'+str(self.n_events)+'.snap'
+        snapshot_path = os.path.join(os.path.dirname(self.path), name)
+        save(self.lottery, snapshot_path+'.tmp')
+        if self.fsync:
+            with open(snapshot_path+'.tmp', 'rb') as f:
+                os.fsync(f.fileno())
+        os.replace(snapshot_path+'.tmp', snapshot_path)
+        self._write([CHECKPOINT, self.n_events, name])
+        if self.last_snapshot is not None and self.last_snapshot != snapshot_path and os.path.exists(self.last_snapshot):
+            os.remove(self.last_snapshot)    # Only once the new checkpoint is on record
+        self.last_snapshot = snapshot_path
+        self.since_checkpoint = 0
+        return snapshot_path
+
+    def _write(self, record:list):
+        self.file.write(json.dumps(record, separators=(',', ':'))+'\n')
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.detach()
+        self.file.close()
+
+
+def replay(path:str, resume:bool=False, checkpoint_every:int=None, fsync:bool=False):
+    """ Rebuild a lottery from its event log
+    :param resume:  Keep logging to the same file from the rebuilt state
+    :return: lottery
+    """
+    lines = _read_lines(path)
+    start = None
+    for i in range(len(lines)-1, -1, -1):
+        if lines[i].startswith('["'+CHECKPOINT+'"'):
+            name = json.loads(lines[i])[2]
+            if os.path.exists(os.path.join(os.path.dirname(path), name)):
+                start = i
+                break
+    if start is None:
+        raise ValueError('No usable checkpoint in '+path)
+    L = load(os.path.join(os.path.dirname(path), json.loads(lines[start])[2]))
+    for line in lines[start+1:]:
+        if not line.startswith('["'+CHECKPOINT+'"'):
+            _apply(L, json.loads(line))
+    if resume:
+        log = EventLog(path, checkpoint_every=checkpoint_every, fsync=fsync)
+        log.last_snapshot = os.path.join(os.path.dirname(path), json.loads(lines[start])[2])
+        log.attach(L)
+    return L
@@ -0,0 +1,139 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery, _net_rewards
+from lottery.conventions import cutoff_time, horizon_str_to_k_and_tau
+from lottery.inclusion import pyarrowinclusion
+import csv
+import os
+
+# Flat tables of a lottery's contents for offline analysis, written and read a chunk at a time
+#
+#      bets          horizon, value, time, owner, amount      One row per (submission, value), in order of arrival
+#      bet_totals    horizon, owner, time, amount             One row per submission
+#      observations  time, value
+#      rewards       horizon, time, value, owner, reward      What payout() would have paid as each truth arrived
+#
+# Rows are read straight from the index, so the nested state dicts are never walked or copied.
+# Files are Parquet when pyarrow is installed, otherwise CSV. Values are written as strings.
+#
+# Rewards are reconstructed from the bets still held. They match what was paid at the time provided the
+# lottery has not been compacted past that observation, and submissions were not back-dated before it.
+
+TABLES = {'bets':         [('horizon', str), ('value', str), ('time', int), ('owner', str), ('amount', float)],
+          'bet_totals':   [('horizon', str), ('owner', str), ('time', int), ('amount', float)],
+          'observations': [('time', int), ('value', str)],
+          'rewards':      [('horizon', str), ('time', int), ('value', str), ('owner', str), ('reward', float)]}
+EXTENSIONS = {'parquet': '.parquet', 'csv': '.csv'}
+
+
+def iter_rows(lottery:OngoingCategoricalLottery, table:str):
+    """ Rows of one table as tuples, in the column order of TABLES[table] """
+    state = lottery['state']
+    if table == 'observations':
+        for t, v in zip(state['time_history'], state['value_history']):
+            yield t, str(v)
+    elif table == 'rewards':
+        yield from _reward_rows(lottery)
+    else:
+        for h, pool in lottery.index.pools.items():
+            for s in range(len(pool)):
+                t, owner = pool.sub_time[s], pool.owner(s)
+                if table == 'bet_totals':
+                    yield h, owner, t, pool.sub_amount[s]
+                else:
+                    for v, a in pool.rows(s):
+                        yield h, str(v), t, owner, a
+
+
+def _reward_rows(lottery:OngoingCategoricalLottery):
+    times, values = list(lottery['state']['time_history']), list(lottery['state']['value_history'])
+    horizons = [(h, horizon_str_to_k_and_tau(h)) for h in lottery.index.pools]
+    for i in range(1, len(times)):
+        t, value = times[i], values[i]
+        for h, (k, tau) in horizons:
+            # Only the last k times matter, so there is no need to slice the whole history
+            t_cutoff = cutoff_time(previous_times=times[max(0, i-k):i], t=t, k=k, tau=tau)
+            for owner, reward in _rewards_at_cutoff(lottery.index.pools[h], t=t, t_cutoff=t_cutoff, value=value):
+                yield h, t, str(value), owner, reward
+
+
+def _rewards_at_cutoff(pool, t:int, t_cutoff:int, value) -> list:
+    """ payout_at_cutoff(consolidate=True), without going through the pool's remembered settlements
+        Export visits every past cutoff once, and would otherwise evict the frames live queries are using.
+    """
+    if (t_cutoff>=t) or (value not in pool.values):
+        return []
+    all_totals, winning = pool.settlement_upto(t_cutoff=t_cutoff, n=len(pool), owners=pool.owner_times)
+    return _net_rewards(all_totals=all_totals, winners=pool.winners(value=value, winning=winning), consolidate=True)
+
+
+def iter_chunks(lottery:OngoingCategoricalLottery, table:str, chunk_size:int=100000):
+    """ { column: [...] } dicts of up to chunk_size rows """
+    names = [name for name, _ in TABLES[table]]
+    chunk = list()
+    for row in iter_rows(lottery, table):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield dict(zip(names, [list(column) for column in zip(*chunk)]))
+            chunk = list()
+    if chunk:
+        yield dict(zip(names, [list(column) for column in zip(*chunk)]))
+
+
+def export(lottery:OngoingCategoricalLottery, directory:str, tables:[str]=None, chunk_size:int=100000,
+           file_format:str=None) -> dict:
+    """ Write each table to its own file in directory
+    :param file_format:  'parquet' or 'csv' (default parquet if pyarrow is installed)
+    :return: { table: path }
+    """
+    file_format = file_format or ('parquet' if pyarrowinclusion.using_pyarrow else 'csv')
+    os.makedirs(directory, exist_ok=True)
+    paths = dict()
+    for table in (tables or list(TABLES)):
+        path = os.path.join(directory, table + EXTENSIONS[file_format])
+        if file_format == 'parquet':
+            _write_parquet(path, table, iter_chunks(lottery, table, chunk_size=chunk_size))
+        else:
+            _write_csv(path, table, iter_chunks(lottery, table, chunk_size=chunk_size))
+        paths[table] = path
+    return paths
+
+
+def _write_csv(path:str, table:str, chunks):
+    names = [name for name, _ in TABLES[table]]
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        for chunk in chunks:
+            writer.writerows(zip(*[chunk[name] for name in names]))
+
+
+def _write_parquet(path:str, table:str, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    types = {str: pa.string(), int: pa.int64(), float: pa.float64()}
+    schema = pa.schema([(name, types[kind]) for name, kind in TABLES[table]])
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pydict(chunk, schema=schema))
+
+
+def read_chunks(path:str, chunk_size:int=100000):
+    """ Read a file written by export() back as { column: [...] } dicts of up to chunk_size rows """
+    if path.endswith(EXTENSIONS['parquet']):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pydict()
+        return
+    table = os.path.basename(path)[:-len(EXTENSIONS['csv'])]
+    kinds = dict(TABLES.get(table, []))
+    with open(path, 'r', newline='') as f:
+        reader = csv.reader(f)
+        names = next(reader)
+        converters = [kinds.get(name, str) for name in names]
+        chunk = list()
+        for row in reader:
+            chunk.append([convert(x) for convert, x in zip(converters, row)])
+            if len(chunk) >= chunk_size:
+                yield dict(zip(names, [list(column) for column in zip(*chunk)]))
+                chunk = list()
+        if chunk:
+            yield dict(zip(names, [list(column) for column in zip(*chunk)]))
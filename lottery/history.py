@@ -0,0 +1,99 @@
+from collections import deque
+from itertools import islice
+
+# Observation history held in a deque, so that dropping the oldest entry costs nothing per entry kept.
+# observe() trims it after every append, so a full history evicts one entry at a time rather than in bursts.
+#
+#      - A list subclass, so state['time_history'] still serializes as a JSON list and compares equal to lists.
+#        The list's own storage stays empty, so every reading method is overridden to use the deque.
+#      - Appending and trimming happen in place, so references to the history stay valid
+#      - Indexing near either end, as cutoff_time() does with previous_times[-k], is O(1)
+
+
+class History(list):
+
+    def __init__(self, items=()):
+        super().__init__()
+        self.items = deque(items)
+
+    def append(self, item):
+        self.items.append(item)
+
+    def extend(self, items):
+        self.items.extend(items)
+
+    def trim(self, n:int):
+        """ Keep only the latest n entries """
+        for _ in range(max(len(self.items) - n, 0)):
+            self.items.popleft()
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __reversed__(self):
+        return reversed(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self.items))
+            if step < 0:
+                return list(self.items)[i]
+            return list(islice(self.items, start, stop, step))
+        return self.items[i]
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __eq__(self, other):
+        return list(self.items) == (list(other.items) if isinstance(other, History) else other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __add__(self, other):
+        return list(self.items) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self.items)
+
+    def __mul__(self, n):
+        return list(self.items) * n
+
+    __rmul__ = __mul__
+
+    def __lt__(self, other):
+        return list(self.items) < list(other)
+
+    def __le__(self, other):
+        return list(self.items) <= list(other)
+
+    def __gt__(self, other):
+        return list(self.items) > list(other)
+
+    def __ge__(self, other):
+        return list(self.items) >= list(other)
+
+    def count(self, item) -> int:
+        return self.items.count(item)
+
+    def index(self, item, *args) -> int:
+        return self.items.index(item, *args)
+
+    def __repr__(self):
+        return repr(list(self.items))
+
+    def __reduce__(self):
+        return list, (list(self.items),)
+
+    def copy(self):
+        return list(self.items)
+
+    def _unsupported(self, *args, **kwargs):
+        raise TypeError('Observation history only supports append() and trim()')
+
+    __hash__ = None
+    insert = pop = remove = clear = sort = reverse = _unsupported
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _unsupported
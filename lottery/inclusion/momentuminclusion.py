@@ -1,5 +1,14 @@
-try:
-    from momentum import var_init, var_update
-    using_momentum = True
-except ImportError:
-    using_momentum = False
\ No newline at end of file
+# Checked on first use of using_momentum (or var_init, var_update), as in numpyinclusion.py
+
+
+def __getattr__(name):
+    if name in ('using_momentum', 'var_init', 'var_update'):
+        global using_momentum, var_init, var_update
+        try:
+            from momentum import var_init, var_update
+            using_momentum = True
+        except ImportError:
+            var_init, var_update = None, None
+            using_momentum = False
+        return globals()[name]
+    raise AttributeError('module '+repr(__name__)+' has no attribute '+repr(name))
@@ -1,5 +1,16 @@
-try:
-    import numpy as np
-    using_numpy = True
-except ImportError:
-    using_numpy = False
\ No newline at end of file
+# Whether numpy can be imported, and numpy itself as np (None without it). Both are resolved on first use,
+# not when this module is imported, so code that never needs numpy never pays for importing it. Read them as
+# numpyinclusion.using_numpy and numpyinclusion.np at the point of use, since "from ... import" resolves straight away.
+
+
+def __getattr__(name):
+    if name in ('using_numpy', 'np'):
+        global using_numpy, np
+        try:
+            import numpy as np
+            using_numpy = True
+        except ImportError:
+            np = None
+            using_numpy = False
+        return globals()[name]
+    raise AttributeError('module '+repr(__name__)+' has no attribute '+repr(name))
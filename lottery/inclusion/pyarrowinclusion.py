@@ -0,0 +1,13 @@
+# Checked on first use of using_pyarrow, as in numpyinclusion.py
+
+
+def __getattr__(name):
+    if name == 'using_pyarrow':
+        global using_pyarrow
+        try:
+            import pyarrow
+            using_pyarrow = True
+        except ImportError:
+            using_pyarrow = False
+        return using_pyarrow
+    raise AttributeError('module '+repr(__name__)+' has no attribute '+repr(name))
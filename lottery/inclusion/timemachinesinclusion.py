@@ -1,6 +1,13 @@
-try:
-    import timemachines
-    using_timemachines = True
-except ImportError:
-    using_timemachines = False
+# Checked on first use of using_timemachines, as in numpyinclusion.py
 
+
+def __getattr__(name):
+    if name == 'using_timemachines':
+        global using_timemachines
+        try:
+            import timemachines
+            using_timemachines = True
+        except ImportError:
+            using_timemachines = False
+        return using_timemachines
+    raise AttributeError('module '+repr(__name__)+' has no attribute '+repr(name))
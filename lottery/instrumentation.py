@@ -0,0 +1,114 @@
+from lottery.conventions import k_and_tau_to_horizon_str
+import inspect
+import time
+
+# Optional timing of a lottery's hot paths, for finding out where settlement time goes.
+#
+#      - attach() replaces the instrumented methods on one lottery instance with timed wrappers,
+#        so lotteries that are not instrumented run exactly as before
+#      - Each call is counted, its latency added to a power-of-two histogram (in microseconds), and the sizes
+#        it worked on totalled: submissions, owners and rows in the horizon's pool, values, history length
+#      - stats() summarizes, and an optional callback receives every call as a dict, for a metrics system
+#
+# Usage:
+#      inst = L.instrument(callback=lambda event: metrics.timing(event['method'], event['seconds']))
+#      ...
+#      pprint(inst.stats())
+#      inst.detach()
+
+INSTRUMENTED = ['add', 'add_many', 'payout', 'payout_all', 'suggest', 'observe', 'close', 'settle', 'compact',
+                'set_k_tau_horizon_cutoff']
+REPORTED_AS = {'set_k_tau_horizon_cutoff': 'cutoff_time'}
+HORIZON_METHODS = ['payout', 'payout_all', 'suggest', 'set_k_tau_horizon_cutoff']
+
+
+class Instrumentation:
+
+    def __init__(self, callback=None, methods:[str]=None):
+        """
+        :param callback:  Called with {method, seconds, sizes} after every instrumented call
+        :param methods:   Method names to time (default INSTRUMENTED)
+        """
+        self.callback = callback
+        self.methods = INSTRUMENTED if methods is None else methods
+        self.lottery = None
+        self.counters = dict()
+
+    def attach(self, lottery):
+        self.detach()
+        self.lottery = lottery
+        for name in self.methods:
+            if hasattr(lottery, name):
+                setattr(lottery, name, self._wrapped(name, getattr(lottery, name)))
+        return self
+
+    def detach(self):
+        if self.lottery is not None:
+            for name in self.methods:
+                self.lottery.__dict__.pop(name, None)
+            self.lottery = None
+
+    def _wrapped(self, name:str, method):
+        signature = inspect.signature(method)
+        reported = REPORTED_AS.get(name, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            self.record(method=reported, seconds=seconds, sizes=self._sizes(name, signature.bind(*args, **kwargs).arguments, result))
+            return result
+
+        timed.__wrapped__ = method
+        return timed
+
+    def _sizes(self, name:str, arguments:dict, result) -> dict:
+        L = self.lottery
+        sizes = dict()
+        if name in HORIZON_METHODS:
+            k, tau = arguments.get('k'), arguments.get('tau')
+            if (k is None) or (tau is None):
+                try:
+                    k, tau = L.implied_k_tau()
+                except AssertionError:
+                    k, tau = None, None
+            pool = L.index.pools.get(k_and_tau_to_horizon_str(k=k, tau=tau)) if k is not None else None
+            if pool is not None:
+                sizes.update(submissions=len(pool.sub_time), owners=len(pool.owner_times), rows=len(pool.row_value))
+        if name in ['payout', 'settle']:
+            sizes['rewards'] = len(result)
+        elif name == 'payout_all':
+            sizes['values'] = len(result)
+        elif name == 'add':
+            sizes['values'] = len(arguments['values'])
+        elif name == 'add_many':
+            sizes['records'] = len(result)
+        if name in ['observe', 'close', 'settle']:
+            sizes['history'] = len(L['state']['time_history'])
+        return sizes
+
+    def record(self, method:str, seconds:float, sizes:dict):
+        counter = self.counters.get(method)
+        if counter is None:
+            counter = self.counters[method] = dict(calls=0, seconds=0.0, max_seconds=0.0, histogram=dict(), sizes=dict())
+        counter['calls'] += 1
+        counter['seconds'] += seconds
+        counter['max_seconds'] = max(counter['max_seconds'], seconds)
+        bucket = 2**int(seconds*1e6).bit_length()    # Calls taking less than this many microseconds
+        counter['histogram'][bucket] = counter['histogram'].get(bucket, 0) + 1
+        for key, size in sizes.items():
+            counter['sizes'][key] = counter['sizes'].get(key, 0) + size
+        if self.callback is not None:
+            self.callback(dict(method=method, seconds=seconds, sizes=sizes))
+
+    def stats(self) -> dict:
+        """ { method: {calls, seconds, mean_seconds, max_seconds, histogram {microseconds: calls}, sizes, mean_sizes} } """
+        summary = dict()
+        for method, counter in self.counters.items():
+            summary[method] = dict(counter, histogram=dict(sorted(counter['histogram'].items())),
+                                   mean_seconds=counter['seconds']/counter['calls'],
+                                   mean_sizes=dict([(key, size/counter['calls']) for key, size in counter['sizes'].items()]))
+        return summary
+
+    def reset(self):
+        self.counters = dict()
@@ -0,0 +1,89 @@
+from bisect import insort
+from math import fsum
+
+# Accumulates rewards across payouts, for those keeping score over many rounds or many lotteries.
+#
+#      - add() takes raw [(owner, reward)] lists, as payout() returns them, in one pass
+#      - Each owner keeps a short list of non-overlapping partial sums (as math.fsum does internally) rather
+#        than every reward, so memory does not grow with the number of rounds and a total costs only a few adds
+#      - Totals are the correctly rounded sum of everything added, so they do not depend on the order rewards
+#        arrived in, and ledgers from parallel workers can be merged
+#      - consolidate_rewards() adds in sorted order with sum() instead, so the two can differ in the last bit.
+#        Compare with equal_rewards() or a tolerance, not ==.
+#
+# Usage:
+#      ledger = RewardLedger()
+#      for t, value in truths:
+#          ledger.add(L.payout(t=t, value=value))
+#      ledger.consolidated()          # [(owner, cumulative reward)] in owner order
+
+
+def _accumulate(partials:[float], x:float):
+    """ Add x to non-overlapping partial sums in place, exactly (Shewchuk) """
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+
+class RewardLedger:
+
+    def __init__(self, rewards:[(str, float)]=None):
+        self.partials = dict()     # owner -> partial sums of every reward added
+        self.owners = list()       # Sorted
+        self.view = None           # Cached consolidated()
+        self.n_rounds = 0
+        if rewards is not None:
+            self.add(rewards)
+
+    def _partials(self, owner:str) -> [float]:
+        owner_partials = self.partials.get(owner)
+        if owner_partials is None:
+            owner_partials = self.partials[owner] = list()
+            insort(self.owners, owner)
+        return owner_partials
+
+    def add(self, rewards:[(str, float)]):
+        """ Record one round of rewards """
+        for owner, reward in rewards:
+            _accumulate(self._partials(owner), reward)
+        self.n_rounds += 1
+        self.view = None
+        return self
+
+    def merge(self, other:'RewardLedger'):
+        """ Fold in another ledger's rewards """
+        for owner, other_partials in other.partials.items():
+            owner_partials = self._partials(owner)
+            for x in other_partials:
+                _accumulate(owner_partials, x)
+        self.n_rounds += other.n_rounds
+        self.view = None
+        return self
+
+    def total(self, owner:str) -> float:
+        """ Cumulative reward, correctly rounded (may differ from consolidate_rewards() in the last bit) """
+        return fsum(self.partials.get(owner, []))
+
+    def consolidated(self) -> [(str, float)]:
+        """ Like consolidate_rewards() of every reward added. Do not modify the result. """
+        if self.view is None:
+            self.view = [(owner, self.total(owner)) for owner in self.owners]
+        return self.view
+
+    def pnl(self) -> dict:
+        """ { owner: cumulative reward } """
+        return dict(self.consolidated())
+
+    def __len__(self):
+        return len(self.owners)
+
+    def __contains__(self, owner):
+        return owner in self.partials
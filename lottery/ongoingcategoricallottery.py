@@ -1,5 +1,10 @@
 from lottery.conventions import ensure_normalized_weights, cutoff_time, consolidate_rewards, k_and_tau_to_horizon_str,\
-    horizon_str_to_k_and_tau, ALLOWED_HORIZON_STYLES, ensure_normalized_dict_weights
+    horizon_str_to_k_and_tau, Horizon, ALLOWED_HORIZON_STYLES, ensure_normalized_dict_weights, STORAGE_MODES,\
+    NORMALIZATION_TOLERANCE
+from lottery.poolindex import PoolIndex, HorizonPool
+from lottery.columnar import ColumnarPool, attach_views
+from lottery.history import History
+from lottery.inclusion import numpyinclusion
 import json
 
 # An ongoing categorical lottery is an object to which:
@@ -11,6 +16,10 @@ import json
 #
 # This object maintains the history of observations and breakdown of predictions currently pending, but
 # it does not serve as a bank to track rewards. The payout() method is idempotent.
+#
+# Alongside the JSON state we keep a PoolIndex (see poolindex.py) that add() updates incrementally,
+# so that payout() need not rescan every bet. It is rebuilt from the state on construction.
+# With storage='columnar' the index is the only copy of the bets, held in typed arrays (see columnar.py).
 
 
 class OngoingCategoricalLottery(dict):
@@ -18,7 +27,9 @@ class OngoingCategoricalLottery(dict):
     def __init__(self, state = None, meta=None,
                  allowed_values:[str]=None,
                  allowed_horizons:[str]=None,
-                 allowed_horizons_style:str=None):
+                 allowed_horizons_style:str=None,
+                 compact_every:int=None,
+                 storage:str=None):
         """   Implements rolling lotteries for various horizons
         :param meta:
         :param state:                     See below
@@ -26,6 +37,9 @@ class OngoingCategoricalLottery(dict):
         :param allowed_horizons           Enumeration of horizons for which we agree to accept forecasts
         :param allowed_horizons_style     Alternative way to specify a list of allowed horizons for common patterns
                                           allowed_horizon_style='tote' uses k=1&tau=0
+        :param compact_every              If set, observe() calls compact() once this many bets have been added since
+        :param storage                    'json' (default) keeps bets in the state as lists
+                                          'columnar' keeps them in arrays, exposing read-only views in the state
         """
 
         # state includes ...
@@ -42,6 +56,11 @@ class OngoingCategoricalLottery(dict):
             meta['allowed_horizons'] = allowed_horizons
         if allowed_horizons_style is not None:
             meta['allowed_horizons'] = ALLOWED_HORIZON_STYLES[allowed_horizons_style]
+        if compact_every is not None:
+            meta['compact_every'] = compact_every
+        if storage is not None:
+            assert storage in STORAGE_MODES, 'storage must be one of '+str(STORAGE_MODES)
+            meta['storage'] = storage
 
         if meta.get('allowed_horizons') is not None:
             for h in meta['allowed_horizons']:
@@ -54,24 +73,110 @@ class OngoingCategoricalLottery(dict):
                          value_history=list(),
                          time_history = list(),
                          last_bet_time=dict())
+        for key in ['time_history', 'value_history']:
+            if (key in state) and not isinstance(state[key], History):
+                state[key] = History(state[key])   # Trimmed in place by observe()
         super().__init__(meta=meta,state=state)
+        self.columnar = meta.get('storage') == 'columnar'
+        self.index = PoolIndex.from_state(state, pool_class=ColumnarPool if self.columnar else HorizonPool)
+        if self.columnar:
+            for h in self.index.pools:
+                attach_views(state=state, index=self.index, h=h)
+        self.compaction_stats = dict(compactions=0, bets=0, bet_totals=0)
+        self.observations = 0     # Counts observe() calls, to know when remembered cutoffs are stale
+        self.cutoffs = dict()     # (k, tau) -> (observations, horizon, cutoff)
+        self.implied = None       # (allowed horizon, Horizon) once implied_k_tau() has resolved it
+        self.event_log = None     # See eventlog.py
+        self.subscribers = list() # Callbacks for odds deltas, see subscribe()
+
+    def __reduce__(self):
+        # The index is rebuilt rather than pickled
+        return self.__class__, (self['state'], self['meta'])
 
     @staticmethod
     def from_json(s:str):
         # (for the other direction just use regular json.dumps() to serialize)
         return OngoingCategoricalLottery(**json.loads(s))
 
-    def implied_k_tau(self):
+    @classmethod
+    def from_index(cls, state:dict, meta:dict, index:PoolIndex):
+        """ Construct around an existing index, filling in state['bets'] and state['bet_totals'] from it
+            The index pools should be ColumnarPool if meta['storage']=='columnar', HorizonPool otherwise
+        """
+        state['bets'], state['bet_totals'] = dict(), dict()
+        L = cls(state=state, meta=meta)
+        L.index = index
+        for h, pool in index.pools.items():
+            if L.columnar:
+                attach_views(state=state, index=index, h=h)
+            else:
+                state['bets'][h], state['bet_totals'][h] = pool.to_state()
+        return L
+
+    def to_bytes(self) -> bytes:
+        """ Binary snapshot, see snapshot.py """
+        from lottery.snapshot import to_bytes
+        return to_bytes(self)
+
+    @staticmethod
+    def from_bytes(b:bytes):
+        from lottery.snapshot import from_bytes
+        return from_bytes(b)
+
+    def save(self, path:str):
+        from lottery.snapshot import save
+        save(self, path)
+
+    @staticmethod
+    def replay(log_path:str):
+        """ Rebuild a lottery from an event log, starting at its latest checkpoint (see eventlog.py) """
+        from lottery.eventlog import replay
+        return replay(log_path)
+
+    @staticmethod
+    def load(path:str):
+        """ Read a file written by save(), or by json.dumps() """
+        from lottery.snapshot import load
+        return load(path)
+
+    def instrument(self, callback=None, methods:[str]=None):
+        """ Start timing calls on this lottery, see instrumentation.py
+        :return: Instrumentation, with stats() and detach()
+        """
+        from lottery.instrumentation import Instrumentation
+        return Instrumentation(callback=callback, methods=methods).attach(self)
+
+    def subscribe(self, callback):
+        """ Call callback(delta) after each accepted submission, with the odds it changed
+            delta is {'horizon', 't', 'owner', 'total', 'previous_total', 'odds': { value: odds }} where odds are those
+            of payoff_odds(), total/money on the value in the pool as it stands, or None once nobody backs it. Only values
+            whose money moved are listed. If total differs from previous_total, the odds of every other value are scaled
+            by total/previous_total (previous_total is 0.0 for the first submission to a horizon).
+            Observations leave everyone's latest submission, and so the odds, unchanged. Callbacks run once the
+            submission is fully recorded in the state.
+        :return: callback, for unsubscribe()
+        """
+        self.subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback):
+        self.subscribers.remove(callback)
+
+    def implied_k_tau(self) -> Horizon:
+        allowed = self['meta'].get('allowed_horizons')
+        if (self.implied is not None) and (allowed is not None) and len(allowed) == 1 and allowed[0] == self.implied[0]:
+            return self.implied[1]
         assert 'allowed_horizons' in self['meta'], ' Must specify k, tau'
         assert len(self['meta']['allowed_horizons']) == 1, ' Must specify k, tau since horizon is ambiguous '
-        return horizon_str_to_k_and_tau(self.get('meta').get('allowed_horizons')[0])
+        self.implied = (allowed[0], horizon_str_to_k_and_tau(allowed[0]))
+        return self.implied[1]
 
     def all_added_values(self):
-        """ List of all values submitted anyone """
-        all_values = set()
-        for hz in self['state']['bets']:
-            for v in self['state']['bets'][hz].keys():
-                all_values.add(v)
+        """ List of all values submitted anyone, in order of first appearance per horizon """
+        all_values = dict()
+        for pool in self.index.pools.values():
+            for v in pool.values:
+                all_values[v] = None
         return list(all_values)
 
 
@@ -95,20 +200,103 @@ class OngoingCategoricalLottery(dict):
             assert (k>0) or (tau>=0), 'maybe not a good choice for (k,tau)'
             values, weights = ensure_normalized_weights(values=values, weights=weights)
             horizon = k_and_tau_to_horizon_str(k=k, tau=tau)
-            if horizon not in self['state']['last_bet_time']:
-                 self['state']['last_bet_time'][horizon] = dict()
-            ignore =  (owner in self['state']['last_bet_time'][horizon]) and (t <= self['state']['last_bet_time'][horizon][owner])
-            if ignore:
+            if not self._append(horizon=horizon, t=t, owner=owner, values=values, weights=weights, amount=amount):
                 return 0   # Not happy with out of order updates or more than one per second
-            self['state']['last_bet_time'][horizon][owner] = t
-
-            # Update individual opinions
-            if horizon not in self['state']['forecasts']:
-                self['state']['forecasts'][horizon] = dict()
-            self['state']['forecasts'][horizon][owner] = {'money':sorted( [ [v,w*amount] for v,w in zip(values,weights)] ),
-                                                          'probability':sorted([[v,w] for v,w in zip(values,weights) ])
-                                                          }
+            if self.columnar:
+                attach_views(state=self['state'], index=self.index, h=horizon, owners=[owner], values=values)
+            if self.event_log is not None:
+                self.event_log.record('a', t, owner, values, weights, amount, k, tau)
+            return 1
 
+    def add_many(self, records, k:int=None, tau:int=None, use_numpy:bool=None) -> [int]:
+        """  Apply many submissions, with the same effect and return codes as calling add() on each in turn
+        :param records:    (t, owner, values, weights, amount, k, tau) tuples, where trailing items may be omitted,
+                           or dicts of add() arguments, or a columnar batch such as {'t':[...], 'owner':[...], 'values':[...]}
+        :param k, tau:     Horizon for records that do not give one
+        :param use_numpy:  Normalize weights with array arithmetic. Defaults to using_numpy for larger batches
+        :return:  [ 1 if accepted, 0 otherwise ]
+        """
+        codes, error = self._add_many(records=records, k=k, tau=tau, use_numpy=use_numpy)
+        if error is not None:
+            raise error    # After applying the records before it, as add() would have
+        return codes
+
+    def _add_many(self, records, k:int=None, tau:int=None, use_numpy:bool=None):
+        """ :return: codes for the records applied, and the exception that stopped the batch if any """
+        records = _add_records(records)
+        if use_numpy is None:
+            use_numpy = len(records)>=32 and numpyinclusion.using_numpy
+        normalized = _normalized_weights_many(records) if use_numpy else [None]*len(records)
+        open_time = self['state']['time_history'][0]
+        horizons = dict()      # (k,tau) -> (horizon, k, tau), resolved once each
+        attached = dict()      # horizon -> (owners, values) needing views
+        codes = list()
+        try:
+            for record, normalized_weights in zip(records, normalized):
+                t, owner, values, weights, amount, k_, tau_ = _add_record(record)
+                if t < open_time:
+                    codes.append(0)
+                    continue
+                if (k_ is None) or (tau_ is None):
+                    k_, tau_ = k, tau
+                resolved = horizons.get((k_, tau_))
+                if resolved is None:
+                    key = (k_, tau_)
+                    if (k_ is None) or (tau_ is None):
+                        k_, tau_ = self.implied_k_tau()
+                    assert k_>=0, 'no prizes for predicting the previous value k>=1 please'
+                    assert (k_>0) or (tau_>=0), 'maybe not a good choice for (k,tau)'
+                    resolved = horizons[key] = (k_and_tau_to_horizon_str(k=k_, tau=tau_), k_, tau_)
+                horizon, k_, tau_ = resolved
+                if normalized_weights is None:
+                    values, weights = ensure_normalized_weights(values=values, weights=weights)
+                else:
+                    weights = normalized_weights
+                if not self._append(horizon=horizon, t=t, owner=owner, values=values, weights=weights, amount=amount):
+                    codes.append(0)
+                    continue
+                if self.columnar:
+                    owners_, values_ = attached.setdefault(horizon, (dict(), dict()))
+                    owners_[owner] = None
+                    values_.update(dict.fromkeys(values))
+                if self.event_log is not None:
+                    self.event_log.record('a', t, owner, values, weights, amount, k_, tau_)
+                codes.append(1)
+        except Exception as e:
+            return codes, e
+        finally:
+            for horizon, (owners_, values_) in attached.items():
+                attach_views(state=self['state'], index=self.index, h=horizon, owners=list(owners_), values=list(values_))
+        return codes, None
+
+    def _append(self, horizon:str, t:int, owner:str, values:[str], weights:[float], amount) -> int:
+        """ Record normalized weights, unless the owner has already submitted at or after t """
+        last_bet_time = self['state']['last_bet_time']
+        if horizon not in last_bet_time:
+             last_bet_time[horizon] = dict()
+        ignore =  (owner in last_bet_time[horizon]) and (t <= last_bet_time[horizon][owner])
+        if ignore:
+            return 0
+        last_bet_time[horizon][owner] = t
+
+        # Update individual opinions
+        if horizon not in self['state']['forecasts']:
+            self['state']['forecasts'][horizon] = dict()
+        previous = self['state']['forecasts'][horizon].get(owner)
+        self['state']['forecasts'][horizon][owner] = {'money':sorted( [ [v,w*amount] for v,w in zip(values,weights)] ),
+                                                      'probability':sorted([[v,w] for v,w in zip(values,weights) ])
+                                                      }
+
+        rows = [ (v, amount*w) for v,w in zip(values,weights) ]
+        if self.subscribers:
+            pool = self.index.pools.get(horizon)
+            previous_total = pool.total if pool is not None else 0.0
+        self.index.add(h=horizon, t=t, owner=owner, amount=amount, rows=rows)
+        if self.columnar:
+            if self.subscribers:
+                # Callers attach views in bulk later, but subscribers should see the state complete
+                attach_views(state=self['state'], index=self.index, h=horizon, owners=[owner], values=values)
+        else:
             # Update amount invested by horizon
             if horizon not in self['state']['bet_totals']:
                 self['state']['bet_totals'][horizon] = dict()
@@ -120,23 +308,39 @@ class OngoingCategoricalLottery(dict):
             #   bets[horizon][value] holds a list of (time, owner, amount) triples
             if horizon not in self['state']['bets']:
                 self['state']['bets'][horizon] = dict()
-            for v,w in zip(values,weights):
-                a = amount*w
+            for v,a in rows:
                 if v not in self['state']['bets'][horizon]:
                     self['state']['bets'][horizon][v] = list()
                 self['state']['bets'][horizon][v].append([t, owner, a])
-            return 1
-
+        if self.subscribers:
+            self._publish(horizon=horizon, t=t, owner=owner, previous=previous, previous_total=previous_total)
+        return 1
+
+
+    def _publish(self, horizon:str, t:int, owner:str, previous:dict, previous_total:float):
+        """ Send subscribers the odds moved by the owner's new forecast, found by comparing it with their previous one """
+        old = _money_by_value(previous)
+        new = _money_by_value(self['state']['forecasts'][horizon][owner])
+        moved = [v for v in new if new[v] != old.get(v)] + [v for v in old if v not in new]
+        pool = self.index.pools[horizon]
+        odds = dict([(v, pool.total/pool.value_totals[v] if pool.value_totals.get(v) else None) for v in moved])
+        delta = dict(horizon=horizon, t=t, owner=owner, total=pool.total, previous_total=previous_total, odds=odds)
+        for callback in list(self.subscribers):
+            callback(delta)
 
     def set_k_tau_horizon_cutoff(self, t:int, k:int=None, tau:int=None):
         if (k is None) or (tau is None):
             k, tau = self.implied_k_tau()
-        h = k_and_tau_to_horizon_str(k=k, tau=tau)
-        try:
-            t_cutoff = cutoff_time(previous_times=self['state']['time_history'], t=t, k=k, tau=tau)
-        except:
-            t_cutoff = None
-        return k, tau, h, t_cutoff
+        memo = self.cutoffs.get((k, tau))
+        if (memo is None) or (memo[0] != self.observations) or (int(k)==0):
+            # For k>0 the cutoff depends only on the history, so lasts until the next observation
+            h = k_and_tau_to_horizon_str(k=k, tau=tau) if memo is None else memo[1]
+            try:
+                t_cutoff = cutoff_time(previous_times=self['state']['time_history'], t=t, k=k, tau=tau)
+            except:
+                t_cutoff = None
+            memo = self.cutoffs[(k, tau)] = (self.observations, h, t_cutoff)
+        return k, tau, memo[1], memo[2]
 
 
     def payout(self,  t:int, value: str, consolidate=False, k:int=None, tau:int=None):
@@ -150,37 +354,65 @@ class OngoingCategoricalLottery(dict):
         :param value:   Observed truth
         :return:  rewards list [ (owner, reward) ]
         """
-        def _max_or_none_triple(l):
-            try:
-                return max(l)
-            except ValueError:
-                return (None, None, None)
-
         k, tau, h, t_cutoff = self.set_k_tau_horizon_cutoff(t=t, k=k,tau=tau)
+        return self.payout_at_cutoff(h=h, t=t, t_cutoff=t_cutoff, value=value, consolidate=consolidate)
 
-        if (t_cutoff>=t) or (h not in self['state']['bets']) or (value not in self['state']['bets'][h]):
+    def payout_at_cutoff(self, h:str, t:int, t_cutoff:int, value:str, consolidate=False):
+        """ payout() for horizon h, given the cutoff rather than working it out from the history """
+        pool = self.index.pools.get(h)
+
+        if (t_cutoff>=t) or (pool is None) or (value not in pool.values):
             return []   # (2a) If there are no quarantined bets or nobody got it right, no rewards
                         #      Carryover logic could potentially be applied here instead.
         else:
-            # (2b) Tabulate amounts bet on winning value in the most recent valid submissions for (k,tau)
-            matching_correct_value = self['state']['bets'][h][value]
-            matching_and_quarantined = [ (t_,o_,a_) for (t_,o_,a_) in matching_correct_value if (t_<= t_cutoff) ]
-            quarantined_owners = list(set([ o_ for (t_,o_,a_) in matching_and_quarantined ]))
-            latest_time_owner_pairs = [ ( max( [ t_ for (t_,a_) in self['state']['bet_totals'][h][o_] if t_<t_cutoff ] ), o_ ) for o_ in quarantined_owners]
-            winners = [ (o_,a_) for (t_,o_,a_) in matching_and_quarantined if (t_,o_) in latest_time_owner_pairs ]
-            total_winner_money = sum( [a_ for (o_,a_) in winners ])
+            # (2b) Amounts bet on the winning value in each owner's most recent submission before the cutoff
+            # (3)  Total amount invested in each owner's most recent submission at or before the cutoff
+            all_totals, winners = pool.tabulate(value=value, t_cutoff=t_cutoff)
+            return _net_rewards(all_totals=all_totals, winners=winners, consolidate=consolidate)
 
-            # (3) Tabulate total amount invested in the most recent valid submissions for (k,tau)
-            all_owners = list(self['state']['bet_totals'][h].keys())
-            all_recent = [  _max_or_none_triple( [ (t_,o_,a_) for (t_,a_) in self['state']['bet_totals'][h][o_] if (t_<= t_cutoff) ] ) for o_ in all_owners ]
-            all_totals = [ (o_,a_) for (t_,o_,a_) in all_recent if t_ is not None ]
-            total_money = sum( [ a_ for (o_,a_) in all_totals ] )
+    def payout_all(self, t:int, values:[str]=None, consolidate=False, k:int=None, tau:int=None, use_numpy:bool=None) -> dict:
+        """
+            Hypothetical rewards for many candidate truths at once, the same as { value: payout(t=t, value=value) }
+            The quarantined submissions are found once, and the winning rows are read in one pass.
 
-            # (4) Winners split the pot
-            winner_rewards = [ (o_,a_*total_money/total_winner_money) for (o_,a_) in winners ]
-            participation_rewards = [ (o_,-a_) for (o_,a_) in all_totals ]
-            net_rewards = participation_rewards + winner_rewards  # no real need to consolidate yet
-            return consolidate_rewards(net_rewards) if consolidate else net_rewards
+        :param values:     Candidate truths. Defaults to meta['allowed_values'], or else every value bet on
+        :param use_numpy:  Split the pot for all values with array arithmetic. Defaults to using_numpy
+        :return:  { value: rewards list [ (owner, reward) ] }
+        """
+        k, tau, h, t_cutoff = self.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
+        pool = self.index.pools.get(h)
+        if values is None:
+            values = self['meta'].get('allowed_values') or (list(pool.values) if pool is not None else [])
+        rewards = dict([(v, []) for v in values])
+        if (t_cutoff>=t) or (pool is None):
+            return rewards
+
+        all_totals, winning = pool.settlement(t_cutoff=t_cutoff)
+        candidates = [ v for v in rewards if v in pool.values ]   # Others pay nothing, as with payout()
+        if use_numpy is None:
+            use_numpy = numpyinclusion.using_numpy
+        rewards.update(_split_pots(pool=pool, all_totals=all_totals, winning=winning, values=candidates,
+                                   consolidate=consolidate, use_numpy=use_numpy))
+        return rewards
+
+    def observe_and_settle(self, value:str, t:int, approx_max_len:int=10000) -> dict:
+        """ Pay out on a truth for every horizon, then observe it (as CategoricalLottery.settle does for its one horizon)
+            Horizons are meta['allowed_horizons'] if given, otherwise every horizon bet on. Each distinct (k, tau)
+            is settled once, from its pool's settlement at the cutoff, and shared by any horizons naming it.
+        :return: {'horizons': { horizon: rewards }, 'total': rewards summed over distinct horizons }, all consolidated
+        """
+        horizons = self['meta'].get('allowed_horizons') or list(self.index.pools)
+        settled = dict()       # (k, tau) -> rewards
+        rewards = dict()
+        for h in horizons:
+            k, tau = horizon_str_to_k_and_tau(h)
+            if (k, tau) not in settled:
+                _, _, h_, t_cutoff = self.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
+                settled[(k, tau)] = self.payout_at_cutoff(h=h_, t=t, t_cutoff=t_cutoff, value=value, consolidate=True)
+            rewards[h] = settled[(k, tau)]
+        total = consolidate_rewards([r for k_tau_rewards in settled.values() for r in k_tau_rewards])
+        self.observe(value=value, t=t, approx_max_len=approx_max_len)
+        return {'horizons': rewards, 'total': total}
 
     def observe(self, value:str, t:int, approx_max_len:int=10000):
         """ Add arriving data point to history
@@ -188,14 +420,64 @@ class OngoingCategoricalLottery(dict):
         :param t:      Rounded epoch second
         :return:
         """
+        n = self._observe(value=value, t=t, approx_max_len=approx_max_len)
+        if self.event_log is not None:
+            self.event_log.record('o', value, t, approx_max_len)
+        return n
+
+    def _observe(self, value:str, t:int, approx_max_len:int=10000):
         assert len(self['state']['value_history'])==len(self['state']['time_history']),'history out of sync'
         self['state']['value_history'].append(value)
         self['state']['time_history'].append(t)
-        if len(self['state']['time_history']) > 1.1*approx_max_len:
-            self['state']['time_history']  = self['state']['time_history'][-approx_max_len:]
-            self['state']['value_history'] = self['state']['value_history'][-approx_max_len:]
+        self.observations += 1
+        for key in ['time_history', 'value_history']:
+            history = self['state'][key]
+            if isinstance(history, History):
+                history.trim(approx_max_len)     # Once full, the oldest entry goes as each new one arrives
+            elif len(history) > 1.1*approx_max_len:
+                self['state'][key] = history[-approx_max_len:]
+        compact_every = self['meta'].get('compact_every')
+        if compact_every and self.index.rows_since_compaction >= compact_every:
+            self._compact(t=t)
         return len(self['state']['time_history'])
 
+    def compact(self, t:int=None) -> dict:
+        """ Drop submissions that can no longer affect any future payout() for any horizon
+        :param t:   Earliest time at which payout() will be called hereafter. Defaults to the latest observation.
+        :return:  Numbers of rows removed from bets and bet_totals
+
+            Future cutoffs can only be later than those implied by t and the current time_history, assuming
+            observations arrive in time order. So for each owner we keep their latest submission strictly
+            before that cutoff, and everything since.
+        """
+        if t is None:
+            t = self['state']['time_history'][-1]
+        removed = self._compact(t=t)
+        if self.event_log is not None:
+            self.event_log.record('k', t)
+        return removed
+
+    def _compact(self, t:int) -> dict:
+        removed = dict(bets=0, bet_totals=0)
+        for h in list(self.index.pools.keys()):
+            k, tau = horizon_str_to_k_and_tau(h)
+            t_cutoff = cutoff_time(previous_times=self['state']['time_history'], t=t, k=k, tau=tau)
+            n_subs, n_rows = len(self.index.pools[h]), len(self.index.pools[h].row_value)
+            first_kept = self.index.compact(h=h, t_cutoff=t_cutoff)
+            removed['bet_totals'] += n_subs - len(self.index.pools[h])
+            removed['bets'] += n_rows - len(self.index.pools[h].row_value)
+            if first_kept and not self.columnar:       # Columnar views simply render the compacted pool
+                for owner, t_first in first_kept.items():
+                    owner_totals = self['state']['bet_totals'][h][owner]
+                    owner_totals[:] = [ ta for ta in owner_totals if ta[0]>=t_first ]
+                for triples in self['state']['bets'][h].values():   # Values are kept even when their list empties
+                    triples[:] = [ toa for toa in triples if (toa[1] not in first_kept) or (toa[0]>=first_kept[toa[1]]) ]
+        self.index.rows_since_compaction = 0
+        self.compaction_stats['compactions'] += 1
+        self.compaction_stats['bets'] += removed['bets']
+        self.compaction_stats['bet_totals'] += removed['bet_totals']
+        return removed
+
     def suggest(self, t:int=None, k:int=None, tau:int=None )->dict:
         """
             :param  t   -  Future time
@@ -203,23 +485,199 @@ class OngoingCategoricalLottery(dict):
             Returns { suggestions: weights }
 
         """
-        _, _, h, t_cutoff = self.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
-        suggestions = self.all_added_values()
-        peanut_gallery = self['state']['bets'][h]
-        suggestion_weights = dict([(nm, 0) for nm in suggestions])
-        for name in suggestions:
-            for n_, bts in peanut_gallery.items():
-                if name == n_:
-                    for bt in bts:
-                        if bt[0] > t_cutoff:
-                            suggestion_weights[name] += bt[2]
-        suggestion_weights = ensure_normalized_dict_weights(suggestion_weights)
+        suggestion_weights, _ = self.suggest_with_count(t=t, k=k, tau=tau)
         return suggestion_weights
 
+    def suggest_with_count(self, t:int=None, k:int=None, tau:int=None):
+        """
+            Money bet on each value after the cutoff, normalized, tallied in one pass over the horizon's submissions
 
+            Returns { suggestions: weights }, number of bets counted
+        """
+        _, _, h, t_cutoff = self.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
+        peanut_gallery = self.index.pools[h]
+        money, n_bets = peanut_gallery.money_after(t_cutoff=t_cutoff)
+        suggestion_weights = dict([(nm, money.get(nm, 0)) for nm in self.all_added_values()])
+        suggestion_weights = ensure_normalized_dict_weights(suggestion_weights)
+        return suggestion_weights, n_bets
 
+    # Queries on the pool as it stands, meaning everyone's latest submission, which is what payout() will settle
+    # once the quarantine has passed. These read running sums that add() keeps, so take time proportional to
+    # what they return. Given t, they instead describe the pool payout(t=t) would settle, applying the same
+    # quarantine cutoff: stakes from each owner's latest submission at or before it, and money on values from
+    # the latest strictly before it. That is read from the settlement payout() shares.
 
+    def live_pool(self, k:int=None, tau:int=None) -> HorizonPool:
+        """ The horizon's pool, or None if nobody has bet on it """
+        if (k is None) or (tau is None):
+            k, tau = self.implied_k_tau()
+        return self.index.pools.get(k_and_tau_to_horizon_str(k=k, tau=tau))
 
+    def _settling_pool(self, t:int=None, k:int=None, tau:int=None):
+        """ live_pool(), and the cutoff payout(t=t) would apply (None if t is None)
+        :return: pool, t_cutoff   where pool is None if there is nothing to settle
+        """
+        if t is None:
+            return self.live_pool(k=k, tau=tau), None
+        k, tau, h, t_cutoff = self.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
+        if (t_cutoff is None) or (t_cutoff>=t):
+            return None, None
+        return self.index.pools.get(h), t_cutoff
+
+    def owner_exposure(self, owner:str, values:[str]=None, k:int=None, tau:int=None, t:int=None) -> dict:
+        """
+            What owner would win, net of their stake, if each value landed with the pool as it stands (or at time t)
 
+        :param values:  Defaults to the values in the owner's latest submission. Any other value costs them the stake.
+        :return: { value: reward }
+        """
+        pool, t_cutoff = self._settling_pool(t=t, k=k, tau=tau)
+        return pool.exposure(owner=owner, values=values, t_cutoff=t_cutoff) if pool is not None else dict()
 
+    def pool_sizes(self, top_n:int=None, k:int=None, tau:int=None, t:int=None) -> [tuple]:
+        """ [(value, money)] for the top_n values with most money on them (all, if top_n is None), largest first """
+        pool, t_cutoff = self._settling_pool(t=t, k=k, tau=tau)
+        return pool.largest(top_n=top_n, t_cutoff=t_cutoff) if pool is not None else []
 
+    def implied_odds(self, k:int=None, tau:int=None, t:int=None) -> dict:
+        """ { value: share of the pool bet on it }, the probabilities implied by the money
+            A winning unit on a value returns 1/share, before the stake is taken out.
+        """
+        total, value_totals = self._money_on_values(k=k, tau=tau, t=t)
+        if not total:
+            return dict()
+        return dict([(v, a/total) for v, a in value_totals.items()])
+
+    def payoff_odds(self, k:int=None, tau:int=None, t:int=None) -> dict:
+        """ { value: total pool / money on the value }, what a winning unit on it returns before the stake is taken out
+            Values nobody backs are left out. subscribe() streams changes to these.
+        """
+        total, value_totals = self._money_on_values(k=k, tau=tau, t=t)
+        return dict([(v, total/a) for v, a in value_totals.items() if a])
+
+    def _money_on_values(self, k:int=None, tau:int=None, t:int=None):
+        """ :return: total money, { value: money } """
+        pool, t_cutoff = self._settling_pool(t=t, k=k, tau=tau)
+        if pool is None:
+            return 0.0, dict()
+        return (pool.total, pool.value_totals) if t_cutoff is None else pool.standing(t_cutoff=t_cutoff)[:2]
+
+
+def _money_by_value(forecast:dict) -> dict:
+    """ { value: money } from a state['forecasts'][h][owner] entry, which may be None """
+    money = dict()
+    if forecast is not None:
+        for v, a in forecast['money']:
+            money[v] = money.get(v, 0.0) + a
+    return money
+
+
+def _net_rewards(all_totals:[(str, float)], winners:[(str, float)], consolidate=False):
+    """ (4) Winners split the pot """
+    total_winner_money = sum( [a_ for (o_,a_) in winners ])
+    total_money = sum( [ a_ for (o_,a_) in all_totals ] )
+    winner_rewards = [ (o_,a_*total_money/total_winner_money) for (o_,a_) in winners ]
+    participation_rewards = [ (o_,-a_) for (o_,a_) in all_totals ]
+    net_rewards = participation_rewards + winner_rewards  # no real need to consolidate yet
+    return consolidate_rewards(net_rewards) if consolidate else net_rewards
+
+
+def _split_pots(pool, all_totals:[(str, float)], winning:[int], values:list, consolidate=False, use_numpy=False) -> dict:
+    """ _net_rewards() for each of the values, reading the winning submissions once
+    :return: { value: rewards list }
+    """
+    total_money = sum( [ a_ for (o_,a_) in all_totals ] )
+    participation_rewards = [ (o_,-a_) for (o_,a_) in all_totals ]
+    if use_numpy:
+        winner_rewards = _winner_rewards_numpy(pool=pool, winning=winning, values=values, total_money=total_money)
+    else:
+        winner_rewards = dict()
+        for v, winners in pool.winners_by_value(winning=winning, values=values).items():
+            total_winner_money = sum( [a_ for (o_,a_) in winners ])
+            winner_rewards[v] = [ (o_,a_*total_money/total_winner_money) for (o_,a_) in winners ]
+    rewards = dict()
+    for v in values:
+        net_rewards = participation_rewards + winner_rewards[v]
+        rewards[v] = consolidate_rewards(net_rewards) if consolidate else net_rewards
+    return rewards
+
+
+def _winner_rewards_numpy(pool, winning:[int], values:list, total_money:float) -> dict:
+    """ Winners' share of the pot for every value, as payout() computes it one value at a time
+        Per-value totals are taken with the built-in sum() over the same rows in the same order as payout(),
+        not with np.bincount, since sum() is compensated from Python 3.12 and so can differ in the last bit.
+    """
+    import numpy as np
+    owners, positions, amounts = pool.winning_rows(winning=winning, values=values)
+    positions = np.asarray(positions, dtype=np.int64)
+    order = np.argsort(positions, kind='stable')
+    bounds = np.searchsorted(positions[order], np.arange(len(values)+1)).tolist()
+    order = order.tolist()
+    total_winner_money = np.asarray([sum([amounts[j] for j in order[bounds[i]:bounds[i+1]]]) for i in range(len(values))],
+                                    dtype=np.float64)
+    if np.any(total_winner_money[positions]==0):
+        raise ZeroDivisionError('float division by zero')
+    shares = (np.asarray(amounts, dtype=np.float64)*total_money/total_winner_money[positions]).tolist()
+    return dict([(v, [(owners[j], shares[j]) for j in order[bounds[i]:bounds[i+1]]]) for i, v in enumerate(values)])
+
+
+ADD_FIELDS = ['t', 'owner', 'values', 'weights', 'amount', 'k', 'tau']
+ADD_DEFAULTS = [None, 1.0, None, None]      # For the optional trailing fields
+
+
+def _add_records(records) -> list:
+    """ Records for add_many() as a list, one per submission. Columnar batches are turned into rows. """
+    if isinstance(records, dict):
+        n = len(records['t'])
+        columns = list()
+        for field, default in zip(ADD_FIELDS, [None, None, None]+ADD_DEFAULTS):
+            column = records.get(field)
+            column = [default]*n if column is None else column
+            columns.append(column.tolist() if hasattr(column, 'tolist') else column)    # Such as numpy arrays
+        return list(zip(*columns))
+    return records if isinstance(records, list) else list(records)
+
+
+def _add_record(record) -> tuple:
+    """ One record for add_many() as a full (t, owner, values, weights, amount, k, tau) tuple """
+    if isinstance(record, dict):
+        return tuple([record[field] for field in ADD_FIELDS[:3]]) + \
+               tuple([record.get(field, default) for field, default in zip(ADD_FIELDS[3:], ADD_DEFAULTS)])
+    if len(record) < len(ADD_FIELDS):
+        return tuple(record) + tuple(ADD_DEFAULTS[len(record)-3:])
+    return tuple(record)
+
+
+def _normalized_weights_many(records:[tuple]) -> list:
+    """ Weights as ensure_normalized_weights() would return them, for records grouped by length
+        Each record's total is taken with sum() itself, as numpy's sums are not compensated like sum() from
+        Python 3.12, so results agree bit for bit. The divisions are done with arrays.
+        None is returned for records left to ensure_normalized_weights(), including any it would reject.
+    """
+    import numpy as np
+    normalized = [None]*len(records)
+    weights_of = dict()
+    by_length = dict()
+    for i, record in enumerate(records):
+        try:
+            _, _, values, weights = _add_record(record)[:4]
+            if (weights is not None) and len(weights)==len(values) and len(weights)>0:
+                weights_of[i] = weights
+                by_length.setdefault(len(weights), list()).append(i)
+        except Exception:
+            continue     # add_many() raises when it reaches the record, as add() would
+    for m, rows in by_length.items():
+        try:
+            W = np.array([weights_of[i] for i in rows], dtype=np.float64)
+        except (TypeError, ValueError):
+            continue
+        sw = np.array([sum(weights_of[i]) for i in rows], dtype=np.float64)
+        gap = 1 - sw
+        unchanged = (-NORMALIZATION_TOLERANCE < gap) & (gap < NORMALIZATION_TOLERANCE)
+        rescaled = (W / np.where(sw > 0, sw, 1.0)[:, None]).tolist()
+        for r, i in enumerate(rows):
+            if unchanged[r]:
+                normalized[i] = weights_of[i]
+            elif sw[r] > 0:
+                normalized[i] = rescaled[r]
+    return normalized
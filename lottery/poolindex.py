@@ -0,0 +1,410 @@
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import heapq
+
+# An index of submissions, kept alongside the JSON state of an OngoingCategoricalLottery
+#
+#      - Each accepted add() is one submission: a time, an owner, an amount and a list of (value, amount) rows
+#      - Submissions are numbered in order of arrival, and the rows of one submission are contiguous
+#      - Per owner we keep submission times in increasing order, so the latest valid submission
+#        for any cutoff is a bisection away
+#      - Running per-value and total sums are kept for the pool formed by everyone's latest submission
+#
+# The index is never serialized. It can always be rebuilt from state['bets'] and state['bet_totals'].
+#
+# Each pool also remembers what settlement() and money_after() returned for its most recent cutoffs, so
+# repeated payout() and suggest() calls between observations skip the work. A submission at time t can only
+# change settlement() for cutoffs at or after t, and money_after() for cutoffs before t, so add() forgets
+# just those. Compaction builds a new pool, which starts with nothing remembered.
+
+FRAME_CACHE_SIZE = 64
+
+
+class HorizonPool:
+    """ Submissions for one horizon """
+
+    def __init__(self):
+        self.sub_time = list()      # Submission columns, indexed by sequence number
+        self.sub_owner = list()
+        self.sub_amount = list()
+        self.sub_start = list()     # Rows of submission s are sub_start[s] <= r < sub_end[s]
+        self.sub_end = list()
+        self.row_value = list()     # Row columns
+        self.row_amount = list()
+        self.owner_times = dict()   # owner -> increasing submission times
+        self.owner_subs = dict()    # owner -> corresponding sequence numbers
+        self.values = dict()        # Ordered set of every value ever bet on
+        self.value_totals = dict()  # value -> money on it in everyone's latest submission
+        self.value_counts = dict()  # value -> rows betting on it in everyone's latest submission
+        self.total = 0.0            # money in everyone's latest submission
+        self.frames = OrderedDict() # (kind, t_cutoff) -> remembered result, least recently used first
+
+    def __len__(self):
+        return len(self.sub_time)
+
+    # Subclasses may store owners and values in the columns as something other than themselves
+
+    def intern_owner(self, owner:str):
+        """ Column entry for owner, registering them if new """
+        if owner not in self.owner_times:
+            self.owner_times[owner] = list()
+            self.owner_subs[owner] = list()
+        return owner
+
+    def intern_value(self, value):
+        """ Column entry for value, registering it if new """
+        self.values[value] = None
+        return value
+
+    def value_key(self, value):
+        """ Column entry for value, or None if it was never bet on """
+        return value if value in self.values else None
+
+    def owner(self, s:int) -> str:
+        return self.sub_owner[s]
+
+    def rows(self, s:int):
+        """ (value, amount) rows of submission s """
+        return [(self.row_value[r], self.row_amount[r]) for r in range(self.sub_start[s], self.sub_end[s])]
+
+    def empty_copy(self):
+        """ A pool with no submissions that remembers the same owners and values """
+        pool = type(self)()
+        pool.values = dict(self.values)
+        for owner in self.owner_times:
+            pool.intern_owner(owner)
+        return pool
+
+    def to_state(self):
+        """ The pool as state['bets'][h] and state['bet_totals'][h] would hold it
+        :return: bets { value: [[time, owner, amount]] }, bet_totals { owner: [[time, amount]] }
+        """
+        bets = dict([(v, list()) for v in self.values])
+        bet_totals = dict([(owner, list()) for owner in self.owner_times])
+        for s in range(len(self)):
+            t, owner = self.sub_time[s], self.owner(s)
+            bet_totals[owner].append([t, self.sub_amount[s]])
+            for v, a in self.rows(s):
+                bets[v].append([t, owner, a])
+        return bets, bet_totals
+
+    def add(self, t:int, owner:str, amount:float, rows:[(str, float)]) -> int:
+        """ Append a submission, which must be later than the owner's previous one
+        :return: sequence number
+        """
+        owner_entry = self.intern_owner(owner)
+        previous = self.owner_subs[owner][-1] if self.owner_subs[owner] else None
+
+        s = len(self.sub_time)
+        self.sub_start.append(len(self.row_value))
+        for v, a in rows:
+            self.row_value.append(self.intern_value(v))
+            self.row_amount.append(a)
+        self.sub_end.append(len(self.row_value))
+        self.sub_owner.append(owner_entry)
+        self.sub_amount.append(amount)
+        self.sub_time.append(t)
+        self.owner_times[owner].append(t)
+        self.owner_subs[owner].append(s)
+        if self.frames:
+            self._forget(t)
+
+        # Running sums swap the owner's previous submission for this one
+        if previous is not None:
+            self.total -= self.sub_amount[previous]
+            for v, a in self.rows(previous):
+                if self.value_counts[v] > 1:
+                    self.value_counts[v] -= 1
+                    self.value_totals[v] -= a
+                else:
+                    del self.value_counts[v]    # Rather than leave rounding error behind
+                    del self.value_totals[v]
+        self.total += amount
+        for v, a in rows:
+            self.value_totals[v] = self.value_totals.get(v, 0.0) + a
+            self.value_counts[v] = self.value_counts.get(v, 0) + 1
+        return s
+
+    def latest(self, owner:str, t_cutoff:int, strict:bool=False):
+        """ Sequence number of the owner's latest submission at or before t_cutoff (strictly before, if strict) """
+        times = self.owner_times[owner]
+        i = bisect_left(times, t_cutoff) if strict else bisect_right(times, t_cutoff)
+        return self.owner_subs[owner][i-1] if i else None
+
+    def _frame(self, kind:str, t_cutoff, compute):
+        key = (kind, t_cutoff)
+        frame = self.frames.get(key)
+        if frame is None:
+            frame = compute(t_cutoff)
+            self.remember(kind, t_cutoff, frame)
+        else:
+            self.frames.move_to_end(key)
+        return frame
+
+    def _forget(self, t:int):
+        """ Drop remembered results that a submission at time t changes """
+        stale = [key for key in self.frames if (key[1] >= t if key[0] == 'settlement' else key[1] < t)]
+        for key in stale:
+            del self.frames[key]
+
+    def settlement(self, t_cutoff:int):
+        """ Everything payout() needs to know about a cutoff, whatever the truth turns out to be
+            The result is shared with later calls for the same cutoff, so should not be modified.
+        :return: participation [(owner, amount)], winning [sequence number]
+            participation lists the latest submission at or before the cutoff, in order of owners' first submissions
+            winning lists the latest submission strictly before the cutoff, in order of arrival
+        """
+        return self._frame('settlement', t_cutoff, self._settlement)
+
+    def _settlement(self, t_cutoff:int):
+        return self.settlement_upto(t_cutoff=t_cutoff, n=len(self), owners=self.owner_times)
+
+    def settlement_upto(self, t_cutoff:int, n:int, owners):
+        """ settlement() counting only the first n submissions, from the given owners, and remembering nothing
+            Submissions appended meanwhile are ignored, so a reader can run this while a writer adds to the pool.
+        """
+        participation = list()
+        winning = list()
+        for owner in owners:
+            times, subs = self.owner_times[owner], self.owner_subs[owner]
+            m = bisect_left(subs, n)
+            i = bisect_right(times, t_cutoff, 0, m)
+            if i:
+                participation.append((owner, self.sub_amount[subs[i-1]]))
+                j = bisect_left(times, t_cutoff, 0, i)
+                if j:
+                    winning.append(subs[j-1])
+        winning.sort()
+        return participation, winning
+
+    def remember(self, kind:str, t_cutoff:int, frame):
+        """ Store a result computed elsewhere, as settlement() or money_after() would have """
+        self.frames[(kind, t_cutoff)] = frame
+        if len(self.frames) > FRAME_CACHE_SIZE:
+            self.frames.popitem(last=False)
+
+    def tabulate(self, value, t_cutoff:int):
+        """ Inputs to payout() for a given cutoff
+        :return: participation [(owner, amount)], winners [(owner, amount)] holding the winning rows matching value
+        """
+        participation, winning = self.settlement(t_cutoff=t_cutoff)
+        return participation, self.winners(value=value, winning=winning)
+
+    def winners(self, value, winning:[int]) -> [(str, float)]:
+        """ Rows of the winning submissions that bet on value """
+        key = self.value_key(value)
+        return [(self.owner(s), self.row_amount[r]) for s in winning
+                for r in range(self.sub_start[s], self.sub_end[s]) if self.row_value[r] == key]
+
+    def winners_by_value(self, winning:[int], values:list) -> dict:
+        """ One pass over the winning submissions
+        :return: { value: [(owner, amount)] } for each of the values
+        """
+        winners = dict([(v, list()) for v in values])
+        wanted = dict([(self.value_key(v), winners[v]) for v in values])
+        for s in winning:
+            owner = self.owner(s)
+            for r in range(self.sub_start[s], self.sub_end[s]):
+                key = self.row_value[r]
+                if key in wanted:
+                    wanted[key].append((owner, self.row_amount[r]))
+        return winners
+
+    def winning_rows(self, winning:[int], values:list):
+        """ Rows of the winning submissions that bet on one of the values, in order
+        :return: owners [str], positions [int] of the values bet on, amounts [float]
+        """
+        position = dict([(self.value_key(v), i) for i, v in enumerate(values)])
+        owners, positions, amounts = list(), list(), list()
+        for s in winning:
+            owner = self.owner(s)
+            for r in range(self.sub_start[s], self.sub_end[s]):
+                i = position.get(self.row_value[r])
+                if i is not None:
+                    owners.append(owner)
+                    positions.append(i)
+                    amounts.append(self.row_amount[r])
+        return owners, positions, amounts
+
+    def standing(self, t_cutoff:int):
+        """ The pool payout() settles at a cutoff, summed as the running sums are for the pool as it stands
+        :return: total money in the participating submissions, { value: money } in the winning ones,
+                 and settlement() for the cutoff
+        """
+        participation, winning = self.settlement(t_cutoff=t_cutoff)
+        by_value = self.winners_by_value(winning=winning, values=list(self.values))
+        value_totals = dict([(v, sum([a for _, a in winners])) for v, winners in by_value.items() if winners])
+        return sum([a for _, a in participation]), value_totals, (participation, winning)
+
+    def exposure(self, owner:str, values:list=None, t_cutoff:int=None) -> dict:
+        """ Net reward to owner for each value, were it to win with the pool as it stands (or as settled at t_cutoff)
+        :param values:  Defaults to the values in the owner's winning submission
+        :return: { value: reward }, empty if the owner has not bet (or does not participate at t_cutoff)
+        """
+        if owner not in self.owner_times:
+            return dict()
+        if t_cutoff is None:
+            subs = self.owner_subs[owner]
+            if not subs:
+                return dict()
+            s = subs[-1]
+            stake, total, value_totals = self.sub_amount[s], self.total, self.value_totals
+        else:
+            total, value_totals, (participation, _) = self.standing(t_cutoff=t_cutoff)
+            stake = dict(participation).get(owner)
+            if stake is None:
+                return dict()
+            s = self.latest(owner=owner, t_cutoff=t_cutoff, strict=True)
+        own = dict()
+        for v, a in (self.rows(s) if s is not None else []):
+            own[v] = own.get(v, 0.0) + a
+        if values is None:
+            values = list(own)
+        return dict([(v, (own[v]*total/value_totals[v] if own.get(v) else 0.0) - stake) for v in values])
+
+    def largest(self, top_n:int=None, t_cutoff:int=None) -> [tuple]:
+        """ (value, money) for the values with most money in the pool as it stands (or as settled at t_cutoff), largest first """
+        value_totals = self.value_totals if t_cutoff is None else self.standing(t_cutoff=t_cutoff)[1]
+        if top_n is None:
+            return sorted(value_totals.items(), key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(top_n, value_totals.items(), key=lambda item: item[1])
+
+    def money_after(self, t_cutoff:int):
+        """ Money bet on each value in submissions strictly after the cutoff, summed in order of arrival
+            The result is shared with later calls for the same cutoff, so should not be modified.
+        :return: { value: money }, number of rows counted
+        """
+        return self._frame('money_after', t_cutoff, self._money_after)
+
+    def _money_after(self, t_cutoff:int):
+        return self.money_after_upto(t_cutoff=t_cutoff, n=len(self))
+
+    def money_after_upto(self, t_cutoff:int, n:int):
+        """ money_after() counting only the first n submissions, and remembering nothing """
+        money = dict()
+        n_rows = 0
+        for s in range(n):
+            if self.sub_time[s] > t_cutoff:
+                for r in range(self.sub_start[s], self.sub_end[s]):
+                    key = self.row_value[r]
+                    money[key] = money.get(key, 0) + self.row_amount[r]
+                n_rows += self.sub_end[s] - self.sub_start[s]
+        return self.decode_values(money), n_rows
+
+    def decode_values(self, d:dict) -> dict:
+        """ Re-key a dict from column entries to values """
+        return d
+
+    def compacted(self, t_cutoff:int):
+        """ A copy without the submissions that cannot matter for any cutoff from t_cutoff onwards
+            For each owner that is everything older than their latest submission strictly before t_cutoff.
+            Owners and values are never forgotten, so payout() sees the same pool.
+        :return: pool (self, if there is nothing to drop)
+        """
+        keep = list()
+        for owner, times in self.owner_times.items():
+            j = bisect_left(times, t_cutoff)
+            keep.extend(self.owner_subs[owner][max(j-1, 0):])
+        if len(keep) == len(self):
+            return self
+        keep.sort()
+        pool = self.empty_copy()
+        for s in keep:
+            pool.add(t=self.sub_time[s], owner=self.owner(s), amount=self.sub_amount[s], rows=self.rows(s))
+        return pool
+
+
+class PoolIndex:
+    """ One HorizonPool (or subclass thereof) per horizon """
+
+    def __init__(self, pool_class=HorizonPool):
+        self.pool_class = pool_class
+        self.pools = dict()
+        self.rows_since_compaction = 0
+
+    def pool(self, h:str) -> HorizonPool:
+        if h not in self.pools:
+            self.pools[h] = self.pool_class()
+        return self.pools[h]
+
+    def add(self, h:str, t:int, owner:str, amount:float, rows:[(str, float)]) -> int:
+        self.rows_since_compaction += len(rows)
+        return self.pool(h).add(t=t, owner=owner, amount=amount, rows=rows)
+
+    def compact(self, h:str, t_cutoff:int) -> dict:
+        """ Replace the pool for horizon h with its compacted copy
+        :return: { owner: time of earliest submission kept } for owners that lost submissions
+        """
+        pool = self.pools[h]
+        new_pool = pool.compacted(t_cutoff=t_cutoff)
+        self.pools[h] = new_pool
+        return dict([(owner, times[0]) for owner, times in new_pool.owner_times.items()
+                     if len(times) < len(pool.owner_times[owner])])
+
+    @staticmethod
+    def from_state(state:dict, pool_class=HorizonPool):
+        """ Rebuild the index from state['bets'] and state['bet_totals'] """
+        index = PoolIndex(pool_class=pool_class)
+        horizons = list(state['bet_totals'].keys()) + [h for h in state['bets'] if h not in state['bet_totals']]
+        for h in horizons:
+            index.pools[h] = _pool_from_state(bets=state['bets'].get(h, dict()),
+                                              bet_totals=state['bet_totals'].get(h, dict()), pool=pool_class())
+        return index
+
+
+def _pool_from_state(bets:dict, bet_totals:dict, pool:HorizonPool) -> HorizonPool:
+    # Submissions are identified by (owner, time), which add() keeps unique
+    amounts = dict()
+    chains = list()
+    for owner, owner_totals in bet_totals.items():
+        chains.append([(owner, t_) for t_, a_ in owner_totals])
+        for t_, a_ in owner_totals:
+            amounts[(owner, t_)] = a_
+    rows = dict([(key, list()) for key in amounts])
+    for v, triples in bets.items():
+        chains.append([(o_, t_) for t_, o_, a_ in triples])
+        for t_, o_, a_ in triples:
+            if (o_, t_) not in rows:
+                rows[(o_, t_)] = list()
+            rows[(o_, t_)].append((v, a_))
+    for key, key_rows in rows.items():
+        if key not in amounts:
+            amounts[key] = sum([a_ for _, a_ in key_rows])
+
+    for v in bets:
+        pool.intern_value(v)
+    for owner in bet_totals:
+        pool.intern_owner(owner)
+    for owner, t_ in _arrival_order(keys=list(rows.keys()), chains=chains):
+        pool.add(t=t_, owner=owner, amount=amounts[(owner, t_)], rows=rows[(owner, t_)])
+    return pool
+
+
+def _arrival_order(keys:list, chains:[list]) -> list:
+    """ An order of (owner, time) submissions consistent with every chain
+        Each bets[h][value] list, and each owner's bet_totals, is in order of arrival. Any merge
+        that respects all of them reproduces every per-value ordering, which is all payout() can see.
+    """
+    rank = dict([(key, (key[1], i)) for i, key in enumerate(keys)])
+    successors = dict([(key, set()) for key in keys])
+    in_degree = dict([(key, 0) for key in keys])
+    for chain in chains:
+        for prev, key in zip(chain[:-1], chain[1:]):
+            if prev != key and key not in successors[prev]:
+                successors[prev].add(key)
+                in_degree[key] += 1
+    ready = [(rank[key], key) for key in keys if in_degree[key] == 0]
+    heapq.heapify(ready)
+    order = list()
+    while ready:
+        _, key = heapq.heappop(ready)
+        order.append(key)
+        for nxt in successors[key]:
+            in_degree[nxt] -= 1
+            if in_degree[nxt] == 0:
+                heapq.heappush(ready, (rank[nxt], nxt))
+    if len(order) < len(keys):
+        # Not a state add() could have produced. Fall back to time order for the remainder.
+        placed = set(order)
+        order.extend(sorted([key for key in keys if key not in placed], key=lambda key: rank[key]))
+    return order
@@ -0,0 +1,184 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.categoricallottery import CategoricalLottery
+from lottery.conventions import consolidate_rewards
+from concurrent.futures import ProcessPoolExecutor
+import zlib
+
+# A book of many independent lotteries, keyed by id, that can be settled in bulk.
+#
+#      - With n_shards=0 everything happens in this process
+#      - Otherwise each lottery lives in one of n_shards worker processes, chosen by a stable hash of its id,
+#        and stays resident there. Batches are split by shard, run in parallel, and results are put back
+#        in the order requested, so output is identical to applying the batch one call at a time.
+#
+# If a call raises, the batch is not all-or-nothing. In this process, calls before it have been applied and
+# later ones have not, just as in a loop. With shards, each shard stops at its own first failure but the other
+# shards run theirs, so calls later in the batch than the failing one may have been applied too. apply() then
+# raises the error from the earliest failing call, once every shard has finished.
+#
+# Batches are lists of (lottery_id, kwargs) pairs, for example
+#      book.settle([ ('race1', dict(value='3', t=50)), ('race2', dict(value='7', t=51)) ])
+
+
+def settle(lottery:OngoingCategoricalLottery, value, t:int, k:int=None, tau:int=None):
+    """ Pay out on a truth, then record it (as CategoricalLottery.settle does)
+    :return: consolidated rewards
+    """
+    if isinstance(lottery, CategoricalLottery):
+        return lottery.settle(value=value, t=t)
+    rewards = lottery.payout(t=t, value=value, consolidate=True, k=k, tau=tau)
+    lottery.observe(value=value, t=t)
+    return rewards
+
+
+def _call(lottery:OngoingCategoricalLottery, method:str, kwargs:dict):
+    if method == 'settle':
+        return settle(lottery, **kwargs)
+    return getattr(lottery, method)(**kwargs)
+
+
+def _apply_calls(lotteries:dict, calls:list) -> list:
+    """ [(position, lottery_id, method, kwargs)] -> [(position, result)] """
+    return [(position, _call(lotteries[lottery_id], method, kwargs)) for position, lottery_id, method, kwargs in calls]
+
+
+# Worker side. Each shard is a single process, so this dict is that shard's lotteries.
+_RESIDENT = dict()
+
+
+def _worker_load(items:[(str, bytes)]):
+    for lottery_id, b in items:
+        _RESIDENT[lottery_id] = OngoingCategoricalLottery.from_bytes(b)
+    return len(items)
+
+
+def _worker_dump(lottery_ids:list) -> list:
+    return [_RESIDENT[lottery_id].to_bytes() for lottery_id in lottery_ids]
+
+
+def _worker_drop(lottery_ids:list):
+    for lottery_id in lottery_ids:
+        _RESIDENT.pop(lottery_id, None)
+
+
+def _worker_apply(calls:list):
+    """ :return: [(position, result)] for the calls made, and (position, exception) if one raised """
+    done = list()
+    for position, lottery_id, method, kwargs in calls:
+        try:
+            done.append((position, _call(_RESIDENT[lottery_id], method, kwargs)))
+        except Exception as e:
+            return done, (position, e)
+    return done, None
+
+
+class LotteryBook:
+
+    def __init__(self, lotteries:dict=None, n_shards:int=0):
+        """
+        :param lotteries:   { lottery_id: lottery }
+        :param n_shards:    Number of worker processes (0 to work in this process)
+        """
+        self.n_shards = n_shards
+        self.ids = list()
+        self.lotteries = dict()     # Only used when n_shards=0
+        self.executors = [ProcessPoolExecutor(max_workers=1) for _ in range(n_shards)]
+        if lotteries:
+            self.update(lotteries)
+
+    def shard_of(self, lottery_id) -> int:
+        return zlib.crc32(str(lottery_id).encode('utf-8')) % self.n_shards
+
+    def update(self, lotteries:dict):
+        """ Add or replace lotteries """
+        for lottery_id in lotteries:
+            if lottery_id not in self.lotteries and lottery_id not in self.ids:
+                self.ids.append(lottery_id)
+        if not self.n_shards:
+            self.lotteries.update(lotteries)
+        else:
+            by_shard = dict()
+            for lottery_id, lottery in lotteries.items():
+                by_shard.setdefault(self.shard_of(lottery_id), list()).append((lottery_id, lottery.to_bytes()))
+            for future in [self.executors[shard].submit(_worker_load, items) for shard, items in by_shard.items()]:
+                future.result()
+
+    def __setitem__(self, lottery_id, lottery):
+        self.update({lottery_id: lottery})
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, lottery_id):
+        return lottery_id in self.ids
+
+    def __getitem__(self, lottery_id) -> OngoingCategoricalLottery:
+        """ The lottery itself, or a copy fetched from its worker """
+        if lottery_id not in self.ids:
+            raise KeyError(lottery_id)
+        if not self.n_shards:
+            return self.lotteries[lottery_id]
+        b = self.executors[self.shard_of(lottery_id)].submit(_worker_dump, [lottery_id]).result()[0]
+        return OngoingCategoricalLottery.from_bytes(b)
+
+    def __delitem__(self, lottery_id):
+        self.ids.remove(lottery_id)
+        if not self.n_shards:
+            del self.lotteries[lottery_id]
+        else:
+            self.executors[self.shard_of(lottery_id)].submit(_worker_drop, [lottery_id]).result()
+
+    def apply(self, method:str, batch:[(str, dict)]) -> list:
+        """ Call method(**kwargs) on each lottery in the batch
+        :return: results in the order of the batch
+            If a call raises, see above for which of the others have been applied
+        """
+        calls = [(position, lottery_id, method, kwargs) for position, (lottery_id, kwargs) in enumerate(batch)]
+        if not self.n_shards:
+            done = _apply_calls(self.lotteries, calls)
+        else:
+            by_shard = dict()
+            for call in calls:
+                by_shard.setdefault(self.shard_of(call[1]), list()).append(call)
+            futures = [self.executors[shard].submit(_worker_apply, shard_calls) for shard, shard_calls in by_shard.items()]
+            outcomes = [future.result() for future in futures]
+            failures = [failure for _, failure in outcomes if failure is not None]
+            if failures:
+                raise min(failures, key=lambda failure: failure[0])[1]
+            done = [item for shard_done, _ in outcomes for item in shard_done]
+        results = [None]*len(calls)
+        for position, result in done:
+            results[position] = result
+        return results
+
+    def add(self, batch:[(str, dict)]) -> list:
+        return self.apply('add', batch)
+
+    def observe(self, batch:[(str, dict)]) -> list:
+        return self.apply('observe', batch)
+
+    def payout(self, batch:[(str, dict)]):
+        """
+        :return: consolidated rewards per lottery in batch order, and all of them consolidated together
+        """
+        batch = [(lottery_id, dict(kwargs, consolidate=True)) for lottery_id, kwargs in batch]
+        rewards = self.apply('payout', batch)
+        return rewards, consolidate_rewards([r for lottery_rewards in rewards for r in lottery_rewards])
+
+    def settle(self, batch:[(str, dict)]):
+        """ Pay out and record truths, given as kwargs value, t (and optionally k, tau)
+        :return: consolidated rewards per lottery in batch order, and all of them consolidated together
+        """
+        rewards = self.apply('settle', batch)
+        return rewards, consolidate_rewards([r for lottery_rewards in rewards for r in lottery_rewards])
+
+    def close(self):
+        for executor in self.executors:
+            executor.shutdown()
+        self.executors = list()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,231 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.categoricallottery import CategoricalLottery
+from lottery.poolindex import PoolIndex, HorizonPool
+from lottery.columnar import ColumnarPool
+from array import array
+import json
+import mmap
+import struct
+import sys
+
+# A binary snapshot of a lottery, as an alternative to json.dumps() and from_json()
+#
+#      - A fixed prefix, then a JSON header, then packed little-endian numeric columns aligned to 8 bytes
+#      - The header holds meta, the observation history, last_bet_time, and per horizon the interned
+#        owner and value tables plus the offset of every column
+#      - Bets, bet totals and forecasts are stored once per row as integer ids and numbers
+#      - A column of doubles that also holds integers gets a companion column flagging them, so they come back as int
+#
+# open_snapshot() memory-maps a file and reads columns on demand, without building the lottery.
+# Converting to a lottery and back to JSON reproduces json.dumps() of the original.
+
+MAGIC = b'LOTTERY\x00'
+VERSION = 1
+PREFIX = struct.Struct('<8sIIQ')     # magic, version, flags, header length
+ALIGN = 8
+POOL_COLUMNS = ['sub_time', 'sub_owner', 'sub_amount', 'sub_start', 'sub_end', 'row_value', 'row_amount']
+FORECAST_COLUMNS = ['fc_start', 'fc_end', 'money_value', 'money_amount', 'prob_value', 'prob_weight']
+INT_FLAGS = '@int'                   # Suffix of the companion column
+LOTTERY_CLASSES = dict([(cls.__name__, cls) for cls in [OngoingCategoricalLottery, CategoricalLottery]])
+
+
+def _lottery_class(name:str):
+    """ The class named in a header. CombinatorialLottery is only imported when a snapshot needs it. """
+    if name == 'CombinatorialLottery':
+        from lottery.combinatorial import CombinatorialLottery
+        return CombinatorialLottery
+    return LOTTERY_CLASSES.get(name, OngoingCategoricalLottery)
+
+
+def is_snapshot(b:bytes) -> bool:
+    return bytes(b[:len(MAGIC)]) == MAGIC
+
+
+def _packed(values, typecode:str=None) -> array:
+    """ Integers stay integers unless something forces doubles """
+    if isinstance(values, array):
+        return values
+    if typecode is None:
+        typecode = 'q' if all([isinstance(x, int) and not isinstance(x, bool) for x in values]) else 'd'
+    return array(typecode, values)
+
+
+def _int_flags(column, typecode:str):
+    """ For a column of doubles that holds some integers, which items they are (else None) """
+    if (typecode != 'd') or isinstance(column, array):
+        return None
+    flags = array('q', [int(isinstance(x, int) and not isinstance(x, bool)) for x in column])
+    return flags if any(flags) else None
+
+
+def to_bytes(lottery:OngoingCategoricalLottery) -> bytes:
+    state = lottery['state']
+    small_state = dict([(key, list(val) if key in ['time_history', 'value_history'] else val)
+                        for key, val in state.items() if key not in ['bets', 'bet_totals', 'forecasts']])
+    columns = list()
+    horizons = dict()
+    for h in list(lottery.index.pools) + [h for h in state.get('forecasts', dict()) if h not in lottery.index.pools]:
+        entry = dict(columns=dict())
+        pool = lottery.index.pools.get(h)
+        if pool is not None:
+            entry['owners'] = list(pool.owner_times.keys())
+            entry['values'] = list(pool.values.keys())
+            owner_ids = dict([(owner, i) for i, owner in enumerate(entry['owners'])])
+            value_ids = dict([(v, i) for i, v in enumerate(entry['values'])])
+            encoded = dict(sub_owner=array('q', [owner_ids[pool.owner(s)] for s in range(len(pool))]),
+                           row_value=pool.row_value if isinstance(pool, ColumnarPool) else
+                                     array('q', [value_ids[v] for v in pool.row_value]))
+            for name in POOL_COLUMNS:
+                columns.append((entry, name, encoded.get(name, getattr(pool, name)), None))
+        forecasts = state.get('forecasts', dict()).get(h)
+        if forecasts is not None:
+            entry['fc_owners'] = list(forecasts.keys())
+            entry['fc_values'] = list()
+            fc_value_ids = dict()
+            fc = dict([(name, list()) for name in FORECAST_COLUMNS])
+            for owner in entry['fc_owners']:
+                fc['fc_start'].append(len(fc['money_value']))
+                for (kind, amount_name) in [('money', 'money_amount'), ('probability', 'prob_weight')]:
+                    value_name = 'money_value' if kind == 'money' else 'prob_value'
+                    for v, x in forecasts[owner][kind]:
+                        if v not in fc_value_ids:
+                            fc_value_ids[v] = len(entry['fc_values'])
+                            entry['fc_values'].append(v)
+                        fc[value_name].append(fc_value_ids[v])
+                        fc[amount_name].append(x)
+                fc['fc_end'].append(len(fc['money_value']))
+            for name in FORECAST_COLUMNS:
+                columns.append((entry, name, fc[name], 'd' if name in ['money_amount', 'prob_weight'] else 'q'))
+        horizons[h] = entry
+
+    # Lay the columns out, recording where each one lives
+    blobs = list()
+    offset = 0
+    for entry, name, column, typecode in list(columns):
+        flags = _int_flags(column, _packed(column, typecode).typecode)
+        if flags is not None:
+            columns.append((entry, name + INT_FLAGS, flags, 'q'))
+    for entry, name, column, typecode in columns:
+        packed = _packed(column, typecode)
+        if sys.byteorder != 'little':
+            packed = array(packed.typecode, packed)
+            packed.byteswap()
+        blob = packed.tobytes()
+        entry['columns'][name] = [packed.typecode, offset, len(packed)]
+        blobs.append(blob)
+        offset += len(blob)   # Items are 8 bytes, so alignment is preserved
+
+    header = json.dumps(dict(cls=type(lottery).__name__, meta=lottery['meta'], state=small_state,
+                             state_keys=list(state.keys()), horizons=horizons)).encode('utf-8')
+    header += b' '*(-len(header) % ALIGN)
+    return b''.join([PREFIX.pack(MAGIC, VERSION, 0, len(header)), header] + blobs)
+
+
+class SnapshotReader:
+    """ Read-only access to a snapshot, with columns served straight from the underlying buffer """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, version, flags, header_len = PREFIX.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a lottery snapshot')
+        if version > VERSION:
+            raise ValueError('Snapshot version '+str(version)+' is newer than this library understands')
+        self.version = version
+        self.header = json.loads(bytes(buffer[PREFIX.size:PREFIX.size + header_len]).decode('utf-8'))
+        self.data_offset = PREFIX.size + header_len
+        self.meta = self.header['meta']
+        self.horizons = list(self.header['horizons'].keys())
+
+    def column(self, h:str, name:str):
+        """ A column as a memoryview (no copy) on little-endian machines """
+        typecode, offset, length = self.header['horizons'][h]['columns'][name]
+        start = self.data_offset + offset
+        view = memoryview(self.buffer)[start:start + 8*length]
+        if sys.byteorder != 'little':
+            swapped = array(typecode, bytes(view))
+            swapped.byteswap()
+            return swapped
+        return view.cast(typecode)
+
+    def values(self, h:str, name:str) -> list:
+        """ A column as a list, with any integers stored among doubles restored """
+        values = self.column(h, name).tolist()
+        if name + INT_FLAGS in self.header['horizons'][h]['columns']:
+            flags = self.column(h, name + INT_FLAGS)
+            values = [int(x) if f else x for x, f in zip(values, flags)]
+        return values
+
+    def tables(self, h:str):
+        """ Interned owners and values for horizon h """
+        entry = self.header['horizons'][h]
+        return entry.get('owners', list()), entry.get('values', list())
+
+    def to_lottery(self, cls=None) -> OngoingCategoricalLottery:
+        cls = cls or _lottery_class(self.header.get('cls'))
+        columnar = self.meta.get('storage') == 'columnar'
+        index = PoolIndex(pool_class=ColumnarPool if columnar else HorizonPool)
+        state = dict([(key, self.header['state'].get(key, dict())) for key in self.header['state_keys']])
+        state['forecasts'] = dict()
+        for h, entry in self.header['horizons'].items():
+            if 'owners' in entry:
+                index.pools[h] = self._pool(h, pool=index.pool_class())
+            if 'fc_owners' in entry:
+                state['forecasts'][h] = self._forecasts(h)
+        return cls.from_index(state=state, meta=self.meta, index=index)
+
+    def _pool(self, h:str, pool:HorizonPool) -> HorizonPool:
+        owners, values = self.tables(h)
+        for owner in owners:
+            pool.intern_owner(owner)
+        for v in values:
+            pool.intern_value(v)
+        cols = dict([(name, self.values(h, name)) for name in POOL_COLUMNS])
+        row_value, row_amount = cols['row_value'], cols['row_amount']
+        for t, o, a, start, end in zip(cols['sub_time'], cols['sub_owner'], cols['sub_amount'], cols['sub_start'], cols['sub_end']):
+            pool.add(t=t, owner=owners[o], amount=a, rows=[(values[row_value[r]], row_amount[r]) for r in range(start, end)])
+        return pool
+
+    def _forecasts(self, h:str) -> dict:
+        entry = self.header['horizons'][h]
+        fc_values = entry['fc_values']
+        cols = dict([(name, self.values(h, name)) for name in FORECAST_COLUMNS])
+        forecasts = dict()
+        for owner, start, end in zip(entry['fc_owners'], cols['fc_start'], cols['fc_end']):
+            forecasts[owner] = {'money': [[fc_values[cols['money_value'][r]], cols['money_amount'][r]] for r in range(start, end)],
+                                'probability': [[fc_values[cols['prob_value'][r]], cols['prob_weight'][r]] for r in range(start, end)]}
+        return forecasts
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def from_bytes(b:bytes, cls=None) -> OngoingCategoricalLottery:
+    return SnapshotReader(b).to_lottery(cls=cls)
+
+
+def open_snapshot(path:str) -> SnapshotReader:
+    """ Memory-map a snapshot file. Close the reader (or use it as a context manager) when done. """
+    with open(path, 'rb') as f:
+        return SnapshotReader(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def save(lottery:OngoingCategoricalLottery, path:str):
+    with open(path, 'wb') as f:
+        f.write(to_bytes(lottery))
+
+
+def load(path:str, cls=None) -> OngoingCategoricalLottery:
+    """ Read a snapshot, or a file written with json.dumps() """
+    with open(path, 'rb') as f:
+        b = f.read()
+    if is_snapshot(b):
+        return from_bytes(b, cls=cls)
+    return (cls or OngoingCategoricalLottery)(**json.loads(b.decode('utf-8')))
@@ -0,0 +1,131 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery, _net_rewards, _split_pots
+from lottery.conventions import ensure_normalized_dict_weights
+import threading
+import json
+
+# A lottery that many threads can query while another thread adds to it
+#
+#      - Writers (add, add_many, observe, observe_and_settle, compact) hold a lock for the duration of the call
+#      - Readers (payout, payout_all, suggest) hold it only long enough to note the cutoff, the horizon's pool
+#        and how many submissions it has. The work is then done without the lock, on those submissions alone.
+#
+# This is safe because a pool is only ever appended to, and compaction replaces a pool rather than changing it,
+# so the first n submissions of a pool never change. Results computed this way are remembered for later
+# readers only if nothing was added in the meantime. Array arithmetic is not used by readers, as NumPy views of
+# a columnar pool's buffers would stop the writer from growing them. Callbacks given to subscribe() run in the
+# writing thread with the lock held, so should not wait on readers.
+
+
+class ThreadSafeOngoingCategoricalLottery(OngoingCategoricalLottery):
+
+    def __init__(self, *args, **kwargs):
+        self.lock = threading.RLock()
+        super().__init__(*args, **kwargs)
+
+    # Writers
+
+    def add(self, *args, **kwargs) -> int:
+        with self.lock:
+            return super().add(*args, **kwargs)
+
+    def _add_many(self, *args, **kwargs):
+        with self.lock:
+            return super()._add_many(*args, **kwargs)
+
+    def observe(self, *args, **kwargs):
+        with self.lock:
+            return super().observe(*args, **kwargs)
+
+    def observe_and_settle(self, *args, **kwargs) -> dict:
+        with self.lock:
+            return super().observe_and_settle(*args, **kwargs)
+
+    def compact(self, *args, **kwargs) -> dict:
+        with self.lock:
+            return super().compact(*args, **kwargs)
+
+    # Readers
+
+    def payout(self, t:int, value:str, consolidate=False, k:int=None, tau:int=None):
+        with self.lock:
+            k, tau, h, t_cutoff = self.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
+            pool = self.index.pools.get(h)
+            if (t_cutoff>=t) or (pool is None) or (value not in pool.values):
+                return []
+            n, frame, owners = self._capture(pool, 'settlement', t_cutoff)
+        all_totals, winning = frame or self._settlement(h, pool, n, owners, t_cutoff)
+        return _net_rewards(all_totals=all_totals, winners=pool.winners(value=value, winning=winning), consolidate=consolidate)
+
+    def payout_all(self, t:int, values:[str]=None, consolidate=False, k:int=None, tau:int=None, use_numpy:bool=None) -> dict:
+        with self.lock:
+            k, tau, h, t_cutoff = self.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
+            pool = self.index.pools.get(h)
+            if values is None:
+                values = self['meta'].get('allowed_values') or (list(pool.values) if pool is not None else [])
+            rewards = dict([(v, []) for v in values])
+            if (t_cutoff>=t) or (pool is None):
+                return rewards
+            candidates = [ v for v in rewards if v in pool.values ]
+            n, frame, owners = self._capture(pool, 'settlement', t_cutoff)
+        all_totals, winning = frame or self._settlement(h, pool, n, owners, t_cutoff)
+        rewards.update(_split_pots(pool=pool, all_totals=all_totals, winning=winning, values=candidates,
+                                   consolidate=consolidate, use_numpy=False))
+        return rewards
+
+    def suggest_with_count(self, t:int=None, k:int=None, tau:int=None):
+        with self.lock:
+            _, _, h, t_cutoff = self.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
+            pool = self.index.pools[h]
+            names = self.all_added_values()
+            n, frame, _ = self._capture(pool, 'money_after', t_cutoff)
+        if frame is None:
+            frame = pool.money_after_upto(t_cutoff=t_cutoff, n=n)
+            self._remember(h, pool, n, 'money_after', t_cutoff, frame)
+        money, n_bets = frame
+        suggestion_weights = dict([(nm, money.get(nm, 0)) for nm in names])
+        return ensure_normalized_dict_weights(suggestion_weights), n_bets
+
+    # Queries on the pool are quick, so simply hold the lock
+
+    def owner_exposure(self, *args, **kwargs) -> dict:
+        with self.lock:
+            return super().owner_exposure(*args, **kwargs)
+
+    def pool_sizes(self, *args, **kwargs) -> [tuple]:
+        with self.lock:
+            return super().pool_sizes(*args, **kwargs)
+
+    def implied_odds(self, *args, **kwargs) -> dict:
+        with self.lock:
+            return super().implied_odds(*args, **kwargs)
+
+    def payoff_odds(self, *args, **kwargs) -> dict:
+        with self.lock:
+            return super().payoff_odds(*args, **kwargs)
+
+    def dumps(self) -> str:
+        """ json.dumps() of a consistent state """
+        with self.lock:
+            return json.dumps(self)
+
+    def to_bytes(self) -> bytes:
+        with self.lock:
+            return super().to_bytes()
+
+    # Helpers, called with the lock held (_capture) or not (_settlement)
+
+    @staticmethod
+    def _capture(pool, kind:str, t_cutoff:int):
+        """ :return: number of submissions, remembered result if any, owners if there is none """
+        frame = pool.frames.get((kind, t_cutoff))
+        return len(pool), frame, (list(pool.owner_times) if frame is None else None)
+
+    def _settlement(self, h:str, pool, n:int, owners:list, t_cutoff:int):
+        frame = pool.settlement_upto(t_cutoff=t_cutoff, n=n, owners=owners)
+        self._remember(h, pool, n, 'settlement', t_cutoff, frame)
+        return frame
+
+    def _remember(self, h:str, pool, n:int, kind:str, t_cutoff:int, frame):
+        with self.lock:
+            if self.index.pools.get(h) is pool and len(pool) == n:
+                pool.remember(kind, t_cutoff, frame)
@@ -0,0 +1,46 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+import random
+
+# Seeded random submissions and observations shared by the tests
+#
+#      submissions, observations = random_tapes(seed=1)
+#      L, values = random_lottery(seed=1)
+#      C, values = random_lottery(seed=1, lottery=OngoingCategoricalLottery(meta=...))   # Same bets, another lottery
+
+OWNERS = ['owner'+str(i) for i in range(12)]
+VALUES = [str(i) for i in range(6)]
+
+
+def random_tapes(seed, n_rounds:int=30, owners:[str]=None, values:[str]=None, horizons=((2, 5),), max_values:int=4,
+                 amounts=(0.5, 1.0, 2.0)):
+    """ Ten seconds per round. Each round some owners bet on up to max_values values (repeats allowed), then a value
+        is observed at the end of the round.
+    :return: submissions (t, owner, values, weights, amount, k, tau) in time order, observations (t, value)
+    """
+    rng = random.Random(seed)
+    owners, values = owners or OWNERS, values or VALUES
+    submissions, observations = list(), [(0, values[0])]
+    for rnd in range(1, n_rounds):
+        t = 10*rnd
+        for owner in rng.sample(owners, rng.randint(1, len(owners))):
+            vs = [rng.choice(values) for _ in range(rng.randint(1, max_values))]
+            k, tau = rng.choice(horizons)
+            submissions.append((t+rng.randint(0, 8), owner, vs, [rng.random()+0.01 for _ in vs], rng.choice(amounts), k, tau))
+        observations.append((t+9, rng.choice(values)))
+    submissions.sort(key=lambda s: s[0])
+    return submissions, observations
+
+
+def random_lottery(seed, lottery:OngoingCategoricalLottery=None, **kwargs):
+    """ A lottery (by default a new OngoingCategoricalLottery) fed random_tapes(seed, **kwargs) in time order
+    :return: lottery, values
+    """
+    L = OngoingCategoricalLottery() if lottery is None else lottery
+    submissions, observations = random_tapes(seed, **kwargs)
+    i = 0
+    for t, value in observations:
+        while i < len(submissions) and submissions[i][0] < t:
+            L.add(*submissions[i])
+            i += 1
+        L.observe(t=t, value=value)
+    return L, kwargs.get('values') or VALUES
@@ -0,0 +1,88 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.inclusion.numpyinclusion import using_numpy
+from tests.lotteries import random_tapes
+import random
+import json
+
+
+def _records(seed, n=400):
+    """ Random submissions, some moved back in time so they are rejected, with weights in every form add() takes """
+    rng = random.Random(seed)
+    submissions, _ = random_tapes(seed, n_rounds=n//2, owners=['bill', 'mary', 'sally', 'ted', 'alice'],
+                                  values=list('abcdefghijk'), horizons=[(1, 0), (1, 2)], max_values=9, amounts=[1.0, 2.5])
+    records = list()
+    for t, owner, values, weights, amount, k, tau in submissions[:n]:
+        weights = rng.choice([None, weights, [rng.randint(1, 5) for _ in values], [1.0/len(values) for _ in values]])
+        records.append((t-rng.choice([0, 0, 15]), owner, values, weights, amount, k, tau))
+    return records
+
+
+def test_add_many_matches_add():
+    for storage in ['json', 'columnar']:
+        for use_numpy in [False, True] if using_numpy else [False]:
+            records = _records(seed=7)
+            L, M = OngoingCategoricalLottery(storage=storage), OngoingCategoricalLottery(storage=storage)
+            L.observe(t=5, value='a')
+            M.observe(t=5, value='a')
+            expected = [L.add(*r) for r in records]
+            assert M.add_many(records, use_numpy=use_numpy) == expected
+            assert json.dumps(M) == json.dumps(L)
+            assert M.payout(t=200, value='c', k=1, tau=2) == L.payout(t=200, value='c', k=1, tau=2)
+
+
+def test_add_many_record_formats():
+    records = _records(seed=8, n=50)
+    L = OngoingCategoricalLottery(allowed_horizons=['k=1&tau=2'])
+    L.observe(t=0, value='a')
+    expected = [L.add(*r[:5]) for r in records]
+    for batch in [[r[:5] for r in records],
+                  [dict(zip(['t', 'owner', 'values', 'weights', 'amount'], r)) for r in records],
+                  dict(zip(['t', 'owner', 'values', 'weights', 'amount'], zip(*[r[:5] for r in records])))]:
+        M = OngoingCategoricalLottery(allowed_horizons=['k=1&tau=2'])
+        M.observe(t=0, value='a')
+        assert M.add_many(batch) == expected
+        assert json.dumps(M) == json.dumps(L)
+
+
+def test_add_many_stops_where_add_would():
+    L = OngoingCategoricalLottery()
+    L.observe(t=0, value='a')
+    records = [(1, 'bill', ['a'], None, 1.0, 1, 0), (1, 'mary', ['a', 'b'], [0, 0], 1.0, 1, 0), (2, 'ted', ['b'], None, 1.0, 1, 0)]
+    try:
+        L.add_many(records*20, use_numpy=using_numpy)
+        assert False, 'weights summing to zero should be rejected'
+    except AssertionError:
+        pass
+    assert list(L['state']['last_bet_time']['k=1&tau=0']) == ['bill']
+
+
+def test_add_many_applies_records_before_a_bad_one():
+    for use_numpy in [False, True] if using_numpy else [False]:
+        records = _records(seed=9, n=60)
+        records[40] = records[40][:2] + (None,) + records[40][3:]
+        L, M = OngoingCategoricalLottery(), OngoingCategoricalLottery()
+        L.observe(t=0, value='a')
+        M.observe(t=0, value='a')
+        for r in records[:40]:
+            L.add(*r)
+        try:
+            M.add_many(records, use_numpy=use_numpy)
+            assert False, 'values=None should be rejected'
+        except TypeError:
+            pass
+        assert json.dumps(M) == json.dumps(L)
+
+
+if using_numpy:
+
+    def test_add_many_numpy_columns():
+        import numpy as np
+        records = _records(seed=10, n=60)
+        L, M = OngoingCategoricalLottery(), OngoingCategoricalLottery()
+        L.observe(t=0, value='a')
+        M.observe(t=0, value='a')
+        expected = [L.add(t=r[0], owner=r[1], values=r[2], amount=r[4], k=1, tau=2) for r in records]
+        batch = dict(t=np.array([r[0] for r in records]), owner=np.array([r[1] for r in records]),
+                     values=[r[2] for r in records], amount=np.array([r[4] for r in records]))
+        assert M.add_many(batch, k=1, tau=2) == expected
+        assert json.dumps(M) == json.dumps(L)
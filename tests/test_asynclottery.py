@@ -0,0 +1,73 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.asynclottery import AsyncOngoingCategoricalLottery
+from tests.lotteries import random_tapes
+import asyncio
+import json
+
+
+def _submissions(seed, n=500):
+    """ Random submissions as keyword arguments, then every tenth again, which are rejected as repeats """
+    submissions, _ = random_tapes(seed, n_rounds=n//2, owners=['bill', 'mary', 'sally', 'ted'], values=['a', 'b', 'c'],
+                                  horizons=[(1, 2)], max_values=2)
+    submissions = submissions[:n] + submissions[:n:10]
+    return [dict(zip(['t', 'owner', 'values', 'weights', 'amount', 'k', 'tau'], s)) for s in submissions]
+
+
+def test_async_matches_sequential():
+    subs = _submissions(seed=2)
+    L = OngoingCategoricalLottery()
+    L.observe(t=0, value='a')
+    expected_codes = [L.add(**s) for s in subs]
+    expected_rewards = L.payout(t=500, value='b', k=1, tau=2)
+
+    async def run():
+        A = AsyncOngoingCategoricalLottery(max_batch=64)
+        await A.observe(t=0, value='a')
+        adds = [asyncio.ensure_future(A.add(**s)) for s in subs]
+        rewards = await A.payout(t=500, value='b', k=1, tau=2)
+        codes = await asyncio.gather(*adds)
+        await A.join()
+        return A, codes, rewards
+
+    A, codes, rewards = asyncio.run(run())
+    assert codes == expected_codes
+    assert 0 in codes and 1 in codes
+    assert rewards == expected_rewards
+    assert json.dumps(A.lottery) == json.dumps(L)
+
+
+def test_async_errors_reach_the_caller():
+    async def run():
+        A = AsyncOngoingCategoricalLottery(allowed_horizons=['k=1&tau=0', 'k=1&tau=5'])
+        await A.observe(t=0, value='a')
+        try:
+            await A.add(t=5, owner='bill', values=['a'])
+        except AssertionError:
+            return await A.add(t=5, owner='bill', values=['a'], k=1, tau=0)
+
+    assert asyncio.run(run()) == 1
+
+
+def test_async_burst_with_a_bad_record():
+    subs = _submissions(seed=3, n=40)
+    subs[17] = dict(subs[17], values=None)
+    L = OngoingCategoricalLottery()
+    L.observe(t=0, value='a')
+    expected = list()
+    for s in subs:
+        try:
+            expected.append(L.add(**s))
+        except Exception as e:
+            expected.append(type(e))
+
+    async def run():
+        A = AsyncOngoingCategoricalLottery()
+        await A.observe(t=0, value='a')
+        adds = [asyncio.ensure_future(A.add(**s)) for s in subs]
+        results = await asyncio.wait_for(asyncio.gather(*adds, return_exceptions=True), timeout=10)
+        await A.join()
+        return A, results
+
+    A, results = asyncio.run(run())
+    assert [type(r) if isinstance(r, Exception) else r for r in results] == expected
+    assert isinstance(results[17], Exception) and json.dumps(A.lottery) == json.dumps(L)
@@ -0,0 +1,47 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.backtest import backtest
+from tests.lotteries import random_tapes
+
+
+def _tapes(seed, n_rounds):
+    return random_tapes(seed, n_rounds=n_rounds, owners=['owner'+str(i) for i in range(6)], values=['a', 'b', 'c'],
+                        horizons=[(1, 0), (2, 7)], max_values=2, amounts=[1.0, 2.0])
+
+
+def test_backtest_matches_object_api():
+    horizons = ['k=1&tau=0', 'k=2&tau=7']
+    submissions, observations = _tapes(seed=1, n_rounds=200)
+    L = OngoingCategoricalLottery(allowed_horizons=horizons)
+    L.observe(t=observations[0][0], value=observations[0][1])
+    expected = list()
+    i = 0
+    for t, value in observations[1:]:
+        while i < len(submissions) and submissions[i][0] <= t:
+            L.add(*submissions[i])
+            i += 1
+        expected.append(L.observe_and_settle(value=value, t=t))
+    settled = list(backtest(iter(submissions), iter(observations), allowed_horizons=horizons, compact_every=20, history_len=5))
+    assert [dict(horizons=s['horizons'], total=s['total']) for s in settled] == expected
+    assert any(s['total'] for s in settled)
+
+
+def test_backtest_state_stays_small():
+    horizons = ['k=1&tau=0', 'k=2&tau=7']
+    submissions, observations = _tapes(seed=2, n_rounds=600)
+    L = OngoingCategoricalLottery(allowed_horizons=horizons, compact_every=20, storage='columnar')
+    for _ in backtest(submissions, observations, allowed_horizons=horizons, history_len=5, lottery=L):
+        pass
+    assert len(L['state']['time_history']) <= 6
+    assert all(len(pool) < 40 for pool in L.index.pools.values())
+
+
+def test_backtest_keeps_bets_at_opening_time():
+    submissions = [(-1, 'ted', ['a']), (0, 'bill', ['a']), (0, 'mary', ['b'])]
+    observations = [(0, 'open'), (1, 'a'), (2, 'a')]
+    L = OngoingCategoricalLottery(allowed_horizons=['k=1&tau=0'])
+    L.observe(t=0, value='open')
+    codes = [L.add(*s, k=1, tau=0) for s in submissions]
+    expected = [L.observe_and_settle(value=value, t=t)['total'] for t, value in observations[1:]]
+    assert codes == [0, 1, 1] and expected[-1] == [('bill', 1.0), ('mary', -1.0)]
+    settled = backtest([s + (None, 1.0, 1, 0) for s in submissions], observations, allowed_horizons=['k=1&tau=0'])
+    assert [s['total'] for s in settled] == expected
@@ -0,0 +1,38 @@
+from benchmarks.lotterybench import run, compare, main, BENCHMARKS
+import tempfile
+import json
+import os
+
+
+def test_benchmarks_run_and_compare():
+    report = run(n_owners=4, n_values=3, n_horizons=2, n_observations=5)
+    assert list(report['results']) == BENCHMARKS
+    assert all(r['calls'] > 0 and r['peak_mb'] >= 0 for r in report['results'].values())
+    assert compare(report, report) == []
+    faster = json.loads(json.dumps(report))
+    faster['results']['payout']['per_second'] *= 10
+    assert [r['benchmark'] for r in compare(report, faster) if r['metric'] == 'per_second'] == ['payout']
+    other = run(n_owners=5, n_values=3, n_horizons=2, n_observations=5, benchmarks=['payout'])
+    try:
+        compare(other, report)
+        assert False, 'different workloads should not be compared'
+    except ValueError:
+        pass
+
+
+def test_benchmarks_cli():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'baseline.json')
+        args = ['--owners', '3', '--observations', '4', '--only', 'add', 'settle']
+        assert main(args + ['--output', path]) == 0
+        with open(path) as f:
+            baseline = json.load(f)
+        baseline['results']['add']['per_second'] *= 1000
+        with open(path, 'w') as f:
+            json.dump(baseline, f)
+        assert main(args + ['--compare', path]) == 1
+        try:
+            main(['--owners', '4', '--observations', '4', '--only', 'add', '--compare', path])
+            assert False, 'different workloads should not be compared'
+        except SystemExit as e:
+            assert e.code == 2
@@ -0,0 +1,76 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.inclusion.numpyinclusion import using_numpy
+from tests.lotteries import random_lottery
+import pickle
+import json
+
+
+def _twin_lotteries(seed, n_rounds=30):
+    """ The same random bets in a lottery kept as lists and one kept in columns """
+    L, values = random_lottery(seed=seed, n_rounds=n_rounds)
+    C, _ = random_lottery(seed=seed, n_rounds=n_rounds, lottery=OngoingCategoricalLottery(storage='columnar'))
+    return L, C, values
+
+
+def test_columnar_payouts_and_schema():
+    L, C, values = _twin_lotteries(seed=1)
+    assert json.loads(json.dumps(C['state'])) == json.loads(json.dumps(L['state']))
+    assert C['state'] == L['state']
+    for t in range(0, 260, 9):
+        for value in values:
+            assert C.payout(t=t, value=value, k=2, tau=5) == L.payout(t=t, value=value, k=2, tau=5)
+        for use_numpy in [False, True] if using_numpy else [False]:
+            assert C.payout_all(t=t, k=2, tau=5, use_numpy=use_numpy) == L.payout_all(t=t, k=2, tau=5)
+
+
+def test_columnar_round_trips():
+    L, C, values = _twin_lotteries(seed=2)
+    G = OngoingCategoricalLottery.from_json(json.dumps(C))
+    assert G.columnar
+    P = pickle.loads(pickle.dumps(C))
+    assert P.columnar
+    for M in [G, P]:
+        assert M['state'] == L['state']
+        M.compact()
+        assert M.payout(t=300, value=values[1], k=2, tau=5) == L.payout(t=300, value=values[1], k=2, tau=5)
+
+
+def test_columnar_views_are_read_only():
+    L, C, values = _twin_lotteries(seed=3, n_rounds=3)
+    triples = C['state']['bets']['k=2&tau=5'][values[0]]
+    try:
+        triples.append([1, 'sneaky', 1.0])
+        assert False, 'views should refuse writes'
+    except TypeError:
+        pass
+
+
+def test_columnar_keeps_float_times_and_int_amounts():
+    L, C = OngoingCategoricalLottery(), OngoingCategoricalLottery(storage='columnar')
+    for M in [L, C]:
+        M.observe(t=0, value='a')
+        M.add(t=1, owner='bill', values=['a', 'b'], amount=2.0, k=1, tau=0)
+        M.add(t=1.5, owner='mary', values=['b'], amount=1, k=1, tau=0)
+        M.add(t=2, owner='sue', values=['a'], weights=[1], amount=3, k=1, tau=0)
+        M.add(t=2.5, owner='bill', values=['a'], k=1, tau=0)
+        M.observe(t=3, value='a')
+    assert json.dumps(C['state']) == json.dumps(L['state'])
+    pool = C.index.pools['k=1&tau=0']
+    assert isinstance(pool.sub_time, list) and isinstance(pool.sub_amount, list)
+    for use_numpy in [False, True] if using_numpy else [False]:
+        assert C.payout_all(t=4, k=1, tau=0, use_numpy=use_numpy) == L.payout_all(t=4, k=1, tau=0)
+    assert json.dumps(OngoingCategoricalLottery.from_bytes(C.to_bytes())['state']) == json.dumps(L['state'])
+
+
+def test_columnar_views_read_like_lists():
+    L, C, values = _twin_lotteries(seed=4, n_rounds=4)
+    for h in L['state']['bets']:
+        for v, triples in L['state']['bets'][h].items():
+            view = C['state']['bets'][h][v]
+            assert view.count(triples[0]) == triples.count(triples[0]) and view.index(triples[-1]) == triples.index(triples[-1])
+            assert view*2 == triples*2 and 1*view == triples and [None] + view == [None] + triples
+            assert list(reversed(view)) == triples[::-1] and view.copy() == triples
+            assert view <= triples and not (view < triples)
+        for owner, pairs in L['state']['bet_totals'][h].items():
+            view = C['state']['bet_totals'][h][owner]
+            assert view.count(pairs[0]) == pairs.count(pairs[0]) and view*1 == pairs
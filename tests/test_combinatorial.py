@@ -0,0 +1,112 @@
+from lottery.combinatorial import Combinations, CombinatorialLottery
+from lottery.categoricallottery import CategoricalLottery
+from lottery.snapshot import from_bytes
+from lottery.eventlog import EventLog, replay
+import itertools
+import tempfile
+import json
+import os
+
+
+def _raises_value_error(f) -> bool:
+    try:
+        f()
+    except ValueError:
+        return True
+    return False
+
+
+def test_ranks_are_a_bijection():
+    for n, r in [(6, 3), (7, 0), (8, 8), (10, 4)]:
+        space = Combinations(n=n, r=r)
+        tickets = ['-'.join([str(x) for x in c]) for c in itertools.combinations(range(1, n+1), r)]
+        assert sorted([space.rank(ticket) for ticket in tickets]) == list(range(len(space)))
+        assert all([space.unrank(space.rank(ticket)) == ticket for ticket in tickets])
+        assert all([space.from_bitmask(space.bitmask(ticket)) == ticket for ticket in tickets])
+
+    big = Combinations(n=49, r=6)
+    assert len(big) == 13983816
+    assert big.unrank(len(big)-1) == '44-45-46-47-48-49' and big.unrank(0) == '1-2-3-4-5-6'
+    assert big.rank('49-3-41-17-30-22') == big.rank([3, 17, 22, 30, 41, 49])
+    for bad in ['1-2-3-4-5', '1-2-3-4-5-50', '0-1-2-3-4-5', '1-1-2-3-4-5', 'a-b-c-d-e-f', 7]:
+        assert bad not in big
+        assert _raises_value_error(lambda: big.rank(bad))
+    for bad in [-1, len(big), 1.0, True]:
+        assert _raises_value_error(lambda: big.unrank(bad))
+    assert _raises_value_error(lambda: big.from_bitmask(0b111))
+
+
+def test_combinatorial_lottery_matches_listed_values():
+    tickets = ['-'.join(c) for c in itertools.combinations(['1', '2', '3', '4', '5', '6'], r=3)]
+    listed = CategoricalLottery(allowed_values=tickets)
+    L = CombinatorialLottery(n=6, r=3)
+    bets = [('bill', ['1-3-4', '1-2-5'], 1.0), ('mary', ['2-3-4', '4-5-6', '1-2-5'], 1.0), ('sue', ['5-2-1'], 2.0)]
+    for owner, values, amount in bets:
+        listed.add(t=0, owner=owner, values=['-'.join(sorted(v.split('-'))) for v in values], amount=amount)
+    L.add(t=0, owner='bill', values=bets[0][1], amount=1.0)
+    L.add_many([(0, owner, values, None, amount) for owner, values, amount in bets[1:]])
+    for G in [listed, L]:
+        G.close(t=1)
+
+    assert L.payout_all(t=3) == dict([(v, x) for v, x in listed.payout_all(t=3).items() if x])
+    for ticket in tickets:
+        assert L.payout(t=3, value=ticket) == listed.payout(t=3, value=ticket)
+        assert L.payout(t=3, value=L.space.rank(ticket)) == listed.payout(t=3, value=ticket)
+
+    # Ranks survive JSON and binary snapshots
+    for G in [CombinatorialLottery(**json.loads(json.dumps(L))), from_bytes(L.to_bytes())]:
+        assert isinstance(G, CombinatorialLottery)
+        assert G.settle(value='1-2-5', t=3) == listed.payout(t=3, value='1-2-5', consolidate=True)
+
+
+def test_settled_as_a_categorical_lottery():
+    L = CombinatorialLottery(n=6, r=3)
+    L.add(t=0, owner='bill', values=['1-3-4', '1-2-5'])
+    L.add(t=0, owner='mary', values=['2-5-1'], amount=2.0)
+    L.close(t=1)
+    try:
+        L.observe(value='1-2-5', t=2)
+        assert False
+    except NotImplementedError:
+        pass
+    expected = L.payout(t=2, value='1-2-5', consolidate=True)
+    assert expected and L.observe_and_settle(value='5-2-1', t=2) == {'horizons': {'k=1&tau=0': expected}, 'total': expected}
+    assert L['state']['value_history'][-1] == '1-2-5'
+
+
+def test_replay_from_event_log():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'lottery.log')
+        log = EventLog(path)
+        L = log.attach(CombinatorialLottery(n=49, r=6))
+        L.add(t=0, owner='bill', values=['1-2-3-4-5-6', '3-17-22-30-41-49'], weights=[0.25, 0.75])
+        L.add_many([(0, 'mary', ['49-41-30-22-17-3'], None, 2.0), (0, 'sue', ['1-2-3-4-5-7'])])
+        L.close(t=1)
+        log.close()
+        G = replay(path)
+        assert isinstance(G, CombinatorialLottery) and json.dumps(G) == json.dumps(L)
+        assert G.settle(value='3-17-22-30-41-49', t=2) == L.settle(value='3-17-22-30-41-49', t=2)
+
+
+def test_invalid_tickets_are_rejected():
+    L = CombinatorialLottery(n=49, r=6)
+    assert _raises_value_error(lambda: L.add(t=0, owner='bill', values=['1-2-3-4-5-66']))
+    assert _raises_value_error(lambda: L.add(t=0, owner='bill', values=[len(L.space)]))
+    assert _raises_value_error(lambda: L.add_many([(0, 'bill', ['1-2-3-4-5-6']), (0, 'mary', ['1-2-3'])]))
+    assert list(L['state']['bet_totals']['k=1&tau=0']) == ['bill']     # Applied up to the bad record
+    assert _raises_value_error(lambda: CombinatorialLottery())
+
+
+def test_add_many_takes_dict_records():
+    L = CombinatorialLottery(n=49, r=6)
+    assert L.add_many([dict(t=0, owner='bill', values=['6-5-4-3-2-1'], amount=2.0),
+                       dict(t=0, owner='mary', values=['1-2-3-4-5-7'], weights=[1.0])]) == [1, 1]
+    try:
+        L.add_many([dict(t=1, owner='sue', values=['1-2-3-4-5-6']), dict(t=1, owner='ted', values=None)])
+        assert False
+    except TypeError:
+        pass
+    assert list(L['state']['bet_totals']['k=1&tau=0']) == ['bill', 'mary', 'sue']
+    L.close(t=2)
+    assert L.payout(t=3, value='1-2-3-4-5-6', consolidate=True) == L.settle(value=L.space.rank('1-2-3-4-5-6'), t=3)
+    assert L['state']['value_history'][-1] == '1-2-3-4-5-6'
@@ -0,0 +1,49 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from tests.lotteries import random_lottery
+import json
+
+
+HORIZONS = [(2, 5), (0, 3), (1, 0)]
+
+
+def test_compaction_preserves_future_payouts():
+    for seed in range(5):
+        L, values = random_lottery(seed=seed)
+        G = OngoingCategoricalLottery.from_json(json.dumps(L))
+        t_now = L['state']['time_history'][-1]
+        removed = G.compact()
+        assert removed['bets'] > 0 and removed['bet_totals'] > 0
+        assert G.compaction_stats['bets'] == removed['bets']
+        assert sum([len(triples) for triples in G['state']['bets']['k=2&tau=5'].values()]) == len(G.index.pools['k=2&tau=5'].row_value)
+        for t in range(t_now, t_now+30, 3):
+            for value in values:
+                assert G.payout(t=t, value=value, k=2, tau=5) == L.payout(t=t, value=value, k=2, tau=5)
+
+
+def test_compaction_then_more_rounds():
+    L, values = random_lottery(seed=11)
+    G = OngoingCategoricalLottery.from_json(json.dumps(L))
+    G.compact()
+    t_now = L['state']['time_history'][-1]
+    for i, value in enumerate(values*3):
+        t = t_now + 10*(i+1)
+        for M in [L, G]:
+            M.add(t=t, owner='owner'+str(i % 4), values=[value, values[0]], weights=[0.7, 0.3], k=2, tau=5)
+            for k, tau in HORIZONS:
+                assert L.payout(t=t+5, value=value, k=k, tau=tau) == G.payout(t=t+5, value=value, k=k, tau=tau)
+        L.observe(t=t+5, value=value)
+        G.observe(t=t+5, value=value)
+        G.compact()
+    G_back = OngoingCategoricalLottery.from_json(json.dumps(G))
+    assert G_back.payout(t=t+20, value=values[0], k=2, tau=5) == L.payout(t=t+20, value=values[0], k=2, tau=5)
+
+
+def test_automatic_compaction():
+    L = OngoingCategoricalLottery(compact_every=10)
+    L.observe(t=0, value='a')
+    for t in range(1, 50):
+        L.add(t=t, owner='bill', values=['a', 'b'], k=1, tau=0)
+        L.observe(t=t, value='a')
+    assert L.compaction_stats['compactions'] > 0
+    assert len(L['state']['bet_totals']['k=1&tau=0']['bill']) < 10
+    assert L.payout(t=60, value='a', k=1, tau=0) == [('bill', -1.0), ('bill', 1.0)]
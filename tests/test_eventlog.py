@@ -0,0 +1,60 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.categoricallottery import CategoricalLottery
+from lottery.eventlog import EventLog, replay
+from tests.lotteries import random_tapes
+import tempfile
+import json
+import os
+
+
+def _drive(L, seed, n_rounds=20):
+    """ Random rounds after the lottery's last observation, with a rejected repeat each round and compaction every seventh """
+    submissions, observations = random_tapes(seed, n_rounds=n_rounds, owners=['bill', 'mary', 'sally'], values=['a', 'b', 'c'],
+                                             horizons=[(1, 2)], max_values=2, amounts=[1.0])
+    t0 = L['state']['time_history'][-1]
+    i = 0
+    for rnd, (t, value) in enumerate(observations[1:], start=1):
+        while i < len(submissions) and submissions[i][0] < t:
+            L.add(t0+submissions[i][0], *submissions[i][1:])
+            i += 1
+        if i:
+            L.add(t0+submissions[i-1][0], *submissions[i-1][1:])     # Rejected, as a repeat
+        L.observe(t=t0+t, value=value)
+        if rnd % 7 == 0:
+            L.compact()
+
+
+def test_replay_from_checkpoints():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'lottery.log')
+        log = EventLog(path, checkpoint_every=25)
+        L = OngoingCategoricalLottery(storage='columnar')
+        L.observe(t=0, value='a')
+        log.attach(L)
+        _drive(L, seed=1)
+        G = OngoingCategoricalLottery.replay(path)
+        assert json.dumps(G) == json.dumps(L)
+        assert len([f for f in os.listdir(d) if f.endswith('.snap')]) == 1
+
+        # A torn final record is ignored, and logging can resume where it left off
+        log.close()
+        with open(path, 'a') as f:
+            f.write('["a",1000,"bi')
+        G = replay(path, resume=True)
+        assert json.dumps(G) == json.dumps(L)
+        _drive(G, seed=2)
+        assert json.dumps(replay(path)) == json.dumps(G)
+
+
+def test_replay_categorical():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'race.log')
+        L = EventLog(path).attach(CategoricalLottery(t=15))
+        L.add(t=20, owner='mary', values=['1', '3', '5'], weights=[0.75, 0.25, 0.0], amount=1.0)
+        L.add(t=20, owner='alice', values=['1', '3', '5'], weights=[0.65, 0.3, 0.05], amount=3.0)
+        L.close(t=25)
+        rewards = L.settle(t=50, value='3')
+        G = replay(path)
+        assert isinstance(G, CategoricalLottery)
+        assert json.dumps(G) == json.dumps(L)
+        assert G.payout(t=60, value='3', consolidate=True) == rewards
@@ -0,0 +1,62 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.export import export, read_chunks, iter_chunks
+from lottery.inclusion import pyarrowinclusion
+from tests.lotteries import random_tapes
+import tempfile
+
+
+def _settled_lottery(seed, storage='json'):
+    horizons = ['k=1&tau=0', 'k=2&tau=5']
+    submissions, observations = random_tapes(seed, n_rounds=25, owners=['bill', 'mary', 'sally', 'ted'],
+                                             values=['a', 'b', 'c'], horizons=[(1, 0), (2, 5)], max_values=2)
+    L = OngoingCategoricalLottery(allowed_horizons=horizons, storage=storage)
+    L.observe(t=observations[0][0], value=observations[0][1])
+    paid = list()
+    i = 0
+    for t, value in observations[1:]:
+        while i < len(submissions) and submissions[i][0] < t:
+            L.add(*submissions[i])
+            i += 1
+        settled = L.observe_and_settle(value=value, t=t)
+        paid.extend([(h, t, value, owner, reward) for h in L.index.pools for owner, reward in settled['horizons'].get(h, [])])
+    return L, paid
+
+
+def _rows(chunks, names):
+    return [row for chunk in chunks for row in zip(*[chunk[name] for name in names])]
+
+
+def _check_round_trip(file_format):
+    for storage in ['json', 'columnar']:
+        L, paid = _settled_lottery(seed=1, storage=storage)
+        frames = dict([(h, list(pool.frames)) for h, pool in L.index.pools.items()])
+        with tempfile.TemporaryDirectory() as d:
+            paths = export(L, d, chunk_size=7, file_format=file_format)
+            assert paths['rewards'].endswith('.'+file_format)
+            assert dict([(h, list(pool.frames)) for h, pool in L.index.pools.items()]) == frames   # Cache untouched
+            rewards = _rows(read_chunks(paths['rewards'], chunk_size=5), ['horizon', 'time', 'value', 'owner', 'reward'])
+            assert sorted(rewards) == sorted(paid) and len(paid) > 0
+            bets = _rows(read_chunks(paths['bets']), ['horizon', 'value', 'time', 'owner', 'amount'])
+            expected = [(h, v, t, owner, a) for h, by_value in L['state']['bets'].items() for v, triples in by_value.items()
+                        for t, owner, a in triples]
+            assert sorted(bets) == sorted(expected)
+            totals = _rows(read_chunks(paths['bet_totals']), ['horizon', 'owner', 'time', 'amount'])
+            assert len(totals) == sum([len(pairs) for by_owner in L['state']['bet_totals'].values() for pairs in by_owner.values()])
+            observations = _rows(read_chunks(paths['observations']), ['time', 'value'])
+            assert observations == list(zip(L['state']['time_history'], L['state']['value_history']))
+
+
+def test_export_round_trip_csv():
+    _check_round_trip(file_format='csv')
+
+
+if pyarrowinclusion.using_pyarrow:
+
+    def test_export_round_trip_parquet():
+        _check_round_trip(file_format='parquet')
+
+
+def test_export_chunks():
+    L, _ = _settled_lottery(seed=2)
+    chunks = list(iter_chunks(L, 'bets', chunk_size=10))
+    assert all(len(chunk['owner']) == 10 for chunk in chunks[:-1]) and 0 < len(chunks[-1]['owner']) <= 10
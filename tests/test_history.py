@@ -0,0 +1,47 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.history import History
+import pickle
+import json
+
+
+def test_history_trims_in_place():
+    L = OngoingCategoricalLottery()
+    times = L['state']['time_history']
+    expected_times, expected_values = list(), list()
+    for i in range(250):
+        L.observe(t=10*i, value=str(i % 7), approx_max_len=40)
+        expected_times.append(10*i)
+        expected_values.append(str(i % 7))
+        expected_times, expected_values = expected_times[-40:], expected_values[-40:]    # One evicted per observation
+        assert L['state']['time_history'] is times
+        assert times == expected_times and L['state']['value_history'] == expected_values
+    assert times[-2] == expected_times[-2] and times[3:7] == expected_times[3:7]
+    assert json.dumps(L['state']['time_history']) == json.dumps(expected_times)
+    G = pickle.loads(pickle.dumps(L))
+    assert isinstance(G['state']['time_history'], History) and json.dumps(G) == json.dumps(L)
+
+
+def test_history_rejects_other_mutations():
+    h = History([1, 2, 3])
+    for mutate in [lambda: h.pop(), lambda: h.insert(0, 1), lambda: h.__setitem__(0, 5)]:
+        try:
+            mutate()
+            assert False
+        except TypeError:
+            pass
+    assert [1, 2, 3] == h and h == [1, 2, 3] and h + [4] == [1, 2, 3, 4]
+
+
+def test_history_reads_like_a_list():
+    h = History([1, 2, 3, 2])
+    h.trim(3)
+    expected = [2, 3, 2]
+    assert h.count(2) == expected.count(2) == 2 and h.index(3) == 1 and h.index(2, 1) == 2
+    try:
+        h.index(7)
+        assert False
+    except ValueError:
+        pass
+    assert h*2 == expected*2 and 2*h == 2*expected and [0] + h == [0] + expected
+    assert list(reversed(h)) == [2, 3, 2] and h.copy() == expected and not isinstance(h.copy(), History)
+    assert h < [3] and h > [1] and h <= expected and h >= expected
@@ -1,4 +1,6 @@
-from lottery.conventions import k_and_tau_to_horizon_str, horizon_str_to_k_and_tau, MAX_TAU
+from lottery.conventions import k_and_tau_to_horizon_str, horizon_str_to_k_and_tau, MAX_TAU, Horizon
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+import json
 
 
 def test_horizon():
@@ -10,5 +12,25 @@ def test_horizon():
             assert tau==tau_back
 
 
+def test_horizon_interning():
+    h = Horizon(k=2, tau=30)
+    assert str(h) == 'k=2&tau=30' == k_and_tau_to_horizon_str(2, 30)
+    assert horizon_str_to_k_and_tau('k=2&tau=30') is horizon_str_to_k_and_tau('k=2&tau=30')
+    assert horizon_str_to_k_and_tau('k=2&tau=30') == (2, 30) == h
+    assert Horizon.parse('k=2&tau=30') == Horizon.parse((2, 30)) == Horizon.parse(h)
+    assert horizon_str_to_k_and_tau('k=02&tau=30') == h
+    assert k_and_tau_to_horizon_str(k=2.0, tau=30) == 'k=2.0&tau=30'    # Only ints are interned
+    assert json.dumps({str(h): list(h)}) == '{"k=2&tau=30": [2, 30]}'
+    first = horizon_str_to_k_and_tau('k=7&tau=77')      # Not seen before
+    assert first is horizon_str_to_k_and_tau('k=7&tau=77') is horizon_str_to_k_and_tau('k=07&tau=77')
+
+
+def test_implied_horizon_follows_meta():
+    L = OngoingCategoricalLottery(allowed_horizons=['k=1&tau=5'])
+    assert L.implied_k_tau() == (1, 5)
+    L['meta']['allowed_horizons'] = ['k=2&tau=0']
+    assert L.implied_k_tau() == (2, 0)
+
+
 if __name__=='__main__':
     test_horizon()
\ No newline at end of file
@@ -0,0 +1,36 @@
+import subprocess
+import sys
+import json
+
+IMPORT_BUDGET_SECONDS = 1.0     # Generous, to allow for slow machines. Typically a few tens of milliseconds.
+HEAVY = ['numpy', 'momentum', 'timemachines', 'pyarrow']
+
+
+def _import_in_fresh_process(statement:str) -> dict:
+    code = ('import sys, time, json\n'
+            'start = time.perf_counter()\n' + statement + '\n'
+            'seconds = time.perf_counter() - start\n'
+            'print(json.dumps(dict(seconds=seconds, heavy=[m for m in ' + repr(HEAVY) + ' if m in sys.modules])))')
+    return json.loads(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout)
+
+
+def test_import_is_light():
+    result = _import_in_fresh_process('from lottery.categoricallottery import CategoricalLottery')
+    assert result['heavy'] == []
+    assert result['seconds'] < IMPORT_BUDGET_SECONDS
+
+
+def test_settling_without_numpy_features_stays_light():
+    result = _import_in_fresh_process('from lottery.categoricallottery import CategoricalLottery\n'
+                                      'L = CategoricalLottery(t=15)\n'
+                                      "L.add(t=20, owner='mary', values=['1', '3'], weights=[0.75, 0.25])\n"
+                                      'L.close(t=25)\n'
+                                      "L.settle(t=50, value='3')")
+    assert result['heavy'] == []
+
+
+def test_numpyinclusion_still_offers_np():
+    result = _import_in_fresh_process('from lottery.inclusion import numpyinclusion\n'
+                                      'assert "numpy" not in sys.modules\n'
+                                      'assert (numpyinclusion.np is None) == (not numpyinclusion.using_numpy)')
+    assert result['heavy'] in ([], ['numpy'])
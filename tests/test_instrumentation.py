@@ -0,0 +1,34 @@
+from lottery.categoricallottery import CategoricalLottery
+from tests.lotteries import random_lottery
+import json
+
+
+def test_instrumentation_counts_and_detaches():
+    L, values = random_lottery(seed=3)
+    before = json.dumps(L)
+    events = list()
+    inst = L.instrument(callback=events.append)
+    rewards = L.payout(t=400, value=values[0], k=2, tau=5)
+    L.suggest(t=400, k=2, tau=5)
+    L.add(t=400, owner='newbie', values=values[:2], k=2, tau=5)
+    stats = inst.stats()
+    assert stats['payout']['calls'] == 1 and stats['payout']['sizes']['rewards'] == len(rewards)
+    assert stats['cutoff_time']['calls'] == 2    # Within payout and suggest
+    assert stats['payout']['sizes']['owners'] > 0
+    assert sum(stats['add']['histogram'].values()) == 1
+    assert [e['method'] for e in events] == ['cutoff_time', 'payout', 'cutoff_time', 'suggest', 'add']
+    inst.detach()
+    L.observe(t=500, value=values[0])
+    assert 'observe' not in inst.stats() and 'observe' not in L.__dict__
+    assert json.dumps(L) != before
+
+
+def test_instrumentation_categorical():
+    L = CategoricalLottery(allowed_values=['1', '3', '5'], t=15)
+    inst = L.instrument()
+    L.add(t=20, owner='mary', values=['1', '3', '5'], weights=[0.75, 0.25, 0.0], amount=1.0)
+    L.close(t=25)
+    L.settle(t=50, value='3')
+    stats = inst.stats()
+    assert stats['settle']['sizes'] == {'rewards': 1, 'history': 3}
+    assert stats['payout']['calls'] == 1 and stats['close']['calls'] == 1
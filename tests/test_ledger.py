@@ -0,0 +1,35 @@
+from lottery.ledger import RewardLedger
+from lottery.conventions import consolidate_rewards, equal_rewards
+from tests.lotteries import random_lottery
+from math import fsum, isclose
+
+
+def test_ledger_matches_consolidate_rewards():
+    L, values = random_lottery(seed=9)
+    rounds = [L.payout(t=t, value=values[t % len(values)], k=2, tau=5) for t in range(300, 400, 7)]
+    everything = [r for rewards in rounds for r in rewards]
+    assert everything
+    ledger = RewardLedger()
+    for rewards in rounds:
+        ledger.add(rewards)
+        assert ledger.consolidated() is ledger.consolidated()
+    expected = consolidate_rewards(everything)
+    assert [owner for owner, _ in ledger.consolidated()] == [owner for owner, _ in expected]
+    assert all(isclose(total, r, abs_tol=1e-12) for (_, total), (_, r) in zip(ledger.consolidated(), expected))
+    assert ledger.consolidated() == [(owner, fsum([r for o, r in everything if o == owner])) for owner, _ in expected]
+    assert ledger.n_rounds == len(rounds)
+
+    # Merging ledgers built in any split gives the same totals
+    left, right = RewardLedger(), RewardLedger()
+    for i, rewards in enumerate(reversed(rounds)):
+        (left if i % 3 else right).add(rewards)
+    assert right.merge(left).consolidated() == ledger.consolidated()
+    assert ledger.pnl() == dict(ledger.consolidated())
+    assert all(len(partials) < 5 for partials in ledger.partials.values())
+
+
+def test_equal_rewards():
+    r = [('bill', -1.0), ('mary', 2.5), ('bill', 0.5)]
+    assert equal_rewards(r, r)
+    assert equal_rewards(r, [('bill', -0.5), ('mary', 2.5)])
+    assert not equal_rewards(r, [('bill', -0.5)])
@@ -0,0 +1,97 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.categoricallottery import CategoricalLottery
+from lottery.__main__ import main
+from tests.lotteries import random_lottery
+import tempfile
+import json
+import os
+
+
+def _files(d):
+    L, values = random_lottery(seed=6)
+    L['meta']['allowed_horizons'] = ['k=2&tau=5']
+    race = CategoricalLottery(allowed_values=['1', '3'], t=15)
+    race.add(t=20, owner='mary', values=['1', '3'], weights=[0.75, 0.25])
+    race.add(t=20, owner='alice', values=['1', '3'], weights=[0.35, 0.65], amount=3.0)
+    race.close(t=25)
+    paths = [os.path.join(d, 'ongoing.json'), os.path.join(d, 'race.snap')]
+    with open(paths[0], 'w') as f:
+        json.dump(L, f)
+    race.save(paths[1])
+    return paths, L, race, values
+
+
+def test_cli_settles_and_writes_back():
+    with tempfile.TemporaryDirectory() as d:
+        paths, L, race, values = _files(d)
+        with open(os.path.join(d, 'truths.jsonl'), 'w') as f:
+            f.write(json.dumps(dict(file=paths[0], value=values[1], t=400)) + '\n')
+            f.write(json.dumps(dict(file=paths[1], value='3', t=50)) + '\n')
+            f.write(json.dumps(dict(file=paths[0], value=values[2], t=410)) + '\n')
+        outputs = list()
+        for jobs in ['1', '2']:
+            out = os.path.join(d, 'rewards'+jobs+'.jsonl')
+            assert main(paths + ['--input', os.path.join(d, 'truths.jsonl'), '--output', out, '--jobs', jobs]) == 0
+            with open(out) as f:
+                outputs.append([json.loads(line) for line in f])
+        assert outputs[0] == outputs[1]
+        expected = [L.observe_and_settle(value=values[1], t=400)['total'], race.settle(value='3', t=50),
+                    L.observe_and_settle(value=values[2], t=410)['total']]
+        assert [record['rewards'] for record in outputs[0]] == json.loads(json.dumps(expected))
+
+        # Write back, then observe without settling
+        with open(os.path.join(d, 'ticks.jsonl'), 'w') as f:
+            f.write(json.dumps(dict(file=paths[0], value=values[0], t=420)) + '\n')
+        assert main(paths[:1] + ['--input', os.path.join(d, 'ticks.jsonl'), '--mode', 'observe', '--write',
+                                 '--output', os.path.join(d, 'n.jsonl')]) == 0
+        G = OngoingCategoricalLottery.load(paths[0])
+        assert G['state']['time_history'][-1] == 420
+
+
+def test_cli_reports_errors():
+    with tempfile.TemporaryDirectory() as d:
+        paths, _, _, _ = _files(d)
+        with open(os.path.join(d, 'bad.jsonl'), 'w') as f:
+            f.write(json.dumps(dict(value='3', t=50)) + '\n')     # Applies to both
+        out = os.path.join(d, 'out.jsonl')
+        assert main(paths + ['--input', os.path.join(d, 'bad.jsonl'), '--output', out, '--mode', 'observe']) == 1
+        with open(out) as f:
+            records = [json.loads(line) for line in f]
+        assert 'error' not in records[0] and records[1]['error'].startswith('NotImplementedError')
+
+
+def test_cli_reads_json_as_the_named_class():
+    with tempfile.TemporaryDirectory() as d:
+        paths, _, race, _ = _files(d)
+        race_json = os.path.join(d, 'race.json')
+        with open(race_json, 'w') as f:
+            json.dump(race, f)
+        with open(os.path.join(d, 'truth.jsonl'), 'w') as f:
+            f.write(json.dumps(dict(value='3', t=50)) + '\n')
+        records = dict()
+        for mode in ['settle', 'observe']:
+            out = os.path.join(d, mode+'.jsonl')
+            main([paths[1], race_json, '--cls', 'CategoricalLottery', '--mode', mode,
+                  '--input', os.path.join(d, 'truth.jsonl'), '--output', out])
+            with open(out) as f:
+                records[mode] = [json.loads(line) for line in f]
+        assert records['settle'][0]['rewards'] == records['settle'][1]['rewards'] == json.loads(json.dumps(race.settle(value='3', t=50)))
+        assert all([r['error'].startswith('NotImplementedError') for r in records['observe']])
+
+
+def test_cli_reads_json_combinatorial_lotteries():
+    from lottery.combinatorial import CombinatorialLottery
+    with tempfile.TemporaryDirectory() as d:
+        L = CombinatorialLottery(n=6, r=3)
+        L.add(t=0, owner='bill', values=['1-3-4', '1-2-5'])
+        L.add(t=0, owner='mary', values=['5-2-1'], amount=2.0)
+        L.close(t=1)
+        path = os.path.join(d, 'draw.json')
+        with open(path, 'w') as f:
+            json.dump(L, f)
+        with open(os.path.join(d, 'truth.jsonl'), 'w') as f:
+            f.write(json.dumps(dict(value='5-2-1', t=2)) + '\n')
+        out = os.path.join(d, 'out.jsonl')
+        assert main([path, '--cls', 'CombinatorialLottery', '--input', os.path.join(d, 'truth.jsonl'), '--output', out]) == 0
+        with open(out) as f:
+            assert json.loads(f.readline())['rewards'] == json.loads(json.dumps(L.settle(value='1-2-5', t=2)))
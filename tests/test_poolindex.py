@@ -0,0 +1,217 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.categoricallottery import CategoricalLottery
+from lottery.conventions import k_and_tau_to_horizon_str, consolidate_rewards, ensure_normalized_dict_weights
+from lottery.inclusion.numpyinclusion import using_numpy
+from tests.lotteries import random_lottery
+import random
+import json
+
+
+def _scanned_payout(L, t, value, k, tau):
+    """ The payout() calculation as it was before the index: a scan of every bet """
+    h = k_and_tau_to_horizon_str(k=k, tau=tau)
+    _, _, _, t_cutoff = L.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
+    if (t_cutoff>=t) or (h not in L['state']['bets']) or (value not in L['state']['bets'][h]):
+        return []
+    matching_and_quarantined = [ (t_,o_,a_) for (t_,o_,a_) in L['state']['bets'][h][value] if (t_<= t_cutoff) ]
+    quarantined_owners = list(set([ o_ for (t_,o_,a_) in matching_and_quarantined ]))
+    latest_time_owner_pairs = [ ( max( [ t_ for (t_,a_) in L['state']['bet_totals'][h][o_] if t_<t_cutoff ] ), o_ ) for o_ in quarantined_owners]
+    winners = [ (o_,a_) for (t_,o_,a_) in matching_and_quarantined if (t_,o_) in latest_time_owner_pairs ]
+    total_winner_money = sum( [a_ for (o_,a_) in winners ])
+    all_recent = [ max( [ (t_,o_,a_) for (t_,a_) in L['state']['bet_totals'][h][o_] if (t_<= t_cutoff) ], default=(None, None, None) ) for o_ in L['state']['bet_totals'][h] ]
+    all_totals = [ (o_,a_) for (t_,o_,a_) in all_recent if t_ is not None ]
+    total_money = sum( [ a_ for (o_,a_) in all_totals ] )
+    winner_rewards = [ (o_,a_*total_money/total_winner_money) for (o_,a_) in winners ]
+    participation_rewards = [ (o_,-a_) for (o_,a_) in all_totals ]
+    return participation_rewards + winner_rewards
+
+
+def test_index_payout_matches_scan():
+    for seed in range(5):
+        L, values = random_lottery(seed=seed)
+        for t in range(0, 320, 7):
+            for value in values + ['never']:
+                for k, tau in [(2, 5), (0, 3), (1, 0)]:
+                    assert L.payout(t=t, value=value, k=k, tau=tau) == _scanned_payout(L, t=t, value=value, k=k, tau=tau)
+
+
+def test_index_rebuilt_from_json():
+    L, values = random_lottery(seed=7)
+    G = OngoingCategoricalLottery.from_json(json.dumps(L))
+    for t in range(0, 320, 11):
+        for value in values:
+            assert G.payout(t=t, value=value, k=2, tau=5) == L.payout(t=t, value=value, k=2, tau=5)
+
+
+def test_index_running_totals():
+    L, values = random_lottery(seed=3)
+    pool = L.index.pools[k_and_tau_to_horizon_str(k=2, tau=5)]
+    latest = [pool.owner_subs[o][-1] for o in pool.owner_subs]
+    assert abs(pool.total - sum([pool.sub_amount[s] for s in latest])) < 1e-9
+    for v in values:
+        money = sum([a for s in latest for v_, a in pool.rows(s) if v_ == v])
+        assert abs(pool.value_totals.get(v, 0.0) - money) < 1e-9
+    assert consolidate_rewards(L.payout(t=400, value=values[1], k=2, tau=5)) == L.payout(t=400, value=values[1], k=2, tau=5, consolidate=True)
+
+
+def test_payout_all_matches_payout():
+    for seed in range(4):
+        L, values = random_lottery(seed=seed)
+        for t in range(0, 320, 13):
+            for k, tau in [(2, 5), (0, 3)]:
+                expected = dict([(v, L.payout(t=t, value=v, k=k, tau=tau)) for v in values + ['never']])
+                for use_numpy in [False, True] if using_numpy else [False]:
+                    assert L.payout_all(t=t, values=values + ['never'], k=k, tau=tau, use_numpy=use_numpy) == expected
+        assert set(L.payout_all(t=400, k=2, tau=5).keys()) == set(values)
+
+
+def _scanned_suggest(L, t, k, tau):
+    """ suggest() as it was, looping over values and then over every bet """
+    h = k_and_tau_to_horizon_str(k=k, tau=tau)
+    _, _, _, t_cutoff = L.set_k_tau_horizon_cutoff(t=t, k=k, tau=tau)
+    suggestions = list(set([v for hz in L['state']['bets'] for v in L['state']['bets'][hz]]))
+    suggestion_weights = dict([(nm, 0) for nm in suggestions])
+    n_bets = 0
+    for name in suggestions:
+        for n_, bts in L['state']['bets'][h].items():
+            if name == n_:
+                for bt in bts:
+                    if bt[0] > t_cutoff:
+                        suggestion_weights[name] += bt[2]
+                        n_bets += 1
+    return ensure_normalized_dict_weights(suggestion_weights), n_bets
+
+
+def test_suggest_matches_scan():
+    for seed in range(3):
+        L, values = random_lottery(seed=seed)
+        L.add(t=400, owner='late', values=values, k=0, tau=3)
+        C = OngoingCategoricalLottery.from_json(json.dumps(dict(meta=dict(storage='columnar'), state=L['state'])))
+        for t in [150, 290, 400]:
+            for k, tau in [(2, 5), (0, 3)]:
+                expected, expected_n = _scanned_suggest(L, t=t, k=k, tau=tau)
+                for M in [L, C]:
+                    weights, n_bets = M.suggest_with_count(t=t, k=k, tau=tau)
+                    assert n_bets == expected_n
+                    assert set(weights.keys()) == set(expected.keys())
+                    assert all([abs(weights[v] - expected[v]) < 1e-12 for v in expected])
+                    assert M.suggest(t=t, k=k, tau=tau) == weights
+
+
+def _outcome(func, **kwargs):
+    try:
+        return func(**kwargs)
+    except AssertionError as e:
+        return str(e)
+
+
+def test_remembered_cutoffs_and_frames_stay_fresh():
+    random.seed(11)
+    owners = ['owner'+str(i) for i in range(8)]
+    values = [str(i) for i in range(4)]
+    for storage in ['json', 'columnar']:
+        L = OngoingCategoricalLottery(storage=storage)
+        L.observe(t=0, value=values[0])
+        for rnd in range(1, 40):
+            t = 10*rnd
+            for owner in random.sample(owners, 3):
+                k, tau = random.choice([(2, 5), (0, 3)])
+                L.add(t=t+random.randint(-9, 9), owner=owner, values=random.sample(values, 2), k=k, tau=tau)
+                fresh = OngoingCategoricalLottery.from_json(json.dumps(L))
+                for k, tau in [(2, 5), (0, 3)]:
+                    if k_and_tau_to_horizon_str(k=k, tau=tau) in L.index.pools:
+                        t_payout = t+random.randint(0, 12)
+                        assert L.payout(t=t_payout, value=values[1], k=k, tau=tau) == fresh.payout(t=t_payout, value=values[1], k=k, tau=tau)
+                        assert _outcome(L.suggest_with_count, t=t_payout, k=k, tau=tau) == \
+                               _outcome(fresh.suggest_with_count, t=t_payout, k=k, tau=tau)
+            if rnd % 3 == 0:
+                L.observe(t=t+random.randint(0, 9), value=random.choice(values))
+            if rnd % 13 == 0:
+                L.compact()
+
+
+def test_observe_and_settle_matches_payouts():
+    random.seed(12)
+    horizons = ['k=1&tau=0', 'k=1&tau=5', 'k=2&tau=0', 'k=0&tau=3']
+    L = OngoingCategoricalLottery(allowed_horizons=horizons)
+    M = OngoingCategoricalLottery(allowed_horizons=horizons)
+    for G in [L, M]:
+        G.observe(t=0, value='a')
+    for rnd in range(1, 20):
+        t = 10*rnd
+        for owner in ['bill', 'mary', 'sally']:
+            h = random.choice(horizons[:3])
+            k, tau = int(h[2]), int(h.split('=')[2])
+            vs, ws, t_add = random.sample(['a', 'b', 'c'], 2), [random.random()+0.1, 1.0], t+random.randint(0, 3)
+            for G in [L, M]:
+                G.add(t=t_add, owner=owner, values=vs, weights=ws, k=k, tau=tau)
+        value = random.choice(['a', 'b', 'c'])
+        settled = L.observe_and_settle(value=value, t=t+8)
+        expected = dict([(h, M.payout(t=t+8, value=value, consolidate=True, k=int(h[2]), tau=int(h.split('=')[2]))) for h in horizons])
+        M.observe(value=value, t=t+8)
+        assert settled['horizons'] == expected
+        assert settled['total'] == consolidate_rewards([r for rs in expected.values() for r in rs])
+    assert json.dumps(L) == json.dumps(M)
+
+
+def test_live_pool_queries_match_payout():
+    for storage in ['json', 'columnar']:
+        L, values = random_lottery(seed=8)
+        L = OngoingCategoricalLottery(storage=storage, **json.loads(json.dumps(L)))
+        pool = L.live_pool(k=2, tau=5)
+        assert all([v in pool.value_counts for v in pool.value_totals]) and len(pool.value_counts) == len(pool.value_totals)
+
+        sizes = L.pool_sizes(k=2, tau=5)
+        assert [a for _, a in sizes] == sorted([a for _, a in sizes], reverse=True)
+        assert L.pool_sizes(top_n=3, k=2, tau=5) == sizes[:3]
+        odds = L.implied_odds(k=2, tau=5)
+        assert abs(sum(odds.values()) - 1.0) < 1e-9
+        assert set(odds) == set([v for v, _ in sizes])
+
+        # Once the quarantine has passed, payout() settles exactly the pool as it stands
+        t_last = L['state']['time_history'][-1]
+        L.observe(value=values[0], t=t_last+100)
+        L.observe(value=values[0], t=t_last+200)
+        for value in values:
+            paid = dict(L.payout(t=t_last+300, value=value, k=2, tau=5, consolidate=True))
+            for owner in pool.owner_subs:
+                exposure = L.owner_exposure(owner=owner, values=[value], k=2, tau=5)
+                assert abs(exposure[value] - paid.get(owner, 0.0)) < 1e-9
+
+        # A submission still in quarantine moves the pool as it stands, but not what payout() settles at t
+        owner = next(iter(pool.owner_subs))
+        L.add(t=t_last+250, owner=owner, values=[values[-1]], amount=5.0, k=2, tau=5)
+        t = t_last+300
+        assert L.pool_sizes(k=2, tau=5) != L.pool_sizes(k=2, tau=5, t=t)
+        assert L.implied_odds(k=2, tau=5) != L.implied_odds(k=2, tau=5, t=t)
+        for value in values:
+            paid = dict(L.payout(t=t, value=value, k=2, tau=5, consolidate=True))
+            for owner_ in pool.owner_subs:
+                exposure = L.owner_exposure(owner=owner_, values=[value], k=2, tau=5, t=t)
+                assert abs(exposure[value] - paid.get(owner_, 0.0)) < 1e-9
+        assert L.owner_exposure(owner=owner, k=2, tau=5) == {values[-1]: L.owner_exposure(owner=owner, values=[values[-1]], k=2, tau=5)[values[-1]]}
+        assert L.owner_exposure(owner='nobody', k=2, tau=5, t=t) == dict()
+        assert set(L.implied_odds(k=2, tau=5, t=t)) == set([v for v, _ in L.pool_sizes(k=2, tau=5, t=t)])
+        L.observe(value=values[0], t=t_last+400)
+        L.observe(value=values[0], t=t_last+500)
+        settled, live = dict(L.pool_sizes(k=2, tau=5, t=t_last+600)), dict(L.pool_sizes(k=2, tau=5))
+        assert set(settled) == set(live) and all(abs(settled[v] - live[v]) < 1e-9 for v in live)
+        assert set(L.owner_exposure(owner=owner, k=2, tau=5)) == set([v for v, _ in pool.rows(pool.owner_subs[owner][-1])])
+        assert L.owner_exposure(owner='nobody', k=2, tau=5) == dict()
+        assert L.pool_sizes(k=9, tau=9) == [] and L.implied_odds(k=9, tau=9) == dict()
+
+
+def test_observe_and_settle_on_categorical_lottery():
+    L = CategoricalLottery(allowed_values=['1', '3', '5'], t=15)
+    M = CategoricalLottery(allowed_values=['1', '3', '5'], t=15)
+    for G in [L, M]:
+        G.add(t=20, owner='mary', values=['1', '3'], weights=[0.75, 0.25], amount=1.0)
+        G.add(t=20, owner='alice', values=['3', '5'], weights=[0.3, 0.7], amount=3.0)
+        G.close(t=25)
+    settled, expected = L.observe_and_settle(value='3', t=50), M.settle(value='3', t=50)
+    assert settled == {'horizons': {'k=1&tau=0': expected}, 'total': expected}
+    assert expected and json.dumps(L) == json.dumps(M)
+
+
+if __name__=='__main__':
+    test_index_payout_matches_scan()
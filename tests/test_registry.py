@@ -0,0 +1,77 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.categoricallottery import CategoricalLottery
+from lottery.registry import LotteryBook
+from tests.lotteries import random_tapes
+import random
+import json
+
+
+def _book_lotteries(seed, n_lotteries=12):
+    """ Races, and ongoing lotteries in either storage, each with one round of random bets """
+    lotteries = dict()
+    for i in range(n_lotteries):
+        if i % 3 == 0:
+            L = CategoricalLottery(allowed_values=['1', '2', '3'], t=5)
+        else:
+            L = OngoingCategoricalLottery(allowed_horizons=['k=1&tau=2'], storage='columnar' if i % 2 else None)
+            L.observe(t=5, value='1')
+        submissions, _ = random_tapes(100*seed+i, n_rounds=2, owners=['bill', 'mary', 'sally'], values=['1', '2', '3'],
+                                      horizons=[(1, 0) if i % 3 == 0 else (1, 2)], max_values=2, amounts=[1.0, 2.0])
+        for s in submissions:
+            L.add(*s)
+        if i % 3 == 0:
+            L.close(t=25)
+        else:
+            L.observe(t=20, value='3')
+        lotteries['race'+str(i)] = L
+    return lotteries
+
+
+def _settle_twice(book):
+    truths = [(lottery_id, dict(value=random.choice(['1', '2', '3']), t=50)) for lottery_id in book.ids]
+    first = book.settle(truths)
+    book.add([(lottery_id, dict(t=60, owner='ted', values=['2'], k=1, tau=2)) for lottery_id in book.ids if lottery_id != 'race0'])
+    assert any(first[0]) and first[1]
+    second = book.payout([(lottery_id, dict(t=70, value='2', k=1, tau=2)) for lottery_id in book.ids if lottery_id != 'race0'])
+    return first, second
+
+
+def test_sharded_matches_sequential():
+    random.seed(3)
+    with LotteryBook(_book_lotteries(seed=1)) as sequential:
+        expected = _settle_twice(sequential)
+        expected_state = json.dumps(sequential['race4'])
+    random.seed(3)
+    with LotteryBook(_book_lotteries(seed=1), n_shards=3) as sharded:
+        assert _settle_twice(sharded) == expected
+        assert json.dumps(sharded['race4']) == expected_state
+        assert isinstance(sharded['race3'], CategoricalLottery)
+        del sharded['race3']
+        assert len(sharded) == 11
+
+
+def test_failed_call_stops_its_shard_only():
+    lotteries = _book_lotteries(seed=2)
+    with LotteryBook(dict(lotteries), n_shards=3) as book:
+        ids = [lottery_id for lottery_id, L in lotteries.items() if not isinstance(L, CategoricalLottery)]
+        other = [lottery_id for lottery_id in ids if book.shard_of(lottery_id) != book.shard_of(ids[0])][0]
+        same = [lottery_id for lottery_id in ids[1:] if book.shard_of(lottery_id) == book.shard_of(ids[0])][0]
+        batch = [(ids[0], dict(t=60, owner='ted', values=['2'], k=-1, tau=2)),     # Raises
+                 (same, dict(t=60, owner='ted', values=['2'], k=1, tau=2)),
+                 (other, dict(t=60, owner='ted', values=['2'], k=1, tau=2))]
+        try:
+            book.add(batch)
+            raised = False
+        except AssertionError:
+            raised = True
+        assert raised
+        assert 'ted' not in book[same]['state']['bet_totals']['k=1&tau=2']
+        assert 'ted' in book[other]['state']['bet_totals']['k=1&tau=2']     # Another shard carried on
+
+    # In this process the batch stops where it failed, as a loop would
+    with LotteryBook(_book_lotteries(seed=2)) as book:
+        try:
+            book.add(batch)
+        except AssertionError:
+            pass
+        assert 'ted' not in book[other]['state']['bet_totals']['k=1&tau=2']
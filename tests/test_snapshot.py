@@ -0,0 +1,57 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.categoricallottery import CategoricalLottery
+from lottery.snapshot import open_snapshot
+from tests.lotteries import random_lottery
+import tempfile
+import json
+import os
+
+
+def test_snapshot_round_trip_matches_json():
+    L, values = random_lottery(seed=4)
+    for M in [L, OngoingCategoricalLottery.from_json(json.dumps(L))]:
+        G = OngoingCategoricalLottery.from_bytes(M.to_bytes())
+        assert json.dumps(G) == json.dumps(M)
+        for t in range(0, 320, 17):
+            assert G.payout_all(t=t, k=2, tau=5) == M.payout_all(t=t, k=2, tau=5)
+
+
+def test_snapshot_columnar_and_compacted():
+    L, values = random_lottery(seed=5)
+    C, _ = random_lottery(seed=5, lottery=OngoingCategoricalLottery(storage='columnar'))
+    C.compact()
+    G = OngoingCategoricalLottery.from_bytes(C.to_bytes())
+    assert G.columnar
+    assert json.dumps(G) == json.dumps(C)
+    assert len(C.to_bytes()) < len(json.dumps(L))
+
+
+def test_snapshot_files():
+    L = CategoricalLottery(allowed_values=['1', '3', '5'], t=15)
+    L.add(t=20, owner='mary', values=['1', '3', '5'], weights=[0.75, 0.25, 0.0], amount=1.0)
+    L.add(t=20, owner='alice', values=['1', '3', '5'], weights=[0.65, 0.3, 0.05], amount=3.0)
+    L.close(t=25)
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'lottery.snap')
+        L.save(path)
+        with open_snapshot(path) as reader:
+            owners, values = reader.tables('k=1&tau=0')
+            assert owners == ['mary', 'alice']
+            assert list(reader.column('k=1&tau=0', 'sub_amount')) == [1.0, 3.0]
+        G = OngoingCategoricalLottery.load(path)
+        assert isinstance(G, CategoricalLottery)
+        assert G.settle(t=50, value='3') == L.settle(t=50, value='3')
+        with open(path, 'w') as f:
+            f.write(json.dumps(L))
+        assert OngoingCategoricalLottery.load(path)['state'] == L['state']
+
+
+def test_snapshot_keeps_ints_among_floats():
+    L = OngoingCategoricalLottery()
+    L.observe(t=0, value='a')
+    L.add(t=0.5, owner='bill', values=['a', 'b'], amount=1, k=1, tau=0)
+    L.add(t=1.5, owner='mary', values=['b'], amount=1.5, k=1, tau=0)
+    L.add(t=2, owner='bill', values=['a'], amount=1, k=1, tau=0)
+    G = OngoingCategoricalLottery.from_bytes(L.to_bytes())
+    assert json.dumps(G) == json.dumps(L)
+    assert G['state']['bet_totals']['k=1&tau=0']['bill'] == [[0.5, 1], [2, 1]]
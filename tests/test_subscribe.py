@@ -0,0 +1,82 @@
+from lottery.ongoingcategoricallottery import OngoingCategoricalLottery
+from lottery.conventions import k_and_tau_to_horizon_str
+import random
+
+
+def _follow(books:dict):
+    """ A subscriber keeping its own odds from the deltas alone """
+    def callback(delta):
+        book = books.setdefault(delta['horizon'], dict())
+        if delta['previous_total'] and delta['total'] != delta['previous_total']:
+            scale = delta['total']/delta['previous_total']
+            for v in book:
+                book[v] *= scale
+        for v, odds in delta['odds'].items():
+            if odds is None:
+                book.pop(v, None)
+            else:
+                book[v] = odds
+    return callback
+
+
+def _close(book:dict, expected:dict):
+    return set(book) == set(expected) and all([abs(book[v] - expected[v]) < 1e-9*expected[v] for v in expected])
+
+
+def test_odds_deltas_track_payoff_odds():
+    random.seed(21)
+    owners = ['owner'+str(i) for i in range(8)]
+    values = [str(i) for i in range(6)]
+    horizons = [(1, 0), (2, 5)]
+    for storage in ['json', 'columnar']:
+        L = OngoingCategoricalLottery(storage=storage)
+        L.observe(t=0, value=values[0])
+        books, deltas = dict(), list()
+        L.subscribe(_follow(books))
+        L.subscribe(deltas.append)
+        for t in range(1, 300):
+            k, tau = random.choice(horizons)
+            vs = random.sample(values, random.randint(1, 3))
+            if random.random() < 0.5:
+                L.add(t=t, owner=random.choice(owners), values=vs, amount=random.choice([1.0, 2.0]), k=k, tau=tau)
+            else:
+                L.add_many([(t, random.choice(owners), vs, None, 1.0, k, tau)])
+            for k_, tau_ in horizons:
+                if L.live_pool(k=k_, tau=tau_) is not None:
+                    assert _close(books[k_and_tau_to_horizon_str(k=k_, tau=tau_)], L.payoff_odds(k=k_, tau=tau_))
+            if t % 50 == 0:
+                L.observe(t=t, value=random.choice(values))
+        assert len(deltas) == 299
+
+        # Restating a forecast moves nothing, and a rejected submission publishes nothing
+        before = len(deltas)
+        L.add(t=400, owner='same', values=['a', 'b'], weights=[0.25, 0.75], k=1, tau=0)
+        L.add(t=401, owner='same', values=['a', 'b'], weights=[0.25, 0.75], k=1, tau=0)
+        assert deltas[-1]['odds'] == dict() and deltas[-1]['total'] == deltas[-1]['previous_total']
+        L.add(t=401, owner='same', values=['a'], k=1, tau=0)
+        assert len(deltas) == before + 2
+
+        # Moving money reports just the values it left and joined
+        L.add(t=402, owner='same', values=['b', 'c'], weights=[0.75, 0.25], k=1, tau=0)
+        assert set(deltas[-1]['odds']) == {'a', 'c'} and deltas[-1]['odds']['a'] is None
+        L.unsubscribe(deltas.append)
+        L.add(t=403, owner='same', values=['c'], k=1, tau=0)
+        assert len(deltas) == before + 3
+
+
+def test_subscribers_see_the_submission_recorded():
+    for storage in ['json', 'columnar']:
+        L = OngoingCategoricalLottery(storage=storage, allowed_horizons=['k=1&tau=0'])
+        L.observe(t=0, value='a')
+        seen = list()
+
+        def callback(delta):
+            h, owner = delta['horizon'], delta['owner']
+            seen.append((list(L['state']['bet_totals'][h][owner]), dict([(v, list(triples)) for v, triples in L['state']['bets'][h].items()])))
+
+        L.subscribe(callback)
+        L.add(t=1, owner='bill', values=['a', 'b'], weights=[0.5, 0.5], amount=2.0)
+        L.add_many([(2, 'bill', ['b'], None, 1.0), (2, 'mary', ['c'], None, 3.0)])
+        assert seen[0] == ([[1, 2.0]], {'a': [[1, 'bill', 1.0]], 'b': [[1, 'bill', 1.0]]})
+        assert seen[1][0] == [[1, 2.0], [2, 1.0]] and seen[1][1]['b'] == [[1, 'bill', 1.0], [2, 'bill', 1.0]]
+        assert seen[2] == ([[2, 3.0]], dict(seen[1][1], c=[[2, 'mary', 3.0]]))
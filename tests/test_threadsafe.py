@@ -0,0 +1,62 @@
+from lottery.threadsafe import ThreadSafeOngoingCategoricalLottery
+from tests.lotteries import random_lottery, random_tapes
+import threading
+import json
+
+
+def _submissions(t0, seed=3):
+    """ Random submissions from t0 on """
+    submissions, _ = random_tapes(seed, n_rounds=60)
+    return [(t0+s[0],) + s[1:] for s in submissions]
+
+
+def test_threadsafe_matches_plain_lottery():
+    L, values = random_lottery(seed=4)
+    S = ThreadSafeOngoingCategoricalLottery(**json.loads(json.dumps(L)))
+    for t in range(300, 400, 9):
+        assert S.payout_all(t=t, k=2, tau=5) == L.payout_all(t=t, k=2, tau=5, use_numpy=False)
+        assert S.suggest_with_count(t=t, k=2, tau=5) == L.suggest_with_count(t=t, k=2, tau=5)
+        for value in values + ['never']:
+            assert S.payout(t=t, value=value, k=2, tau=5) == L.payout(t=t, value=value, k=2, tau=5)
+
+
+def test_readers_during_writes():
+    for storage in ['json', 'columnar']:
+        L, values = random_lottery(seed=5)
+        S = ThreadSafeOngoingCategoricalLottery(storage=storage, **json.loads(json.dumps(L)))
+        t_last = L['state']['time_history'][-1]
+        submissions = _submissions(t0=t_last+10)
+
+        # Submissions after the cutoff leave payouts alone, but each one changes the suggestion
+        t_payout = t_last + 5
+        expected_payouts = L.payout_all(t=t_payout, k=2, tau=5, use_numpy=False)
+        expected_suggestions = {L.suggest_with_count(t=t_last, k=2, tau=5)[1]: L.suggest_with_count(t=t_last, k=2, tau=5)}
+        for s in submissions:
+            L.add(*s)
+            weights, n_bets = L.suggest_with_count(t=t_last, k=2, tau=5)
+            expected_suggestions[n_bets] = (weights, n_bets)
+
+        done = threading.Event()
+        failures = list()
+
+        def read():
+            while not done.is_set():
+                if S.payout_all(t=t_payout, k=2, tau=5) != expected_payouts:
+                    failures.append('payout_all')
+                if S.payout(t=t_payout, value=values[1], k=2, tau=5) != expected_payouts[values[1]]:
+                    failures.append('payout')
+                weights, n_bets = S.suggest_with_count(t=t_last, k=2, tau=5)
+                if expected_suggestions.get(n_bets) != (weights, n_bets):
+                    failures.append('suggest')
+
+        readers = [threading.Thread(target=read) for _ in range(3)]
+        for reader in readers:
+            reader.start()
+        for s in submissions:
+            S.add(*s)
+        done.set()
+        for reader in readers:
+            reader.join()
+        assert not failures
+        assert S.suggest_with_count(t=t_last, k=2, tau=5) == L.suggest_with_count(t=t_last, k=2, tau=5)
+        assert json.loads(S.dumps())['state'] == json.loads(json.dumps(L))['state']